@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+bench/micro.py — offline micro-benchmarks for the per-item hot path
+
+Covers parse_score_and_reason / extract_json_block (per response category),
+build_prompt, compute_qrel_window and the row -> prompt step of run_once.
+Inputs come from the committed run exports in logs_official (responses, and the
+query/passage texts echoed in them); malformed outputs are derived from those.
+
+Results are written to bench/results/micro_<commit>_<timestamp>.json; with
+--compare, per-benchmark changes against an earlier result file are printed.
+
+Usage (from old/llm_judging):
+  python -m bench.micro [--repeat 7] [--compare bench/results/micro_<…>.json]
+"""
+
+from __future__ import annotations
+import argparse, json, os, platform, re, statistics, sys, time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+
+from bench.parsing_equivalence import load_corpus, DEFAULT_SOURCES
+from bt.config import Settings
+from bt.pipeline import _item_prompt
+from bt.prompts import PROMPT_TMPL, PROMPT_TMPL_WITH_REASON, build_prompt
+from bt.util.git import get_git_info
+from bt.util.helpers import compute_qrel_window
+from bt.util.parsing import parse_score_and_reason, extract_json_block
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+_RE_ECHOED = re.compile(r"QUERY:\n(.*?)\n\nDOCUMENT \(passage text\):\n(.*?)\n(?:</think>|$)", re.S)
+
+
+# --- Inputs ------------------------------------------------------------------
+
+def categorize(texts: List[str]) -> Dict[str, List[str]]:
+    """Split stored responses into the shapes the parser sees, plus derived malformed ones."""
+    cats: Dict[str, List[str]] = {"short_json": [], "fenced": [], "long_reasoning": [], "malformed": []}
+    for t in texts:
+        if "</think>" in t and len(t) > 1500:
+            cats["long_reasoning"].append(t)
+        elif "```" in t:
+            cats["fenced"].append(t)
+        elif len(t) <= 300:
+            cats["short_json"].append(t)
+        if parse_score_and_reason(t)[0] is None:
+            cats["malformed"].append(t)
+
+    # Answers as they come without reasoning / fences (the tail after </think>)
+    for t in texts:
+        tail = t.rsplit("</think>", 1)[-1].strip().strip("`").removeprefix("json").strip()
+        if tail.startswith("{"):
+            cats["short_json"].append(tail)
+
+    # Derived malformed outputs: cut mid-answer, out-of-range score, unclosed reasoning
+    for t in texts[:40]:
+        cut = t.rfind("}")
+        if cut > 0:
+            cats["malformed"].append(t[:cut])
+        cats["malformed"].append(re.sub(r'("score"\s*:\s*)\d', r"\g<1>7", t))
+        cats["malformed"].append("<think>" + t.split("</think>", 1)[0])
+    return {k: v for k, v in cats.items() if v}
+
+
+def echoed_rows(texts: List[str]) -> List[Dict[str, Any]]:
+    """qrel-like rows rebuilt from the prompts echoed in stored responses."""
+    rows = []
+    for k, t in enumerate(texts):
+        m = _RE_ECHOED.search(t)
+        if m:
+            rows.append({"query_id": str(k), "doc_id": f"d{k}", "query_text": m.group(1),
+                         "doc_text": m.group(2), "gold_score": 0})
+    return rows
+
+
+# --- Timing ------------------------------------------------------------------
+
+def bench(fn: Callable[[Any], Any], inputs: List[Any], repeat: int) -> Dict[str, Any]:
+    """Per-call µs over `inputs`; `repeat` passes, each sized to run at least ~50 ms."""
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            for x in inputs:
+                fn(x)
+        if time.perf_counter() - t0 >= 0.05:
+            break
+        loops *= 2
+
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            for x in inputs:
+                fn(x)
+        samples.append(1e6 * (time.perf_counter() - t0) / (loops * len(inputs)))
+    return {
+        "inputs": len(inputs),
+        "calls_per_pass": loops * len(inputs),
+        "us_per_call_median": round(statistics.median(samples), 3),
+        "us_per_call_min": round(min(samples), 3),
+    }
+
+
+def run_suite(texts: List[str], repeat: int) -> Dict[str, Dict[str, Any]]:
+    results: Dict[str, Dict[str, Any]] = {}
+    for cat, items in categorize(texts).items():
+        results[f"parse_score_and_reason[{cat}]"] = bench(parse_score_and_reason, items, repeat)
+        results[f"extract_json_block[{cat}]"] = bench(extract_json_block, items, repeat)
+
+    rows = echoed_rows(texts)
+    if rows:
+        pairs = [(r["query_text"], r["doc_text"]) for r in rows]
+        results["build_prompt"] = bench(lambda p: build_prompt(p[0], p[1], template=PROMPT_TMPL), pairs, repeat)
+        results["build_prompt[with_reason]"] = bench(
+            lambda p: build_prompt(p[0], p[1], template=PROMPT_TMPL_WITH_REASON), pairs, repeat)
+        cfg = Settings()
+        results["item_prompt"] = bench(lambda r: _item_prompt(r, PROMPT_TMPL, cfg), rows, repeat)
+        cfg_trunc = Settings(max_text_chars=200)
+        results["item_prompt[truncated]"] = bench(lambda r: _item_prompt(r, PROMPT_TMPL, cfg_trunc), rows, repeat)
+
+    windows = [
+        (1000, None, None, None), (1000, None, None, 160), (1000, 161, 305, None),
+        (1000, 306, None, None), (1000, 900, 5000, 50), (0, None, None, 10),
+    ]
+    results["compute_qrel_window"] = bench(lambda w: compute_qrel_window(*w), windows, repeat)
+    return results
+
+
+def compare(current: Dict[str, Dict[str, Any]], path: str) -> None:
+    with open(path, encoding="utf-8") as f:
+        previous = json.load(f)["results"]
+    print(f"\nvs {path}:")
+    for name, r in current.items():
+        old = previous.get(name)
+        if not old:
+            print(f"  {name:45s} (new)")
+            continue
+        a, b = old["us_per_call_median"], r["us_per_call_median"]
+        print(f"  {name:45s} {a:10.2f} -> {b:10.2f} µs  ({100.0 * (b - a) / a:+.1f}%)")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=7, help="timed passes per benchmark (median reported)")
+    ap.add_argument("--compare", default=None, help="earlier result JSON to diff against")
+    ap.add_argument("--no-save", action="store_true", help="print only, don't write bench/results")
+    args = ap.parse_args()
+
+    texts = load_corpus(DEFAULT_SOURCES)
+    if not texts:
+        print("No stored responses found under logs_official.")
+        return 1
+
+    results = run_suite(texts, args.repeat)
+    for name, r in results.items():
+        print(f"{name:45s} {r['us_per_call_median']:10.2f} µs/call  (min {r['us_per_call_min']:.2f}, n={r['inputs']})")
+
+    if args.compare:
+        compare(results, args.compare)
+
+    if not args.no_save:
+        git = get_git_info()
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+        out = {
+            "git_commit": git.commit if git else None,
+            "git_dirty": git.dirty if git else None,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "corpus_responses": len(texts),
+            "repeat": args.repeat,
+            "results": results,
+        }
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"micro_{git.commit if git else 'nogit'}_{stamp}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(out, f, indent=2)
+        print(f"\nSaved {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
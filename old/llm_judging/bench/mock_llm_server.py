@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+bench/mock_llm_server.py — local stand-in for an LLM backend
+
+Speaks enough of three protocols for the bt clients:
+  • Ollama: POST /api/generate (streamed or not), /api/show, /api/pull
+  • HF TGI: POST / and /generate -> [{"generated_text": …}]
+  • OpenAI-compatible: POST /v1/completions with one prompt or a list of prompts
+
+Each request sleeps for a latency drawn from the ms_total values recorded in
+logs_official (scaled by --latency-scale), then answers with one of the recorded
+responses. A configurable share of requests hangs (timeout) or returns malformed
+output. Everything random comes from one seeded RNG. Requests constrained by a JSON
+schema (Ollama `format`, TGI `grammar`) get just the answer object, with the latency
+scaled down by the length saved; num_predict / max_new_tokens truncate the text.
+Requests for token logprobs (Ollama `logprobs`, TGI `top_n_tokens`, OpenAI `logprobs`)
+are answered with the recorded score as one digit plus a seeded distribution.
+Ollama `think`: true moves the recorded reasoning (up to </think>) into the
+`thinking` field, false drops it (and its share of the latency).
+Ollama model loads are simulated: the first request, and every one asking for a
+different model or num_ctx, waits --load-s; an empty prompt only loads.
+
+Usage (from old/llm_judging):
+  python -m bench.mock_llm_server --port 11434 --latency-scale 0.01 --timeout-rate 0.01
+"""
+
+from __future__ import annotations
+import argparse, csv, glob, json, math, random, sys, threading, time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+from bench.parsing_equivalence import load_corpus, DEFAULT_SOURCES
+from bt.util.parsing import parse_score_and_reason
+
+_FALLBACK_RESPONSE = '{"score": 1}'
+
+
+def recorded_latencies_ms(pattern: str = "logs_official/**/llm_predictions_*.csv") -> List[int]:
+    out: List[int] = []
+    csv.field_size_limit(sys.maxsize)
+    for path in sorted(glob.glob(pattern, recursive=True)):
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                try:
+                    out.append(int(row["ms_total"]))
+                except (KeyError, TypeError, ValueError):
+                    pass
+    return out
+
+
+@dataclass
+class MockConfig:
+    latency_scale: float = 0.01          # recorded ms_total × scale = simulated latency
+    latency_ms: Optional[float] = None   # fixed latency instead of the recorded distribution
+    timeout_rate: float = 0.0            # share of requests that hang for hang_s
+    hang_s: float = 600.0
+    malformed_rate: float = 0.0          # share of requests answered without a usable score
+    chunk_chars: int = 8                 # streamed response piece size
+    load_s: float = 0.0                  # Ollama: (re)load time when model or num_ctx changes
+    seed: int = 42
+    latencies_ms: List[int] = field(default_factory=list)
+    responses: List[str] = field(default_factory=list)
+
+    @classmethod
+    def from_recorded(cls, **kw) -> "MockConfig":
+        cfg = cls(**kw)
+        cfg.latencies_ms = recorded_latencies_ms() or [1000]
+        cfg.responses = [t for t in load_corpus(DEFAULT_SOURCES) if parse_score_and_reason(t)[0] is not None]
+        cfg.responses = cfg.responses or [_FALLBACK_RESPONSE]
+        return cfg
+
+
+class _Behaviour:
+    """Draws latency / outcome / text per request from a seeded RNG (thread-safe)."""
+
+    def __init__(self, cfg: MockConfig):
+        self.cfg = cfg
+        self._rng = random.Random(cfg.seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.loads = 0
+        self._loaded = None
+
+    def load(self, body: dict) -> float:
+        """Seconds an Ollama request waits for the model to be (re)loaded for it."""
+        key = (body.get("model"), (body.get("options") or {}).get("num_ctx"))
+        with self._lock:
+            if key == self._loaded:
+                return 0.0
+            self._loaded = key
+            self.loads += 1
+        return self.cfg.load_s
+
+    def next(self):
+        with self._lock:
+            self.requests += 1
+            r = self._rng
+            if self.cfg.latency_ms is not None:
+                latency_s = self.cfg.latency_ms / 1000.0
+            else:
+                latency_s = r.choice(self.cfg.latencies_ms) * self.cfg.latency_scale / 1000.0
+            outcome = "ok"
+            roll = r.random()
+            if roll < self.cfg.timeout_rate:
+                outcome = "timeout"
+            elif roll < self.cfg.timeout_rate + self.cfg.malformed_rate:
+                outcome = "malformed"
+            text = r.choice(self.cfg.responses or [_FALLBACK_RESPONSE])
+            if outcome == "malformed":
+                cut = text.rfind("{")
+                text = text[:cut] if cut > 0 else "I cannot judge this passage."
+            return latency_s, outcome, text
+
+    def score_logprobs(self, text: str, top_n: int):
+        """(digit, [(token, logprob), …]) around the score of a recorded response."""
+        score, _ = parse_score_and_reason(text)
+        score = score if score is not None else 0
+        with self._lock:
+            r = self._rng
+            p_top = r.uniform(0.5, 0.97)
+            rest = [r.random() + 1e-3 for _ in range(4)]
+        probs = {str(k): (1.0 - p_top) * 0.95 * w / sum(rest) for k, w in enumerate(rest)}
+        probs[str(score)] = p_top
+        probs[" "] = (1.0 - p_top) * 0.05  # a little mass on a non-score token
+        top = sorted(probs.items(), key=lambda kv: -kv[1])[:max(1, int(top_n))]
+        return str(score), [(t, math.log(p)) for t, p in top]
+
+
+def _shape(body: dict, latency_s: float, text: str):
+    """Apply the request's output constraints to a drawn response: (latency_s, text)."""
+    params = body.get("parameters") or {}
+    schema = body.get("format") or (params.get("grammar") or {}).get("value")
+    if isinstance(schema, dict):
+        score, reason = parse_score_and_reason(text)
+        answer = {"score": score if score is not None else 0}
+        if "reason" in (schema.get("properties") or {}):
+            answer["reason"] = (reason or "")[:200]
+        short = json.dumps(answer)
+        latency_s *= max(0.02, len(short) / max(1, len(text)))
+        text = short
+    limit = (body.get("options") or {}).get("num_predict") or params.get("max_new_tokens")
+    if limit and len(text) > 4 * int(limit):
+        latency_s *= 4 * int(limit) / len(text)
+        text = text[:4 * int(limit)]
+    return latency_s, text
+
+
+def _handler(behaviour: _Behaviour):
+    cfg = behaviour.cfg
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):  # keep benchmark output clean
+            pass
+
+        def _body(self) -> dict:
+            n = int(self.headers.get("Content-Length") or 0)
+            try:
+                return json.loads(self.rfile.read(n) or b"{}")
+            except ValueError:
+                return {}
+
+        def _json(self, obj, status: int = 200) -> None:
+            data = json.dumps(obj).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _chunk(self, obj) -> None:
+            data = (json.dumps(obj) + "\n").encode("utf-8")
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+        def do_GET(self):
+            if self.path in ("/", "/health", "/api/version"):
+                self._json({"status": "ok", "requests": behaviour.requests})
+            else:
+                self._json({"error": "not found"}, 404)
+
+        def do_POST(self):
+            body = self._body()
+            if self.path == "/api/show":
+                return self._json({"modelfile": "", "parameters": "", "template": "", "details": {}, "model_info": {}})
+            if self.path == "/api/pull":
+                return self._json({"status": "success"})
+            if self.path == "/v1/completions":
+                return self._completions(body)
+            if self.path not in ("/api/generate", "/", "/generate"):
+                return self._json({"error": "not found"}, 404)
+
+            if self.path == "/api/generate":
+                load_s = behaviour.load(body)
+                time.sleep(load_s)
+                if not body.get("prompt"):
+                    return self._json({"model": body.get("model"), "response": "", "done": True,
+                                       "done_reason": "load", "load_duration": int(load_s * 1e9)})
+            latency_s, outcome, text = behaviour.next()
+            if outcome == "timeout":
+                time.sleep(cfg.hang_s)
+                return self._json({"error": "mock timeout"}, 504)
+            recorded = text
+            thinking = ""
+            if self.path == "/api/generate" and body.get("think") is not None and "</think>" in text:
+                thought, answer = text.split("</think>", 1)
+                if body["think"]:
+                    thinking = thought.replace("<think>", "", 1)
+                else:
+                    latency_s *= max(0.02, len(answer) / max(1, len(text)))
+                text = answer.lstrip()
+            latency_s, text = _shape(body, latency_s, text)
+            params = body.get("parameters") or {}
+            top_n = body.get("top_logprobs") if body.get("logprobs") else params.get("top_n_tokens")
+            if top_n:
+                text, cands = behaviour.score_logprobs(recorded, top_n)
+                if self.path == "/api/generate":
+                    body["_logprobs"] = [{"token": text, "logprob": cands[0][1],
+                                          "top_logprobs": [{"token": t, "logprob": lp} for t, lp in cands]}]
+                else:
+                    body["_details"] = {"finish_reason": "length", "generated_tokens": 1,
+                                        "tokens": [{"id": 0, "text": text, "logprob": cands[0][1], "special": False}],
+                                        "top_tokens": [[{"id": k, "text": t, "logprob": lp, "special": False}
+                                                        for k, (t, lp) in enumerate(cands)]]}
+
+            try:
+                if self.path == "/api/generate" and body.get("stream", True):
+                    self._stream_ollama(body, text, latency_s, thinking)
+                else:
+                    time.sleep(latency_s)
+                    if self.path == "/api/generate":
+                        final = self._ollama_final(body, text, latency_s)
+                        if thinking:
+                            final["thinking"] = thinking
+                            final["eval_count"] += len(thinking) // 4
+                        self._json(final)
+                    else:
+                        details = body.get("_details") or {"finish_reason": "stop", "generated_tokens": max(1, len(text) // 4)}
+                        self._json([{"generated_text": text, "details": details}])
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # client hung up early (streaming early stop)
+
+        def _completions(self, body):
+            prompts = body.get("prompt", "")
+            prompts = prompts if isinstance(prompts, list) else [prompts]
+            limits = {"parameters": {"max_new_tokens": body.get("max_tokens")}}
+            draws = []
+            for _ in prompts:
+                latency_s, outcome, text = behaviour.next()
+                recorded = text
+                latency_s, text = _shape(limits, latency_s, text)
+                logprobs = None
+                if body.get("logprobs"):
+                    text, cands = behaviour.score_logprobs(recorded, body["logprobs"])
+                    logprobs = {"tokens": [text], "token_logprobs": [cands[0][1]],
+                                "top_logprobs": [dict(cands)], "text_offset": [0]}
+                draws.append((latency_s, outcome, text, logprobs))
+            # Prompts of a request are decoded together: the slowest one sets the latency
+            if any(outcome == "timeout" for _, outcome, _, _ in draws):
+                time.sleep(cfg.hang_s)
+                return self._json({"error": "mock timeout"}, 504)
+            time.sleep(max((latency_s for latency_s, _, _, _ in draws), default=0.0))
+            # choices come back in completion order; clients must map them by index
+            order = sorted(range(len(draws)), key=lambda k: draws[k][0])
+            choices = [{"index": k, "text": draws[k][2], "finish_reason": "stop", "logprobs": draws[k][3]} for k in order]
+            completion_tokens = sum(max(1, len(text) // 4) for _, _, text, _ in draws)
+            prompt_tokens = sum(len(str(p)) // 4 for p in prompts)
+            try:
+                self._json({
+                    "id": f"cmpl-mock-{behaviour.requests}", "object": "text_completion", "model": body.get("model"),
+                    "choices": choices,
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                              "total_tokens": prompt_tokens + completion_tokens},
+                })
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def _ollama_final(self, body, text, latency_s, response=None):
+            final = {
+                "model": body.get("model"), "response": text if response is None else response, "done": True,
+                "done_reason": "stop", "total_duration": int(latency_s * 1e9),
+                "eval_count": max(1, len(text) // 4), "prompt_eval_count": len(body.get("prompt", "")) // 4,
+            }
+            if body.get("_logprobs"):
+                final["logprobs"] = body["_logprobs"]
+            return final
+
+        def _stream_ollama(self, body, text, latency_s, thinking=""):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            step = max(1, cfg.chunk_chars)
+            thoughts = [("thinking", thinking[i:i + step]) for i in range(0, len(thinking), step)]
+            pieces = thoughts + [("response", text[i:i + step]) for i in range(0, len(text), step)]
+            pieces = pieces or [("response", "")]
+            # ~10% of the latency before the first token, the rest spread over the pieces
+            time.sleep(0.1 * latency_s)
+            per_piece = 0.9 * latency_s / len(pieces)
+            for field, p in pieces:
+                chunk = {"model": body.get("model"), "response": "", "done": False}
+                chunk[field] = p
+                self._chunk(chunk)
+                time.sleep(per_piece)
+            self._chunk(self._ollama_final(body, text, latency_s, response=""))
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients dropping keep-alive / streamed connections is expected here
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+
+class MockLLMServer:
+    """In-process mock server; use as a context manager or start()/stop()."""
+
+    def __init__(self, cfg: MockConfig, host: str = "127.0.0.1", port: int = 0):
+        self.behaviour = _Behaviour(cfg)
+        self._srv = _QuietServer((host, port), _handler(self.behaviour))
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._srv.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockLLMServer":
+        self._thread = threading.Thread(target=self._srv.serve_forever, name="mock-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._srv.shutdown()
+        self._srv.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=11434)
+    ap.add_argument("--latency-scale", type=float, default=0.01)
+    ap.add_argument("--latency-ms", type=float, default=None)
+    ap.add_argument("--timeout-rate", type=float, default=0.0)
+    ap.add_argument("--hang-s", type=float, default=600.0)
+    ap.add_argument("--malformed-rate", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--load-s", type=float, default=0.0)
+    args = ap.parse_args()
+
+    cfg = MockConfig.from_recorded(
+        latency_scale=args.latency_scale, latency_ms=args.latency_ms, timeout_rate=args.timeout_rate,
+        hang_s=args.hang_s, malformed_rate=args.malformed_rate, seed=args.seed, load_s=args.load_s,
+    )
+    srv = MockLLMServer(cfg, args.host, args.port)
+    print(f"Mock LLM server on {srv.base_url} ({len(cfg.responses)} responses, "
+          f"{len(cfg.latencies_ms)} recorded latencies × {cfg.latency_scale})")
+    try:
+        srv._srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
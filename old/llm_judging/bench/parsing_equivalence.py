@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+bench/parsing_equivalence.py — check the fast-path score parser against the original one
+
+Corpus: model responses stored in exported llm_predictions CSVs (`raw_response` column)
+and in run logs written at DEBUG level ("=== Response: ===" blocks).
+
+For every response, `parse_score_and_reason` (fast path + fallback) must return the same
+(score, reason) as `_parse_full_scan` (the original parser) wherever the original found a
+score. Answers only the fast path finds (e.g. the original scan got stuck on an unbalanced
+quote inside the reasoning) are listed as "recovered". The streaming scanner
+(`IncrementalScoreParser`, early stop of streamed Ollama calls) is fed every response, plus
+the built-in STREAM_CASES, in small chunks: where it stops early, its answer must be the one
+`parse_score_and_reason` gives for the full text. Prints mismatches and the measured
+speedup; exits non-zero on a mismatch.
+
+Usage (from old/llm_judging):
+  python -m bench.parsing_equivalence [--repeat 50] [extra .csv/.log files …]
+"""
+
+from __future__ import annotations
+import argparse, csv, glob, json, re, sys, time
+from typing import List
+
+from bt.llm.hf_client import _extract_text
+from bt.util.parsing import parse_score_and_reason, _parse_full_scan, IncrementalScoreParser
+
+DEFAULT_SOURCES = ["logs_official/**/llm_predictions_*.csv", "logs_official/**/*.log", "logs/*.log"]
+
+_RE_LOG_LINE = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2} ")
+
+# (response, early-stop answer or None): reasoning opened by the chat template, draft answers
+STREAM_CASES = [
+    ('reasoning {"score": 0} more </think> {"score": 2}', (2, None)),
+    ('{"score": 1} on second thought the passage answers it fully. {"score": 3}', None),
+    ('<think>maybe {"score": 1}?</think>\n{"score": 2, "reason": "partial"}', (2, "partial")),
+    ('<think>no answer yet', None),
+]
+
+
+def _response_text(raw_json: str) -> str | None:
+    try:
+        raw = json.loads(raw_json)
+    except Exception:
+        return None
+    if not isinstance(raw, dict):
+        return None
+    text = raw.get("response_text")
+    if text is None and "hf" in raw:
+        text = _extract_text(raw["hf"])
+    if text is None and isinstance(raw.get("ollama"), dict):
+        text = raw["ollama"].get("response")
+    return text
+
+
+def _from_csv(path: str) -> List[str]:
+    csv.field_size_limit(sys.maxsize)
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = csv.DictReader(f)
+        if "raw_response" not in (rows.fieldnames or []):
+            return []
+        return [t for t in (_response_text(r["raw_response"]) for r in rows) if t]
+
+
+def _from_log(path: str) -> List[str]:
+    out, cur = [], None
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if cur is not None:
+                if _RE_LOG_LINE.match(line):
+                    out.append("".join(cur).rstrip("\n"))
+                    cur = None
+                else:
+                    cur.append(line)
+                    continue
+            if "=== Response: ===" in line:
+                cur = []
+    if cur is not None:
+        out.append("".join(cur).rstrip("\n"))
+    return [t for t in out if t and t != "None"]
+
+
+def load_corpus(paths: List[str]) -> List[str]:
+    texts: List[str] = []
+    for pattern in paths:
+        for path in sorted(glob.glob(pattern, recursive=True)):
+            texts.extend(_from_csv(path) if path.endswith(".csv") else _from_log(path))
+    return texts
+
+
+def stream_parse(text: str, chunk: int = 4):
+    """Early-stop answer of IncrementalScoreParser fed `text` in `chunk`-sized pieces, or None."""
+    inc = IncrementalScoreParser()
+    for i in range(0, len(text), chunk):
+        found = inc.feed(text[i:i + chunk])
+        if found is not None:
+            return found
+    return None
+
+
+def _time(fn, texts: List[str], repeat: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for t in texts:
+            fn(t)
+    return time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("paths", nargs="*", help="CSV exports / run logs (globs ok); default: %s" % DEFAULT_SOURCES)
+    ap.add_argument("--repeat", type=int, default=50, help="timing passes over the corpus")
+    args = ap.parse_args()
+
+    texts = load_corpus(args.paths or DEFAULT_SOURCES)
+    if not texts:
+        print("No responses found.")
+        return 1
+
+    mismatches = recovered = 0
+    for k, t in enumerate(texts):
+        new, old = parse_score_and_reason(t), _parse_full_scan(t)
+        if new == old:
+            continue
+        if old[0] is None:
+            recovered += 1
+            print(f"recovered #{k}: fast={new} legacy={old}")
+            continue
+        mismatches += 1
+        print(f"MISMATCH #{k}: fast={new} legacy={old}\n---\n{t[-400:]}\n---")
+
+    stream_mismatches = 0
+    for k, (t, expected) in enumerate(STREAM_CASES):
+        early = stream_parse(t)
+        if early != expected:
+            stream_mismatches += 1
+            print(f"STREAM CASE #{k}: early={early} expected={expected}\n---\n{t}\n---")
+    for k, t in enumerate(texts):
+        early = stream_parse(t)
+        if early is not None and early != parse_score_and_reason(t):
+            stream_mismatches += 1
+            print(f"STREAM MISMATCH #{k}: early={early} full={parse_score_and_reason(t)}\n---\n{t[-400:]}\n---")
+
+    legacy_s = _time(_parse_full_scan, texts, args.repeat)
+    fast_s = _time(parse_score_and_reason, texts, args.repeat)
+    n = len(texts) * args.repeat
+    chars = sum(len(t) for t in texts) / len(texts)
+    print(f"responses={len(texts)} (avg {chars:.0f} chars) | mismatches={mismatches} | recovered={recovered} "
+          f"| stream mismatches={stream_mismatches}")
+    print(f"legacy: {1e6 * legacy_s / n:.1f} µs/response | fast: {1e6 * fast_s / n:.1f} µs/response "
+          f"| speedup x{legacy_s / fast_s:.2f}")
+    return 1 if mismatches or stream_mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
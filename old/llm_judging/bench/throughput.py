@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+bench/throughput.py — end-to-end pipeline throughput against the mock LLM server
+
+Creates a throwaway Postgres schema (bench_<hex>) holding synthetic qrels built from
+the query/passage texts recorded in logs_official, points run_once at an in-process
+MockLLMServer and reports items/s, p50/p95/p99 per-item latency (ms_total) and DB
+time per item. The schema is dropped afterwards unless --keep is given.
+
+Needs the Postgres from bt.config.Pg; no GPU or model server.
+
+Usage (from old/llm_judging):
+  python -m bench.throughput --items 300 --concurrency 8 --write-behind --latency-scale 0.005
+  python -m bench.throughput --provider openai --batch-size 16 --concurrency 2
+"""
+
+from __future__ import annotations
+import argparse, dataclasses, json, math, os, random, secrets, sys, time
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+import psycopg2.extras
+
+from bench.micro import echoed_rows, RESULTS_DIR
+from bench.mock_llm_server import MockConfig, MockLLMServer
+from bench.parsing_equivalence import load_corpus, DEFAULT_SOURCES
+from bt.config import Settings
+from bt.db import connect, gen_run_key
+from bt.pipeline import run_once
+from bt.util.git import get_git_info
+
+
+def synthetic_rows(n: int, per_query: int, seed: int) -> List[Dict[str, Any]]:
+    """n qrel rows, `per_query` passages per query, texts cycled from the recorded prompts."""
+    base = echoed_rows(load_corpus(DEFAULT_SOURCES)) or [
+        {"query_text": "what is a benchmark", "doc_text": "A benchmark is a standard point of reference."}
+    ]
+    rng = random.Random(seed)
+    rows = []
+    for k in range(n):
+        q = base[(k // per_query) % len(base)]
+        d = base[k % len(base)]
+        rows.append({
+            "query_id": f"q{k // per_query:06d}", "query_text": q["query_text"],
+            "doc_id": f"d{k:07d}", "doc_text": d["doc_text"], "gold_score": rng.randint(0, 3),
+        })
+    return rows
+
+
+def create_bench_schema(conn, schema: str, rows: List[Dict[str, Any]]) -> None:
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            CREATE SCHEMA {schema};
+            CREATE TABLE {schema}.queries (query_id text PRIMARY KEY, "text" text NOT NULL);
+            CREATE TABLE {schema}.docs    (doc_id text PRIMARY KEY, text text);
+            CREATE TABLE {schema}.qrels   (query_id text NOT NULL, doc_id text NOT NULL,
+                                           relevance smallint NOT NULL, PRIMARY KEY (query_id, doc_id));
+        """)
+        queries = {r["query_id"]: r["query_text"] for r in rows}
+        psycopg2.extras.execute_values(cur, f"INSERT INTO {schema}.queries VALUES %s", list(queries.items()))
+        psycopg2.extras.execute_values(cur, f"INSERT INTO {schema}.docs VALUES %s",
+                                       [(r["doc_id"], r["doc_text"]) for r in rows])
+        psycopg2.extras.execute_values(cur, f"INSERT INTO {schema}.qrels VALUES %s",
+                                       [(r["query_id"], r["doc_id"], r["gold_score"]) for r in rows])
+    conn.commit()
+
+
+def percentile(values: List[float], p: float) -> float | None:
+    """Nearest-rank percentile."""
+    if not values:
+        return None
+    v = sorted(values)
+    k = max(0, min(len(v) - 1, math.ceil(p / 100.0 * len(v)) - 1))
+    return v[k]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, default=200)
+    ap.add_argument("--per-query", type=int, default=10, help="passages per synthetic query")
+    ap.add_argument("--provider", choices=["ollama", "hf_endpoint", "openai"], default="ollama")
+    ap.add_argument("--concurrency", type=int, default=1)
+    ap.add_argument("--commit-every", type=int, default=Settings.commit_every)
+    ap.add_argument("--write-behind", action="store_true")
+    ap.add_argument("--async-mode", action="store_true")
+    ap.add_argument("--stream", action="store_true", help="ollama_stream=true")
+    ap.add_argument("--structured", action="store_true", help="structured_output=true")
+    ap.add_argument("--scoring-mode", default="generate", help="generate | logprobs")
+    ap.add_argument("--judging-mode", default="pointwise")
+    ap.add_argument("--batch-size", type=int, default=1, help="prompts per request (provider openai)")
+    ap.add_argument("--llm-timeout-ms", type=int, default=5000)
+    ap.add_argument("--retry-attempts", type=int, default=Settings.retry_attempts)
+    # mock server behaviour
+    ap.add_argument("--latency-scale", type=float, default=0.005)
+    ap.add_argument("--latency-ms", type=float, default=None)
+    ap.add_argument("--timeout-rate", type=float, default=0.0)
+    ap.add_argument("--malformed-rate", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--load-s", type=float, default=0.0, help="simulated Ollama model (re)load time")
+    ap.add_argument("--keep", action="store_true", help="keep the bench schema for inspection")
+    ap.add_argument("--no-save", action="store_true")
+    args = ap.parse_args()
+
+    schema = f"bench_{secrets.token_hex(4)}"
+    mock_cfg = MockConfig.from_recorded(
+        latency_scale=args.latency_scale, latency_ms=args.latency_ms, timeout_rate=args.timeout_rate,
+        hang_s=max(1.0, 3 * args.llm_timeout_ms / 1000.0), malformed_rate=args.malformed_rate, seed=args.seed,
+        load_s=args.load_s,
+    )
+
+    conn = connect()
+    try:
+        create_bench_schema(conn, schema, synthetic_rows(args.items, args.per_query, args.seed))
+        with MockLLMServer(mock_cfg) as srv:
+            cfg = dataclasses.replace(
+                Settings(),
+                data_schema=schema, audit_schema=schema, provider=args.provider, model="mock",
+                ollama_base_url=srv.base_url, hf_endpoint_url=f"{srv.base_url}/generate", openai_base_url=srv.base_url,
+                ollama_stream=args.stream, structured_output=args.structured, scoring_mode=args.scoring_mode, limit_qrels=args.items, concurrency=args.concurrency,
+                commit_every=args.commit_every, write_behind=args.write_behind, async_mode=args.async_mode,
+                judging_mode=args.judging_mode, batch_size=args.batch_size, llm_timeout_ms=args.llm_timeout_ms,
+                retry_attempts=args.retry_attempts, user_notes="bench/throughput.py",
+            )
+            run_key = gen_run_key()
+            t0 = time.perf_counter()
+            stats = run_once(cfg, run_key=run_key)
+            wall = time.perf_counter() - t0
+            requests = srv.behaviour.requests
+            model_loads = srv.behaviour.loads
+
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT ms_total, tokens_out FROM {schema}.llm_predictions WHERE run_key = %s;", (run_key,))
+            rows = cur.fetchall()
+        latencies = [r[0] for r in rows if r[0] is not None]
+        tokens_out = [r[1] for r in rows if r[1] is not None]
+        conn.commit()
+    finally:
+        if not args.keep:
+            with conn.cursor() as cur:
+                cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE;")
+            conn.commit()
+        conn.close()
+
+    items = stats.items if stats else 0
+    report = {
+        "items": items,
+        "llm_requests": requests,
+        "model_loads": model_loads,
+        "load_s": round(stats.load_seconds, 3) if stats and stats.load_seconds is not None else None,
+        "wall_s": round(wall, 3),
+        "items_per_s": round(items / wall, 2) if wall > 0 else None,
+        "latency_ms_p50": percentile(latencies, 50),
+        "latency_ms_p95": percentile(latencies, 95),
+        "latency_ms_p99": percentile(latencies, 99),
+        "db_ms_per_item": round(1000.0 * stats.db_seconds / stats.db_rows, 3) if stats and stats.db_rows else None,
+        "invalid_pct": round(stats.invalid_pct, 2) if stats else None,
+        "tokens_out_avg": round(sum(tokens_out) / len(tokens_out), 1) if tokens_out else None,
+    }
+    print(json.dumps(report, indent=2))
+
+    if not args.no_save:
+        git = get_git_info()
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+        out = {
+            "git_commit": git.commit if git else None,
+            "git_dirty": git.dirty if git else None,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "args": vars(args),
+            "report": report,
+        }
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"throughput_{git.commit if git else 'nogit'}_{stamp}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(out, f, indent=2)
+        print(f"Saved {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,41 @@
 # bt/call.py
 from __future__ import annotations
 import time
+import random
+import asyncio
 import logging
-from typing import Callable, Tuple, Any, Dict
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Awaitable, Callable, Tuple, Any, Dict, List, Optional
 
 log = logging.getLogger("bt.llm.retry")
 
+BACKOFF_MODES = ("fixed", "exponential")
+
+
+def backoff_s(i: int, backoff_ms: int, mode: str = "fixed", max_ms: int | None = None) -> float:
+    """
+    Delay before retry number `i` (1-based). 'fixed' waits backoff_ms every time;
+    'exponential' doubles it per attempt up to max_ms and picks a random point in
+    the upper half of that ("equal jitter"), so parallel workers don't retry in lockstep.
+    """
+    base = max(0, int(backoff_ms))
+    if mode != "exponential":
+        return base / 1000.0
+    cap = base * (2 ** (i - 1))
+    if max_ms is not None:
+        cap = min(cap, int(max_ms))
+    return random.uniform(cap / 2.0, cap) / 1000.0
+
+
 def call_with_retry(
     fn: Callable[[], Tuple[int | None, str | None, Dict[str, Any], int]],
     attempts: int,
     enabled: bool,
     backoff_ms: int,
+    backoff: str = "fixed",
+    backoff_max_ms: int | None = None,
 ) -> Tuple[int | None, str | None, Dict[str, Any], int]:
     """
     Calls `fn()` up to `attempts` times (if `enabled`), accumulating elapsed time.
@@ -33,27 +58,351 @@ def call_with_retry(
             log.debug("LLM call attempt %d/%d succeeded.", i, attempts)
             return pred, reason, raw, total_ms
 
-        # pred=None -> either parse miss or timeout (provider should put error='timeout' in raw)
-        provider = (raw or {}).get("provider", "unknown")
-        if raw and raw.get("error") == "timeout":
-            # If the single-call returned its own elapsed ms, prefer that;
-            # otherwise log the per-attempt ms we accumulated.
-            per_attempt_ms = (raw.get("elapsed_ms") if isinstance(raw.get("elapsed_ms"), int) else ms) or 0
-            log.warning(
-                "LLM (%s) call timed out on attempt %d/%d after %d ms",
-                provider, i, attempts, per_attempt_ms
-            )
-        else:
-            log.warning(
-                "LLM (%s) call returned no prediction on attempt %d/%d",
-                provider, i, attempts
-            )
+        _log_failed_attempt(raw, ms, i, attempts)
 
         if not enabled or i == attempts:
             break
 
-        log.debug("Retrying in %d ms…", backoff_ms)
-        time.sleep(max(0, backoff_ms) / 1000.0)
+        delay = backoff_s(i, backoff_ms, backoff, backoff_max_ms)
+        log.debug("Retrying in %d ms…", int(delay * 1000))
+        time.sleep(delay)
 
     log.warning("LLM call failed after %d attempts; returning None", attempts)
     return None, last_reason, (last_raw or {}), total_ms
+
+
+async def acall_with_retry(
+    fn: Callable[[], Awaitable[Tuple[int | None, str | None, Dict[str, Any], int]]],
+    attempts: int,
+    enabled: bool,
+    backoff_ms: int,
+    backoff: str = "fixed",
+    backoff_max_ms: int | None = None,
+) -> Tuple[int | None, str | None, Dict[str, Any], int]:
+    """
+    Async twin of `call_with_retry`: awaits `fn()` and backs off with
+    `asyncio.sleep`, so retries never block the event loop.
+    """
+    attempts = max(1, int(attempts))
+    total_ms = 0
+    last_raw: Dict[str, Any] | None = None
+    last_reason: str | None = None
+
+    for i in range(1, attempts + 1):
+        log.debug("LLM call attempt %d/%d", i, attempts)
+
+        pred, reason, raw, ms = await fn()
+        total_ms += (ms or 0)
+        last_raw = raw
+        last_reason = reason
+
+        if pred is not None:
+            log.debug("LLM call attempt %d/%d succeeded.", i, attempts)
+            return pred, reason, raw, total_ms
+
+        _log_failed_attempt(raw, ms, i, attempts)
+
+        if not enabled or i == attempts:
+            break
+
+        delay = backoff_s(i, backoff_ms, backoff, backoff_max_ms)
+        log.debug("Retrying in %d ms…", int(delay * 1000))
+        await asyncio.sleep(delay)
+
+    log.warning("LLM call failed after %d attempts; returning None", attempts)
+    return None, last_reason, (last_raw or {}), total_ms
+
+
+def _log_failed_attempt(raw: Dict[str, Any] | None, ms: int, i: int, attempts: int) -> None:
+    # pred=None -> either parse miss or timeout (provider should put error='timeout' in raw)
+    provider = (raw or {}).get("provider", "unknown")
+    if raw and raw.get("error") == "timeout":
+        # If the single-call returned its own elapsed ms, prefer that;
+        # otherwise log the per-attempt ms we accumulated.
+        per_attempt_ms = (raw.get("elapsed_ms") if isinstance(raw.get("elapsed_ms"), int) else ms) or 0
+        log.warning(
+            "LLM (%s) call timed out on attempt %d/%d after %d ms",
+            provider, i, attempts, per_attempt_ms
+        )
+    else:
+        log.warning(
+            "LLM (%s) call returned no prediction on attempt %d/%d",
+            provider, i, attempts
+        )
+
+
+def call_many_with_retry(
+    fn: Callable[[List[int]], List[Result]],
+    n: int,
+    attempts: int,
+    enabled: bool,
+    backoff_ms: int,
+    backoff: str = "fixed",
+    backoff_max_ms: int | None = None,
+) -> List[Result]:
+    """
+    Batched `call_with_retry`: `fn(positions)` judges the items at those positions in
+    one request and returns their results in the same order. Only items still
+    without a prediction are sent again; elapsed ms accumulate per item.
+    """
+    attempts = max(1, int(attempts))
+    results: List[Result] = [(None, None, {}, 0)] * n
+    total_ms = [0] * n
+    pending = list(range(n))
+
+    for i in range(1, attempts + 1):
+        log.debug("Batched LLM call attempt %d/%d (%d items)", i, attempts, len(pending))
+        for j, res in zip(pending, fn(pending)):
+            results[j] = res
+            total_ms[j] += (res[3] or 0)
+        failed = [j for j in pending if results[j][0] is None]
+        if failed:
+            raw = results[failed[0]][2] or {}
+            log.warning("LLM (%s) batch: %d/%d items without a prediction on attempt %d/%d%s",
+                        raw.get("provider", "unknown"), len(failed), len(pending), i, attempts,
+                        " (timeout)" if raw.get("error") == "timeout" else "")
+        pending = failed
+
+        if not pending or not enabled or i == attempts:
+            break
+
+        delay = backoff_s(i, backoff_ms, backoff, backoff_max_ms)
+        log.debug("Retrying %d items in %d ms…", len(pending), int(delay * 1000))
+        time.sleep(delay)
+
+    if pending:
+        log.warning("%d batched LLM calls failed after %d attempts; returning None", len(pending), attempts)
+    return [(pred, reason, raw, total_ms[j]) for j, (pred, reason, raw, _) in enumerate(results)]
+
+
+# --- Per-call timeouts -------------------------------------------------------
+
+class CallTimeouts:
+    """
+    Read timeout for one LLM call. Fixed (llm_timeout_ms) unless adaptive_timeout is on:
+    then it is timeout_factor × the timeout_percentile of recent successful latencies,
+    scaled up for prompts longer than the median observed prompt, clamped to
+    [timeout_min_ms, llm_timeout_ms]. Falls back to llm_timeout_ms until enough samples.
+    """
+
+    def __init__(self, s, window: int = 200, min_samples: int = 20):
+        self.fixed_ms = s.llm_timeout_ms if (s.llm_timeout_ms and s.llm_timeout_ms > 0) else None
+        self.adaptive = bool(s.adaptive_timeout)
+        self.percentile = float(s.timeout_percentile)
+        self.factor = float(s.timeout_factor)
+        self.min_ms = int(s.timeout_min_ms)
+        self.min_samples = max(1, int(min_samples))
+        self._samples: deque[Tuple[int, int]] = deque(maxlen=max(1, int(window)))  # (ms, prompt_chars)
+        self._lock = threading.Lock()
+
+    def observe(self, prompt: str, ms: int) -> None:
+        if self.adaptive:
+            with self._lock:
+                self._samples.append((int(ms), len(prompt)))
+
+    def timeout_ms(self, prompt: str) -> Optional[int]:
+        if not self.adaptive:
+            return self.fixed_ms
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return self.fixed_ms
+            lat = sorted(ms for ms, _ in self._samples)
+            chars = sorted(c for _, c in self._samples)
+        k = max(0, min(len(lat) - 1, int(-(-self.percentile * len(lat) // 100)) - 1))
+        median_chars = chars[len(chars) // 2] or 1
+        scale = max(1.0, len(prompt) / median_chars)
+        t = max(self.min_ms, int(self.factor * lat[k] * scale))
+        return min(t, self.fixed_ms) if self.fixed_ms is not None else t
+
+    def timeout_s(self, prompt: str) -> Optional[float]:
+        ms = self.timeout_ms(prompt)
+        return ms / 1000.0 if ms is not None else None
+
+
+# --- Hedged requests ---------------------------------------------------------
+
+Result = Tuple[Any, str | None, Dict[str, Any], int]
+
+
+class LatencyTracker:
+    """Rolling window of recent call latencies (ms); thread-safe."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self._samples: deque[int] = deque(maxlen=max(1, int(window)))
+        self._lock = threading.Lock()
+        self.min_samples = max(1, int(min_samples))
+
+    def observe(self, ms: int) -> None:
+        with self._lock:
+            self._samples.append(int(ms))
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Nearest-rank percentile, or None until `min_samples` latencies were seen."""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            v = sorted(self._samples)
+        k = max(0, min(len(v) - 1, int(-(-p * len(v) // 100)) - 1))
+        return float(v[k])
+
+
+class Hedger:
+    """
+    Hedging policy for one client: if an attempt is still in flight after the
+    `percentile`-th latency of recent calls (but at least `min_delay_ms`), a duplicate
+    request is started, up to `max_hedges` extra ones. The first valid prediction wins
+    and the others are told to stop: their task is cancelled (arun) or their `cancel`
+    Event is set (run). A sync attempt only stops if it checks `cancel` (Ollama streams
+    and hangs up at its next chunk); otherwise the loser runs to completion on the
+    server, so a client with such attempts passes cancellable=False to size the pool
+    for those leftovers. The winner's raw gets raw["hedge"] = {requests, winner, delay_ms}.
+    Until the tracker has enough samples, calls run unhedged.
+    """
+
+    def __init__(self, *, percentile: float, max_hedges: int, min_delay_ms: int,
+                 window: int = 200, min_samples: int = 20, max_workers: int = 8):
+        self.percentile = float(percentile)
+        self.max_hedges = max(1, int(max_hedges))
+        self.min_delay_ms = max(0, int(min_delay_ms))
+        self.tracker = LatencyTracker(window=window, min_samples=min_samples)
+        self._pool = ThreadPoolExecutor(max_workers=max(2, int(max_workers)), thread_name_prefix="bt-hedge")
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedged_calls = 0
+        self.hedge_wins = 0
+
+    @classmethod
+    def from_settings(cls, s, *, cancellable: bool = True) -> Optional["Hedger"]:
+        if not s.hedge_enabled:
+            return None
+        # losers that cannot be stopped keep their worker while the caller moves on: leave room for
+        # one full set of them next to the calls in flight, so new attempts never queue behind them
+        workers = max_in_flight(s) * (1 if cancellable else 2)
+        return cls(
+            percentile=s.hedge_percentile, max_hedges=s.hedge_max, min_delay_ms=s.hedge_min_delay_ms,
+            min_samples=s.hedge_min_samples, max_workers=workers,
+        )
+
+    def delay_s(self) -> Optional[float]:
+        p = self.tracker.percentile(self.percentile)
+        if p is None:
+            return None
+        return max(p, self.min_delay_ms) / 1000.0
+
+    def _finish(self, res: Result, winner: int, requests: int, delay_s: Optional[float], t0: float) -> Result:
+        pred, reason, raw, own_ms = res
+        if pred is not None:
+            self.tracker.observe(own_ms)
+        with self._lock:
+            self.calls += 1
+            if requests > 1:
+                self.hedged_calls += 1
+                if winner > 0 and pred is not None:
+                    self.hedge_wins += 1
+        if requests > 1:
+            raw = dict(raw or {})
+            raw["hedge"] = {"requests": requests, "winner": winner,
+                            "delay_ms": int(1000 * delay_s) if delay_s is not None else None}
+            log.debug("Hedged call: %d requests, winner=%d", requests, winner)
+        # Report the latency the caller actually waited
+        return pred, reason, raw, int((time.time() - t0) * 1000)
+
+    def run(self, attempt: Callable[[threading.Event], Result]) -> Result:
+        """Run `attempt(cancel)` with hedging; `attempt` should stop early once `cancel` is set."""
+        t0 = time.time()
+        delay = self.delay_s()
+        if delay is None:
+            return self._finish(attempt(threading.Event()), 0, 1, None, t0)
+
+        events: list[threading.Event] = []
+        index: dict = {}
+
+        def launch():
+            ev = threading.Event()
+            index[self._pool.submit(attempt, ev)] = len(events)
+            events.append(ev)
+
+        launch()
+        pending = set(index)
+        last: Optional[Result] = None
+        last_idx = 0
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                can_hedge = len(events) <= self.max_hedges
+                timeout = max(0.0, t0 + delay * len(events) - time.time()) if can_hedge else None
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    launch()
+                    pending = {f for f in index if not f.done()}
+                    continue
+                for f in done:
+                    try:
+                        res = f.result()
+                    except Exception as e:  # a failed duplicate must not hide a later success
+                        error = e
+                        continue
+                    last, last_idx = res, index[f]
+                    if res[0] is not None:
+                        return self._finish(res, index[f], len(events), delay, t0)
+        finally:
+            for ev in events:
+                ev.set()
+        if last is None and error is not None:
+            raise error
+        return self._finish(last, last_idx, len(events), delay, t0)
+
+    async def arun(self, attempt: Callable[[], Awaitable[Result]]) -> Result:
+        """asyncio variant of `run`: duplicates are tasks, losers are cancelled."""
+        t0 = time.time()
+        delay = self.delay_s()
+        if delay is None:
+            return self._finish(await attempt(), 0, 1, None, t0)
+
+        index: dict = {}
+
+        def launch():
+            index[asyncio.ensure_future(attempt())] = len(index)
+
+        launch()
+        pending = set(index)
+        last: Optional[Result] = None
+        last_idx = 0
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                can_hedge = len(index) <= self.max_hedges
+                timeout = max(0.0, t0 + delay * len(index) - time.time()) if can_hedge else None
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    launch()
+                    pending = {t for t in index if not t.done()}
+                    continue
+                for t in done:
+                    try:
+                        res = t.result()
+                    except Exception as e:
+                        error = e
+                        continue
+                    last, last_idx = res, index[t]
+                    if res[0] is not None:
+                        return self._finish(res, index[t], len(index), delay, t0)
+        finally:
+            for t in index:
+                if not t.done():
+                    t.cancel()
+        if last is None and error is not None:
+            raise error
+        return self._finish(last, last_idx, len(index), delay, t0)
+
+    def close(self) -> None:
+        if self.hedged_calls:
+            log.info("Hedging: %d/%d calls hedged, %d won by a duplicate", self.hedged_calls, self.calls, self.hedge_wins)
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def max_in_flight(s) -> int:
+    """Upper bound of concurrent HTTP requests of one client (connection pool size)."""
+    # each item may have its self-consistency samples in flight at once, each possibly hedged
+    per_item = (1 + (int(s.hedge_max) if s.hedge_enabled else 0)) * max(1, int(s.samples_per_item))
+    return max(1, int(s.concurrency or 1)) * per_item
@@ -1,7 +1,7 @@
 # bt/config.py
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import Optional, List, Dict, Any
+from dataclasses import dataclass, asdict
+from typing import Optional, List, Dict, Any, Tuple
 import json
 import pathlib
 import os
@@ -28,6 +28,7 @@ class Settings:
     temperature: float = 0.0
     reasoning_enabled: bool = False
     llm_timeout_ms: Optional[int] = 120000
+    seed: Optional[int] = None       # decoding seed sent to the provider (None: provider default)
 
     # HF Inference Endpoint…
     hf_endpoint_url: Optional[str] = None
@@ -37,20 +38,108 @@ class Settings:
     top_k: Optional[int] = None
     repetition_penalty: Optional[float] = None
 
+    # OpenAI-compatible /v1/completions server (vLLM, llama.cpp server, TGI); provider "openai"
+    openai_base_url: Optional[str] = None   # e.g. "http://gpu1:8000" (without /v1)
+    openai_api_key: Optional[str] = None
+
+    # Ollama
+    ollama_base_url: str = "http://127.0.0.1:11434"
+    ollama_stream: bool = False      # stream /api/generate and stop once the answer after the reasoning holds a score object
+    # provider "ollama_pool": [{"url": "http://gpu1:11434", "weight": 2, "max_concurrency": 4}, …]
+    ollama_endpoints: Optional[List[Dict[str, Any]]] = None
+    pool_eject_after: int = 3        # consecutive timeouts/errors before an endpoint is taken out
+    pool_reprobe_s: float = 30.0     # how long an ejected endpoint rests before it is probed again
+    # num_ctx is picked per prompt from these sizes (and never shrinks), so the model is not
+    # reloaded for every prompt length; None leaves the model's default context
+    num_ctx_buckets: Optional[Tuple[int, ...]] = (4096, 8192, 16384, 32768)
+    num_ctx_reserve: int = 1024      # tokens kept free for the answer when no output cap applies
+    ollama_keep_alive: Optional[str] = "30m"  # keep the model loaded between requests (and runs of a sweep)
+    warm_up: bool = True             # load the model before the run timer starts; load time is logged apart
+
     # Run behavior
     max_text_chars: Optional[int] = None
-    commit_every: int = 5
+    commit_every: int = 5            # predictions per batched upsert + commit
+    flush_interval_s: Optional[float] = None  # also flush when this many seconds passed since the last flush
+    write_behind: bool = False       # persist predictions on a background thread (bounded queue)
+    write_queue_size: int = 1000     # max predictions waiting for the writer before the judge loop blocks
     limit_qrels: Optional[int] = 1000
     start_qrel: Optional[int] = None
     end_qrel: Optional[int] = None
+    concurrency: int = 1             # parallel in-flight LLM calls (match OLLAMA_NUM_PARALLEL / endpoint replicas)
+    async_mode: bool = False         # asyncio clients + run_once_async instead of a thread pool
+    qrel_itersize: int = 2000        # rows per server-side cursor round-trip when streaming qrels
+    judging_mode: str = "pointwise"  # "pointwise" | "listwise" (one call per group of passages of a query)
+    listwise_size: int = 10          # max passages per listwise prompt
+    batch_size: int = 1              # pointwise prompts per request for batching providers ("openai")
+    batch_max_tokens: Optional[int] = None  # also cap a batch by estimated prompt + completion tokens
 
     official: bool = False
     user_notes: Optional[str] = None
 
+    # Sharded runs (run.py --coordinate / --worker)
+    chunk_size: int = 50             # qrels per work-queue chunk
+    chunk_heartbeat_s: float = 30.0  # how often a worker refreshes its claim
+    chunk_stale_after_s: float = 300.0  # a claim without heartbeat for this long is re-claimed
+
+    # Reasoning models (deepseek-r1 style; Ollama providers)
+    think: Optional[bool] = None     # Ollama `think`: None = model default, False = no thinking phase
+    think_budget_tokens: Optional[int] = None  # cut thinking off after this many tokens (implies think) …
+    think_force_answer: bool = True  # … and ask for the answer given the reasoning so far (else: item invalid)
+
+    # Scoring: "generate" parses the generated answer; "logprobs" generates one token and reads
+    # the probability of "0".."3" from the provider's top token logprobs
+    scoring_mode: str = "generate"
+    logprobs_top_n: int = 5          # candidates requested for the score token (TGI's default cap is 5)
+
+    # Cascade judging: every item goes to the first stage; only items an escalation rule flags go on
+    # to the next. A stage is a judge or a list of judges (a panel); a judge is a model name or a dict
+    # of settings overrides, e.g. {"model": "deepseek-r1:32b", "ollama_base_url": "http://gpu2:11434"}
+    cascade_models: Optional[List[Any]] = None
+    cascade_escalate: Tuple[str, ...] = ("invalid",)  # "invalid" | "band" | "confidence" | "disagree" (panels)
+    cascade_band: Tuple[int, ...] = (1, 2)            # "band": scores too confusable to stop at
+    cascade_min_confidence: float = 0.8               # "confidence": min top score probability (scoring_mode="logprobs")
+
+    # Self-consistency: judge each item up to k times (use temperature > 0) and aggregate the votes;
+    # sampling stops as soon as the remaining samples cannot change the result
+    samples_per_item: int = 1
+    sample_aggregation: str = "majority"  # "majority" | "mean" (rounded to a score)
+    sample_seed: int = 0                  # sample j decodes with seed sample_seed + j
+
+    # Re-judging (rejudge.py): judge only the items these finished runs disagree on, instead of the
+    # qrel window (start_qrel / end_qrel / limit_qrels are ignored)
+    rejudge_runs: Optional[List[str]] = None
+    rejudge_against_gold: bool = True     # a unanimous label that misses gold_score is re-judged too
+
+    # Structured output: constrain pointwise answers to the score JSON schema and cap their length
+    structured_output: bool = False
+    answer_max_tokens: int = 16              # generation cap with structured_output (score only)
+    answer_max_tokens_with_reason: int = 200 # … when reasoning_enabled also asks for a reason
+
     # Retries
     retry_enabled: bool = True
     retry_attempts: int = 2
     retry_backoff_ms: int = 50
+    retry_backoff: str = "fixed"     # "fixed" | "exponential" (doubling per attempt, with jitter)
+    retry_backoff_max_ms: int = 10000
+
+    # Timeouts / deadline
+    adaptive_timeout: bool = False   # derive per-call timeouts from observed latencies (capped by llm_timeout_ms)
+    timeout_percentile: float = 99.0
+    timeout_factor: float = 2.0      # timeout = factor × percentile latency × prompt-length scale
+    timeout_min_ms: int = 10000
+    max_run_seconds: Optional[float] = None  # stop taking new items after this long and finalize
+
+    # Hedged requests: duplicate a call still running past a latency percentile
+    hedge_enabled: bool = False
+    hedge_percentile: float = 95.0   # of recently observed call latencies
+    hedge_min_delay_ms: int = 1000   # never hedge earlier than this
+    hedge_max: int = 1               # extra requests per call
+    hedge_min_samples: int = 20      # latencies to observe before hedging kicks in
+
+    # Judgment cache (local SQLite, keyed by model, decoding params and prompt hash)
+    cache_mode: str = "off"          # "off" | "read" | "read_write"; bypassed at temperature > 0 without a seed
+    cache_path: str = "cache/judgments.sqlite3"
+    cache_max_entries: int = 200000
 
 
 def load_settings_file(path: str | pathlib.Path) -> List[Settings]:
@@ -72,11 +161,26 @@ def load_settings_file(path: str | pathlib.Path) -> List[Settings]:
 
     raise ValueError("Config JSON must be either an object or an array of objects.")
 
+def settings_from_dict(d: Dict[str, Any]) -> Settings:
+    """Build Settings from a plain dict (e.g. llm_runs.settings_json); unknown keys are ignored."""
+    return _from_dict(d)
+
+
+def settings_to_dict(s: Settings) -> Dict[str, Any]:
+    """Serializable settings for llm_runs.settings_json. Never persists the API tokens (HF, OpenAI)."""
+    d = asdict(s)
+    d.pop("hf_api_token", None)
+    d.pop("openai_api_key", None)
+    return d
+
+
 def _from_dict(d: Dict[str, Any]) -> Settings:
-    # allow token from env if not provided in JSON
+    # allow tokens from env if not provided in JSON
     merged = dict(d)
     if not merged.get("hf_api_token"):
         merged["hf_api_token"] = os.getenv("HUGGINGFACE_API_TOKEN")
+    if not merged.get("openai_api_key"):
+        merged["openai_api_key"] = os.getenv("OPENAI_API_KEY")
 
     allowed = {f.name for f in Settings.__dataclass_fields__.values()}
     filtered = {k: v for k, v in merged.items() if k in allowed}
@@ -4,10 +4,13 @@ import json
 import hashlib
 import logging
 import secrets
+import time
+import queue
+import threading
 import psycopg2
 import psycopg2.extras
 
-from bt.config import Pg
+from bt.config import Pg, Settings, settings_from_dict
 
 log = logging.getLogger("bt.db")
 
@@ -18,11 +21,13 @@ def gen_run_key(n: int = 12) -> str:
     return "".join(secrets.choice(ALPHABET) for _ in range(n))
 
 
-def connect(pg: Pg = Pg()):
+def connect(pg: Pg = Pg(), *, readonly: bool = False):
     dsn = f"host={pg.host} port={pg.port} dbname={pg.dbname} user={pg.user} password={pg.password}"
     log.info("Connecting to Postgres (host=%s port=%s db=%s user=%s)", pg.host, pg.port, pg.dbname, pg.user)
     conn = psycopg2.connect(dsn)
     conn.autocommit = False
+    if readonly:
+        conn.set_session(readonly=True)
     log.debug("Connection established; autocommit=%s", conn.autocommit)
     return conn
 
@@ -74,6 +79,18 @@ def ensure_audit_schema(conn, audit_schema: str):
         cur.execute(f"ALTER TABLE {audit_schema}.llm_runs ADD COLUMN IF NOT EXISTS finished BOOLEAN NOT NULL DEFAULT FALSE;")
         cur.execute(f"ALTER TABLE {audit_schema}.llm_runs ADD COLUMN IF NOT EXISTS start_qrel INTEGER;")
         cur.execute(f"ALTER TABLE {audit_schema}.llm_runs ADD COLUMN IF NOT EXISTS end_qrel   INTEGER;")
+        cur.execute(f"ALTER TABLE {audit_schema}.llm_runs ADD COLUMN IF NOT EXISTS concurrency INTEGER;")
+        cur.execute(f"ALTER TABLE {audit_schema}.llm_runs ADD COLUMN IF NOT EXISTS settings_json JSONB;")
+        cur.execute(f"ALTER TABLE {audit_schema}.llm_runs ADD COLUMN IF NOT EXISTS resumed_at TIMESTAMPTZ;")
+        cur.execute(f"ALTER TABLE {audit_schema}.llm_runs ADD COLUMN IF NOT EXISTS stop_reason TEXT;")
+        cur.execute(f"ALTER TABLE {audit_schema}.llm_runs ADD COLUMN IF NOT EXISTS tokens_out_total BIGINT;")
+        cur.execute(f"ALTER TABLE {audit_schema}.llm_runs ADD COLUMN IF NOT EXISTS tokens_out_avg DOUBLE PRECISION;")
+        cur.execute(f"ALTER TABLE {audit_schema}.llm_runs ADD COLUMN IF NOT EXISTS thinking_tokens_avg DOUBLE PRECISION;")
+        cur.execute(f"ALTER TABLE {audit_schema}.llm_runs ADD COLUMN IF NOT EXISTS answer_tokens_avg DOUBLE PRECISION;")
+        cur.execute(f"ALTER TABLE {audit_schema}.llm_runs ADD COLUMN IF NOT EXISTS load_seconds DOUBLE PRECISION;")
+        cur.execute(f"ALTER TABLE {audit_schema}.llm_runs ADD COLUMN IF NOT EXISTS calls_saved_pct DOUBLE PRECISION;")
+        cur.execute(f"ALTER TABLE {audit_schema}.llm_runs ADD COLUMN IF NOT EXISTS samples_avg DOUBLE PRECISION;")
+        cur.execute(f"ALTER TABLE {audit_schema}.llm_runs ADD COLUMN IF NOT EXISTS merged_from JSONB;")
 
 
         cur.execute(f"CREATE INDEX IF NOT EXISTS llm_runs_created_at_idx ON {audit_schema}.llm_runs(created_at DESC);")
@@ -97,13 +114,43 @@ def ensure_audit_schema(conn, audit_schema: str):
                 PRIMARY KEY (run_key, idx)
             );
         """)
+        cur.execute(f"ALTER TABLE {audit_schema}.llm_predictions ADD COLUMN IF NOT EXISTS tokens_out INTEGER;")
+        cur.execute(f"ALTER TABLE {audit_schema}.llm_predictions ADD COLUMN IF NOT EXISTS score_dist JSONB;")
+        cur.execute(f"ALTER TABLE {audit_schema}.llm_predictions ADD COLUMN IF NOT EXISTS expected_score DOUBLE PRECISION;")
+        cur.execute(f"ALTER TABLE {audit_schema}.llm_predictions ADD COLUMN IF NOT EXISTS thinking_tokens INTEGER;")
+        cur.execute(f"ALTER TABLE {audit_schema}.llm_predictions ADD COLUMN IF NOT EXISTS answer_tokens INTEGER;")
+        cur.execute(f"ALTER TABLE {audit_schema}.llm_predictions ADD COLUMN IF NOT EXISTS stage SMALLINT;")
+        cur.execute(f"ALTER TABLE {audit_schema}.llm_predictions ADD COLUMN IF NOT EXISTS vote_dist JSONB;")
+
+        # Self-consistency samples (samples_per_item > 1), one row per sample drawn
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {audit_schema}.llm_prediction_samples (
+                run_key          TEXT NOT NULL,
+                idx              INTEGER NOT NULL,
+                sample_no        SMALLINT NOT NULL,
+                seed             BIGINT,
+                pred_score       INTEGER,
+                pred_reason      TEXT,
+                ms_total         INTEGER,
+                raw_response     JSONB NOT NULL,
+                tokens_out       INTEGER,
+                created_at       TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                PRIMARY KEY (run_key, idx, sample_no),
+                FOREIGN KEY (run_key, idx) REFERENCES {audit_schema}.llm_predictions(run_key, idx) ON DELETE CASCADE
+            );
+        """)
     conn.commit()
     log.debug("Audit schema ensured and committed: %s", audit_schema)
 
 
-def finalize_run(conn, audit_schema: str, run_key: str):
+def finalize_run(conn, audit_schema: str, run_key: str, stop_reason: str = "completed"):
     """
-    Computes invalid percentage (pred_score IS NULL) for this run_key and marks it finished.
+    Summarizes this run_key from llm_predictions into llm_runs and marks it finished:
+      - total_items, valid_predictions, agreement_pct, invalid_pct (pred_score IS NULL)
+      - tokens_out_total/avg, thinking_tokens_avg, answer_tokens_avg
+      - calls_saved_pct (cascade runs), samples_avg (self-consistency runs)
+      - stop_reason ('completed', or 'deadline' when max_run_seconds cut it short)
+    Works from the stored rows, so a resumed run is summarized as a whole.
     """
     log.info("Finalizing run key=%s (computing invalid percentage)…", run_key)
     with conn.cursor() as cur:
@@ -111,27 +158,55 @@ def finalize_run(conn, audit_schema: str, run_key: str):
             f"""
             SELECT
               COUNT(*)::float AS total,
-              COUNT(*) FILTER (WHERE pred_score IS NULL)::float AS invalid
+              COUNT(*) FILTER (WHERE pred_score IS NULL)::float AS invalid,
+              COUNT(*) FILTER (WHERE is_correct)::float AS correct,
+              SUM(tokens_out) AS tokens_out_total,
+              AVG(tokens_out) AS tokens_out_avg,
+              AVG(thinking_tokens) AS thinking_tokens_avg,
+              AVG(answer_tokens) AS answer_tokens_avg,
+              100.0 * (1 - SUM((raw_response->'cascade'->>'calls')::int)::float
+                           / NULLIF(SUM((raw_response->'cascade'->>'calls_full')::int), 0)) AS calls_saved_pct,
+              AVG((raw_response->'sampling'->>'drawn')::int) AS samples_avg
             FROM {audit_schema}.llm_predictions
             WHERE run_key = %s;
             """,
             (run_key,)
         )
-        total, invalid = cur.fetchone()
+        total, invalid, correct, tokens_out_total, tokens_out_avg, thinking_avg, answer_avg, calls_saved_pct, samples_avg = cur.fetchone()
         invalid_pct = (invalid / total * 100.0) if total and total > 0 else 0.0
+        valid = int((total or 0) - (invalid or 0))
+        agreement_pct = (correct / valid * 100.0) if valid > 0 else None
 
         cur.execute(
             f"""
             UPDATE {audit_schema}.llm_runs
             SET finished = TRUE,
                 finished_at = NOW(),
-                invalid_pct = %s
+                total_items = %s,
+                valid_predictions = %s,
+                agreement_pct = %s,
+                invalid_pct = %s,
+                stop_reason = %s,
+                tokens_out_total = %s,
+                tokens_out_avg = %s,
+                thinking_tokens_avg = %s,
+                answer_tokens_avg = %s,
+                calls_saved_pct = %s,
+                samples_avg = %s
             WHERE run_key = %s;
             """,
-            (invalid_pct, run_key)
+            (int(total or 0), valid, agreement_pct, invalid_pct, stop_reason,
+             int(tokens_out_total) if tokens_out_total is not None else None,
+             float(tokens_out_avg) if tokens_out_avg is not None else None,
+             float(thinking_avg) if thinking_avg is not None else None,
+             float(answer_avg) if answer_avg is not None else None,
+             float(calls_saved_pct) if calls_saved_pct is not None else None,
+             float(samples_avg) if samples_avg is not None else None, run_key)
         )
     conn.commit()
-    log.info("Run %s finalized | total=%s invalid=%s (%.2f%%)", run_key, int(total or 0), int(invalid or 0), invalid_pct)
+    log.info("Run %s finalized (%s) | total=%s invalid=%s (%.2f%%) | tokens_out=%s",
+             run_key, stop_reason, int(total or 0), int(invalid or 0), invalid_pct,
+             int(tokens_out_total) if tokens_out_total is not None else "n/a")
     return invalid_pct
 
 
@@ -159,6 +234,8 @@ def start_run(
     git_dirty: bool = False,
     start_qrel: int | None = None,
     end_qrel: int | None = None,
+    concurrency: int | None = None,
+    settings_json: dict | None = None,
 ):
     with conn.cursor() as cur:
         cur.execute(
@@ -168,20 +245,21 @@ def start_run(
              max_text_chars, commit_every, limit_qrels, temperature,
              retry_enabled, retry_attempts, retry_backoff_ms, runner, official, user_notes,
              git_commit, git_branch, git_dirty,
-             start_qrel, end_qrel)
+             start_qrel, end_qrel, concurrency, settings_json)
             VALUES
             (%s,%s,%s,%s,%s,
              %s,%s,%s,%s,
              %s,%s,%s,%s,%s,%s,
              %s,%s,%s,
-             %s,%s);
+             %s,%s,%s,%s);
             """,
             (
                 run_key, model, prompt_template, data_schema, audit_schema_name,
                 max_text_chars, commit_every, limit_qrels, temperature,
                 retry_enabled, retry_attempts, retry_backoff_ms, runner, official, user_notes,
                 git_commit, git_branch, git_dirty,
-                start_qrel, end_qrel,
+                start_qrel, end_qrel, concurrency,
+                (json.dumps(settings_json) if settings_json is not None else None),
             ),
         )
     conn.commit()
@@ -189,6 +267,280 @@ def start_run(
     return run_key
 
 
+def resume_run(conn, audit_schema: str, run_key: str) -> None:
+    """
+    Reopen an existing run so further predictions can be appended under the same key.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            UPDATE {audit_schema}.llm_runs
+            SET finished = FALSE,
+                finished_at = NULL,
+                stop_reason = NULL,
+                resumed_at = NOW()
+            WHERE run_key = %s;
+            """,
+            (run_key,)
+        )
+        if cur.rowcount != 1:
+            raise ValueError(f"Run {run_key} not found in {audit_schema}.llm_runs")
+    conn.commit()
+    log.info("Run resumed: key=%s", run_key)
+
+
+def record_load_seconds(conn, audit_schema: str, run_key: str, seconds: float) -> None:
+    """
+    Store the model warm-up time of a run (kept apart from its judging time). With
+    several workers or a resume, the longest load any of them waited for is kept.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            UPDATE {audit_schema}.llm_runs
+            SET load_seconds = GREATEST(COALESCE(load_seconds, 0), %s)
+            WHERE run_key = %s;
+            """,
+            (float(seconds), run_key)
+        )
+    conn.commit()
+
+
+def fetch_run_timings(conn, audit_schema: str, model: str, limit: int = 20) -> list[dict]:
+    """
+    Wall time of recent finished, never-resumed runs of `model` (llm_runs.model, i.e. a
+    client's model_label), newest first: concurrency, total_items, seconds (created to
+    finished, model load included) and load_seconds.
+    """
+    with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        cur.execute(
+            f"""
+            SELECT concurrency, total_items, load_seconds,
+                   EXTRACT(EPOCH FROM finished_at - created_at)::float AS seconds
+            FROM {audit_schema}.llm_runs
+            WHERE model = %s AND finished AND resumed_at IS NULL
+              AND total_items > 0 AND finished_at IS NOT NULL
+            ORDER BY created_at DESC
+            LIMIT %s;
+            """,
+            (model, int(limit))
+        )
+        rows = [dict(r) for r in cur.fetchall()]
+    conn.commit()
+    return rows
+
+
+def load_run_settings(conn, audit_schema: str, run_key: str) -> Settings:
+    """
+    Rebuild the Settings a run was started with. Uses the stored settings_json when
+    present; older runs are reconstructed from the individual llm_runs columns.
+    """
+    with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+        cur.execute(f"SELECT * FROM {audit_schema}.llm_runs WHERE run_key = %s;", (run_key,))
+        row = cur.fetchone()
+    if row is None:
+        raise ValueError(f"Run {run_key} not found in {audit_schema}.llm_runs")
+
+    if row.get("settings_json"):
+        return settings_from_dict(row["settings_json"])
+
+    log.warning("Run %s has no stored settings_json; reconstructing from llm_runs columns.", run_key)
+    model = row["model"] or ""
+    d = {
+        "data_schema": row["data_schema"],
+        "audit_schema": row["audit_schema_name"],
+        "max_text_chars": row["max_text_chars"],
+        "commit_every": row["commit_every"],
+        "limit_qrels": row["limit_qrels"],
+        "temperature": row["temperature"],
+        "retry_enabled": row["retry_enabled"],
+        "retry_attempts": row["retry_attempts"],
+        "retry_backoff_ms": row["retry_backoff_ms"],
+        "official": row["official"],
+        "user_notes": row["user_notes"],
+        "start_qrel": row.get("start_qrel"),
+        "end_qrel": row.get("end_qrel"),
+        # the prompt template tells us whether the run asked for a reason
+        "reasoning_enabled": "reason" in (row["prompt_template"] or "").split("QUERY:")[0],
+    }
+    # model holds the client's model_label ("ollama:deepseek-r1:14b", "hf_endpoint:<url>", …)
+    # or, for the earliest runs, the bare Ollama model name
+    provider, _, rest = model.partition(":")
+    if provider in ("ollama", "hf_hub"):
+        d.update(provider=provider, model=rest)
+    elif provider == "hf_endpoint":
+        d.update(provider=provider, hf_endpoint_url=rest)
+    else:
+        d.update(provider="ollama", model=model)
+    return settings_from_dict({k: v for k, v in d.items() if v is not None})
+
+
+def fetch_done_idxs(conn, audit_schema: str, run_key: str) -> set[int]:
+    """Return every idx already stored in llm_predictions for this run."""
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT idx FROM {audit_schema}.llm_predictions WHERE run_key = %s;", (run_key,))
+        return {int(r[0]) for r in cur.fetchall()}
+
+
+def fetch_runs(conn, audit_schema: str, run_keys: list[str]) -> list[dict]:
+    """llm_runs rows (run_key, model, data_schema, finished, stop_reason, total_items) of `run_keys`, in their order."""
+    with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        cur.execute(
+            f"""
+            SELECT run_key, model, data_schema, finished, stop_reason, total_items
+            FROM {audit_schema}.llm_runs
+            WHERE run_key = ANY(%s)
+            ORDER BY array_position(%s::text[], run_key);
+            """,
+            (list(run_keys), list(run_keys))
+        )
+        rows = [dict(r) for r in cur.fetchall()]
+    conn.commit()
+    return rows
+
+
+def _unanimous_having(against_gold: bool) -> str:
+    # HAVING clause over the predictions of one (query_id, doc_id) in the source runs: every run
+    # judged it, none invalid, all the same score (and, against gold, that score is gold_score).
+    # Takes %(runs)s (the run keys) and %(n_runs)s.
+    return f"""
+            HAVING COUNT(DISTINCT run_key) = %(n_runs)s
+               AND COUNT(pred_score) = COUNT(*)
+               AND MIN(pred_score) = MAX(pred_score)
+               {"AND MIN(pred_score) = MIN(gold_score)" if against_gold else ""}
+            """
+
+
+def fetch_disagreements(conn, audit_schema: str, run_keys: list[str], *, against_gold: bool = True):
+    """
+    Items (query_id, doc_id) of the runs `run_keys` that are not unanimous: some run is
+    missing or invalid on them, the runs' scores differ or (with `against_gold`) they
+    agree on a score other than gold_score. Returns (pairs ordered by query_id, doc_id,
+    number of distinct items across the runs).
+    """
+    params = {"runs": list(run_keys), "n_runs": len(set(run_keys))}
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            SELECT query_id, doc_id
+            FROM {audit_schema}.llm_predictions
+            WHERE run_key = ANY(%(runs)s)
+            GROUP BY query_id, doc_id
+            EXCEPT
+            SELECT query_id, doc_id
+            FROM {audit_schema}.llm_predictions
+            WHERE run_key = ANY(%(runs)s)
+            GROUP BY query_id, doc_id
+            {_unanimous_having(against_gold)}
+            ORDER BY query_id, doc_id;
+            """,
+            params
+        )
+        pairs = [(r[0], r[1]) for r in cur.fetchall()]
+        cur.execute(
+            f"""
+            SELECT COUNT(*) FROM (
+                SELECT DISTINCT query_id, doc_id FROM {audit_schema}.llm_predictions WHERE run_key = ANY(%(runs)s)
+            ) t;
+            """,
+            params
+        )
+        total = int(cur.fetchone()[0])
+    conn.commit()
+    return pairs, total
+
+
+def merge_rejudged_run(conn, audit_schema: str, *, merged_key: str, rejudge_key: str,
+                       source_keys: list[str], against_gold: bool = True) -> tuple[int, int]:
+    """
+    Create run `merged_key` holding every item of the source runs: the predictions of
+    re-judging run `rejudge_key` plus, for items the sources are unanimous on, their
+    shared label (copied from the first source run that has the item; ms_total 0 and
+    raw_response {"reused_from": run_key} since nothing was judged). Run metadata is
+    copied from `rejudge_key`, with llm_runs.merged_from recording where rows came from.
+    idx is the item's position by (query_id, doc_id). Returns (rejudged, reused) rows;
+    the caller finalizes the run.
+    """
+    params = {"merged": merged_key, "rejudged": rejudge_key, "runs": list(source_keys),
+              "n_runs": len(set(source_keys)),
+              "merged_from": json.dumps({"rejudged": rejudge_key, "reused": list(source_keys),
+                                         "against_gold": against_gold})}
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            INSERT INTO {audit_schema}.llm_runs
+            (run_key, model, prompt_template, data_schema, audit_schema_name,
+             max_text_chars, commit_every, limit_qrels, temperature,
+             retry_enabled, retry_attempts, retry_backoff_ms, runner, official, user_notes,
+             git_commit, git_branch, git_dirty,
+             start_qrel, end_qrel, concurrency, settings_json, load_seconds, merged_from)
+            SELECT %(merged)s, model, prompt_template, data_schema, audit_schema_name,
+                   max_text_chars, commit_every, limit_qrels, temperature,
+                   retry_enabled, retry_attempts, retry_backoff_ms, 'rejudge.merge', official, user_notes,
+                   git_commit, git_branch, git_dirty,
+                   start_qrel, end_qrel, concurrency, settings_json, load_seconds, %(merged_from)s::jsonb
+            FROM {audit_schema}.llm_runs
+            WHERE run_key = %(rejudged)s;
+            """,
+            params
+        )
+        if cur.rowcount != 1:
+            raise ValueError(f"Run {rejudge_key} not found in {audit_schema}.llm_runs")
+        cur.execute(
+            f"""
+            WITH src AS (
+                SELECT p.*, array_position(%(runs)s::text[], p.run_key) AS src_no
+                FROM {audit_schema}.llm_predictions p
+                WHERE p.run_key = ANY(%(runs)s)
+            ),
+            unanimous AS (
+                SELECT query_id, doc_id
+                FROM src
+                GROUP BY query_id, doc_id
+                {_unanimous_having(against_gold)}
+            ),
+            rejudged AS (
+                SELECT query_id, doc_id, gold_score, pred_score, pred_reason, is_correct, ms_total, raw_response,
+                       tokens_out, score_dist, expected_score, thinking_tokens, answer_tokens, stage, vote_dist,
+                       FALSE AS reused
+                FROM {audit_schema}.llm_predictions
+                WHERE run_key = %(rejudged)s
+            ),
+            reused AS (
+                SELECT DISTINCT ON (s.query_id, s.doc_id)
+                       s.query_id, s.doc_id, s.gold_score, s.pred_score, s.pred_reason, s.is_correct,
+                       0 AS ms_total, jsonb_build_object('reused_from', s.run_key) AS raw_response,
+                       NULL::integer AS tokens_out, NULL::jsonb AS score_dist, NULL::double precision AS expected_score,
+                       NULL::integer AS thinking_tokens, NULL::integer AS answer_tokens, NULL::smallint AS stage,
+                       NULL::jsonb AS vote_dist, TRUE AS reused
+                FROM src s
+                JOIN unanimous u ON u.query_id = s.query_id AND u.doc_id = s.doc_id
+                WHERE NOT EXISTS (SELECT 1 FROM rejudged j WHERE j.query_id = s.query_id AND j.doc_id = s.doc_id)
+                ORDER BY s.query_id, s.doc_id, s.src_no
+            ),
+            merged AS (
+                SELECT * FROM rejudged
+                UNION ALL
+                SELECT * FROM reused
+            ),
+            ins AS (
+                INSERT INTO {audit_schema}.llm_predictions
+                ({", ".join(PREDICTION_COLUMNS)})
+                SELECT %(merged)s, ROW_NUMBER() OVER (ORDER BY query_id, doc_id),
+                       {", ".join(PREDICTION_COLUMNS[2:])}
+                FROM merged
+                RETURNING 1
+            )
+            SELECT COUNT(*) FILTER (WHERE NOT reused), COUNT(*) FILTER (WHERE reused) FROM merged;
+            """,
+            params
+        )
+        rejudged, reused = cur.fetchone()
+    conn.commit()
+    log.info("Merged run %s: %d re-judged (%s) + %d reused unanimous labels", merged_key, rejudged, rejudge_key, reused)
+    return int(rejudged), int(reused)
+
+
 def count_available_qrels(conn, data_schema: str) -> int:
     sql = f"""
         SELECT COUNT(*) AS c
@@ -204,10 +556,11 @@ def count_available_qrels(conn, data_schema: str) -> int:
         return c
 
 
-def fetch_qrels(conn, data_schema: str, *, start: int | None, end: int | None, limit: int | None):
+def _qrels_window_query(data_schema: str, *, start: int | None, end: int | None, limit: int | None):
     """
-    Fetch qrels in the default ORDER BY (query_id, doc_id), applying
+    Build the qrels SELECT in the default ORDER BY (query_id, doc_id), applying
     an inclusive 1-based [start, end] window and/or a hard limit.
+    Returns (sql, params, final_limit, offset).
     """
     # Compute OFFSET and LIMIT from start/end
     # start/end are 1-based inclusive; OFFSET is 0-based
@@ -243,34 +596,332 @@ def fetch_qrels(conn, data_schema: str, *, start: int | None, end: int | None, l
         {limit_clause}
         {offset_clause};
     """
+    params = []
+    if final_limit is not None:
+        params.append(final_limit)
+    if offset:
+        params.append(offset)
+    return sql, tuple(params), final_limit, offset
+
+
+def fetch_qrels(conn, data_schema: str, *, start: int | None, end: int | None, limit: int | None):
+    """
+    Fetch qrels in the default ORDER BY (query_id, doc_id), applying
+    an inclusive 1-based [start, end] window and/or a hard limit.
+    """
+    sql, params, final_limit, offset = _qrels_window_query(data_schema, start=start, end=end, limit=limit)
     log.info("Fetching qrels (schema=%s, start=%s, end=%s, limit=%s → final_limit=%s, offset=%s)…",
              data_schema, start, end, limit, final_limit, offset)
     with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-        params = []
-        if final_limit is not None:
-            params.append(final_limit)
-        if offset:
-            params.append(offset)
-        cur.execute(sql, tuple(params))
+        cur.execute(sql, params)
         rows = cur.fetchall()
         log.info("Fetched %d qrels.", len(rows))
         return [dict(r) for r in rows]
 
 
+def iter_qrels(
+    conn,
+    data_schema: str,
+    *,
+    start: int | None,
+    end: int | None,
+    limit: int | None,
+    itersize: int = 2000,
+):
+    """
+    Streaming variant of `fetch_qrels`: same window and ordering, but rows come from a
+    named (server-side) cursor, `itersize` rows per round-trip, and are yielded as dicts.
+
+    Committing on `conn` closes the cursor, so use a connection that is only read from.
+    """
+    sql, params, final_limit, offset = _qrels_window_query(data_schema, start=start, end=end, limit=limit)
+    log.info("Streaming qrels (schema=%s, start=%s, end=%s, limit=%s → final_limit=%s, offset=%s, itersize=%d)…",
+             data_schema, start, end, limit, final_limit, offset, itersize)
+    n = 0
+    with conn.cursor(name=f"qrels_{secrets.token_hex(4)}", cursor_factory=psycopg2.extras.DictCursor) as cur:
+        cur.itersize = max(1, int(itersize))
+        cur.execute(sql, params)
+        for r in cur:
+            n += 1
+            yield dict(r)
+    log.info("Streamed %d qrels.", n)
+
+
+def iter_qrel_pairs(conn, data_schema: str, pairs: list[tuple[str, str]], *, itersize: int = 2000):
+    """
+    Like `iter_qrels`, restricted to the (query_id, doc_id) `pairs` instead of a window
+    (same ordering, same server-side cursor caveat).
+    """
+    log.info("Streaming %d selected qrels (schema=%s, itersize=%d)…", len(pairs), data_schema, itersize)
+    sql = f"""
+        SELECT
+            qr.query_id,
+            q.text AS query_text,
+            qr.doc_id,
+            d.text AS doc_text,
+            qr.relevance AS gold_score
+        FROM {data_schema}.qrels qr
+        JOIN unnest(%s::text[], %s::text[]) AS p(query_id, doc_id)
+          ON p.query_id = qr.query_id::text AND p.doc_id = qr.doc_id::text
+        JOIN {data_schema}.queries q ON q.query_id = qr.query_id
+        JOIN {data_schema}.docs    d ON d.doc_id   = qr.doc_id
+        ORDER BY qr.query_id, qr.doc_id;
+    """
+    n = 0
+    with conn.cursor(name=f"qrels_{secrets.token_hex(4)}", cursor_factory=psycopg2.extras.DictCursor) as cur:
+        cur.itersize = max(1, int(itersize))
+        cur.execute(sql, ([q for q, _ in pairs], [d for _, d in pairs]))
+        for r in cur:
+            n += 1
+            yield dict(r)
+    log.info("Streamed %d qrels.", n)
+
+
+PREDICTION_COLUMNS = (
+    "run_key", "idx", "query_id", "doc_id", "gold_score",
+    "pred_score", "pred_reason", "is_correct", "ms_total", "raw_response", "tokens_out",
+    "score_dist", "expected_score", "thinking_tokens", "answer_tokens", "stage",
+    "vote_dist",
+)
+
+SAMPLE_COLUMNS = (
+    "run_key", "idx", "sample_no", "seed", "pred_score", "pred_reason", "ms_total", "raw_response", "tokens_out",
+)
+
+
+def _prediction_upsert_sql(audit_schema: str, values: str) -> str:
+    # Upsert on the (run_key, idx) primary key so re-writing an item is idempotent
+    updates = ",\n                ".join(f"{c} = EXCLUDED.{c}" for c in PREDICTION_COLUMNS[2:])
+    return f"""
+            INSERT INTO {audit_schema}.llm_predictions
+            ({", ".join(PREDICTION_COLUMNS)})
+            VALUES {values}
+            ON CONFLICT (run_key, idx) DO UPDATE SET
+                {updates},
+                created_at = NOW();
+            """
+
+
+def _prediction_values(run_key: str, idx: int, row, pred, pred_reason, is_correct, ms_total, raw) -> tuple:
+    sampling = (raw or {}).get("sampling")
+    if sampling:
+        # the samples go to llm_prediction_samples; the prediction keeps the tally
+        raw = {**raw, "sampling": {k: v for k, v in sampling.items() if k != "samples"}}
+    return (
+        run_key, idx, row["query_id"], row["doc_id"], int(row["gold_score"]),
+        pred, pred_reason, is_correct, ms_total, json.dumps(raw, default=str),
+        _token_count(raw, "tokens_out"),
+        *_score_dist(raw),
+        _token_count(raw, "thinking_tokens"),
+        _token_count(raw, "answer_tokens"),
+        _token_count((raw or {}).get("cascade"), "stage"),
+        json.dumps(sampling["vote_dist"]) if sampling else None,
+    )
+
+
+def _sample_values(run_key: str, idx: int, raw) -> list[tuple]:
+    # rows of llm_prediction_samples for a self-consistency item (raw["sampling"]["samples"])
+    return [
+        (run_key, idx, smp["sample_no"], smp["seed"], smp["pred"], smp["reason"], smp["ms"],
+         json.dumps(smp["raw"] or {}, default=str), _token_count(smp["raw"], "tokens_out"))
+        for smp in ((raw or {}).get("sampling") or {}).get("samples", ())
+    ]
+
+
+def _write_samples(cur, audit_schema: str, keys: list[tuple[str, int]], rows: list[tuple]) -> None:
+    # replace the samples of re-written items (a resumed or re-judged item may draw fewer)
+    psycopg2.extras.execute_values(
+        cur, f"DELETE FROM {audit_schema}.llm_prediction_samples WHERE (run_key, idx) IN (VALUES %s);",
+        keys, page_size=max(1, len(keys)),
+    )
+    if rows:
+        psycopg2.extras.execute_values(
+            cur,
+            f"INSERT INTO {audit_schema}.llm_prediction_samples ({', '.join(SAMPLE_COLUMNS)}) VALUES %s;",
+            rows, page_size=len(rows),
+        )
+
+
+def _token_count(raw, key: str) -> int | None:
+    # token counts as reported by the provider (raw["tokens_out"], raw["thinking_tokens"], …), if any
+    n = (raw or {}).get(key)
+    return int(n) if isinstance(n, (int, float)) and not isinstance(n, bool) else None
+
+
+def _score_dist(raw) -> tuple:
+    # scoring_mode="logprobs": distribution over 0..3 and its expectation (raw["logprobs"])
+    info = (raw or {}).get("logprobs") or {}
+    dist = info.get("score_dist")
+    return (json.dumps(dist) if dist else None), info.get("expected_score")
+
+
 def insert_prediction(conn, audit_schema: str, run_key: str, idx: int, row, pred, pred_reason, is_correct, ms_total, raw):
     log.debug(
         "Insert prediction | idx=%s qid=%s doc=%s gold=%s pred=%s correct=%s ms=%s",
         idx, row["query_id"], row["doc_id"], int(row["gold_score"]), pred, is_correct, ms_total
     )
+    placeholders = "(" + ",".join(["%s"] * len(PREDICTION_COLUMNS)) + ")"
     with conn.cursor() as cur:
         cur.execute(
-            f"""
-            INSERT INTO {audit_schema}.llm_predictions
-            (run_key, idx, query_id, doc_id, gold_score, pred_score, pred_reason, is_correct, ms_total, raw_response)
-            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s);
-            """,
-            (
-                run_key, idx, row["query_id"], row["doc_id"], int(row["gold_score"]),
-                pred, pred_reason, is_correct, ms_total, json.dumps(raw)
-            )
+            _prediction_upsert_sql(audit_schema, placeholders),
+            _prediction_values(run_key, idx, row, pred, pred_reason, is_correct, ms_total, raw),
         )
+        samples = _sample_values(run_key, idx, raw)
+        if samples:
+            _write_samples(cur, audit_schema, [(run_key, idx)], samples)
+
+
+class PredictionWriter:
+    """
+    Buffers prediction rows and writes them with one multi-row upsert
+    (psycopg2.extras.execute_values) plus one commit per flush.
+
+    A flush happens when `flush_size` rows are buffered or `flush_interval_s`
+    seconds have passed since the last flush (checked on add), and on flush()/close().
+    Not thread-safe: feed it from one thread.
+    """
+
+    def __init__(self, conn, audit_schema: str, *, flush_size: int = 5, flush_interval_s: float | None = None):
+        self.conn = conn
+        self.audit_schema = audit_schema
+        self.flush_size = max(1, int(flush_size or 1))
+        self.flush_interval_s = flush_interval_s
+        self._buf: dict[tuple[str, int], tuple] = {}
+        self._samples: dict[tuple[str, int], list[tuple]] = {}  # self-consistency items only
+        self._last_flush = time.monotonic()
+        self.rows_written = 0
+        self.flush_seconds = 0.0
+
+    def add(self, run_key: str, idx: int, row, pred, pred_reason, is_correct, ms_total, raw) -> None:
+        log.debug(
+            "Buffer prediction | idx=%s qid=%s doc=%s gold=%s pred=%s correct=%s ms=%s",
+            idx, row["query_id"], row["doc_id"], int(row["gold_score"]), pred, is_correct, ms_total
+        )
+        # keyed by primary key: a later write of the same idx replaces the buffered one
+        # (a multi-row upsert may not touch the same row twice)
+        self._buf[(run_key, idx)] = _prediction_values(run_key, idx, row, pred, pred_reason, is_correct, ms_total, raw)
+        samples = _sample_values(run_key, idx, raw)
+        if samples:
+            self._samples[(run_key, idx)] = samples
+        if len(self._buf) >= self.flush_size or self._interval_elapsed():
+            self.flush()
+
+    def _interval_elapsed(self) -> bool:
+        return bool(self.flush_interval_s) and (time.monotonic() - self._last_flush) >= self.flush_interval_s
+
+    def maybe_flush(self) -> int:
+        """Flush only if the time-based trigger is due."""
+        return self.flush() if self._interval_elapsed() else 0
+
+    def flush(self) -> int:
+        self._last_flush = time.monotonic()
+        if not self._buf:
+            return 0
+        rows = list(self._buf.values())
+        t0 = time.perf_counter()
+        with self.conn.cursor() as cur:
+            psycopg2.extras.execute_values(
+                cur, _prediction_upsert_sql(self.audit_schema, "%s"), rows, page_size=len(rows)
+            )
+            if self._samples:
+                # same transaction: an item's samples are committed together with it
+                _write_samples(cur, self.audit_schema, list(self._samples),
+                               [r for sample_rows in self._samples.values() for r in sample_rows])
+        self.conn.commit()
+        self._buf.clear()
+        self._samples.clear()
+        self.rows_written += len(rows)
+        self.flush_seconds += time.perf_counter() - t0
+        log.debug("Flushed %d predictions (total=%d)", len(rows), self.rows_written)
+        return len(rows)
+
+    def close(self) -> None:
+        self.flush()
+
+
+class BackgroundPredictionWriter:
+    """
+    Write-behind wrapper around PredictionWriter: add() only enqueues, a daemon thread
+    owns `conn` and group-commits by count (flush_size) or time (flush_interval_s).
+
+    The queue is bounded, so a stalled database eventually blocks add() (back-pressure)
+    instead of growing memory. close() drains the queue, flushes and joins; a database
+    error in the thread is re-raised from the next add() or from close().
+    """
+
+    _STOP = object()
+
+    def __init__(self, conn, audit_schema: str, *, flush_size: int = 5,
+                 flush_interval_s: float | None = None, queue_size: int = 1000):
+        self._writer = PredictionWriter(conn, audit_schema, flush_size=flush_size, flush_interval_s=flush_interval_s)
+        self._q: queue.Queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        # wake up at least this often so time-based commits happen while the judge loop is busy
+        self._poll_s = flush_interval_s if flush_interval_s else 1.0
+        self._error: BaseException | None = None
+        self._thread = threading.Thread(target=self._run, name="bt-db-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def rows_written(self) -> int:
+        return self._writer.rows_written
+
+    @property
+    def flush_seconds(self) -> float:
+        return self._writer.flush_seconds
+
+    def add(self, run_key: str, idx: int, row, pred, pred_reason, is_correct, ms_total, raw) -> None:
+        self._raise_if_failed()
+        self._q.put((run_key, idx, row, pred, pred_reason, is_correct, ms_total, raw))
+
+    def _raise_if_failed(self) -> None:
+        if self._error is not None:
+            raise RuntimeError("Background prediction writer failed") from self._error
+
+    def _run(self) -> None:
+        while True:
+            try:
+                item = self._q.get(timeout=self._poll_s)
+            except queue.Empty:
+                item = None
+            if item is self._STOP:
+                break
+            if isinstance(item, threading.Event):
+                # flush() barrier: everything queued before it is written once it is set
+                if self._error is None:
+                    try:
+                        self._writer.flush()
+                    except BaseException as e:
+                        log.exception("Background prediction writer failed; further rows are not persisted")
+                        self._error = e
+                item.set()
+                continue
+            if self._error is not None:
+                continue  # keep draining so producers never block on a dead writer
+            try:
+                if item is None:
+                    self._writer.maybe_flush()
+                else:
+                    self._writer.add(*item)
+            except BaseException as e:
+                log.exception("Background prediction writer failed; further rows are not persisted")
+                self._error = e
+        if self._error is None:
+            try:
+                self._writer.flush()
+            except BaseException as e:
+                log.exception("Final flush of background prediction writer failed")
+                self._error = e
+
+    def flush(self) -> None:
+        """Block until everything queued so far is committed."""
+        self._raise_if_failed()
+        done = threading.Event()
+        self._q.put(done)
+        done.wait()
+        self._raise_if_failed()
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self._q.put(self._STOP)
+            self._thread.join()
+        self._raise_if_failed()
@@ -1,10 +1,29 @@
 from __future__ import annotations
-from typing import Protocol, Dict, Any
+from typing import Protocol, Dict, Any, List
+from bt.util.parsing import ScoreParser
 
 class LLMClient(Protocol):
-    def judge(self, prompt: str) -> tuple[int | None, str | None, Dict[str, Any], int]:
-        """Return (score, reason, raw, elapsed_ms)."""
+    def judge(self, prompt: str, parse: ScoreParser = ..., seed: int | None = None) -> tuple[int | None, str | None, Dict[str, Any], int]:
+        """
+        Return (score, reason, raw, elapsed_ms); `parse` turns response text into (score, reason).
+        `seed` overrides the settings' decoding seed for this call (self-consistency samples).
+        """
         ...
     def close(self) -> None: ...
     @property
     def model_label(self) -> str: ...
+
+
+class BatchLLMClient(LLMClient, Protocol):
+    def judge_many(self, prompts: List[str], parse: ScoreParser = ...) -> List[tuple[int | None, str | None, Dict[str, Any], int]]:
+        """Judge several prompts in as few requests as possible; results in prompt order."""
+        ...
+
+
+class AsyncLLMClient(Protocol):
+    async def judge(self, prompt: str, parse: ScoreParser = ...) -> tuple[int | None, str | None, Dict[str, Any], int]:
+        """Return (score, reason, raw, elapsed_ms) without blocking the event loop."""
+        ...
+    async def aclose(self) -> None: ...
+    @property
+    def model_label(self) -> str: ...
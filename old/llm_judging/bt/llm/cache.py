@@ -0,0 +1,253 @@
+from __future__ import annotations
+import hashlib, json, logging, os, sqlite3, threading, time
+from typing import Any, Dict, List, Optional
+from bt.config import Settings
+from bt.util.parsing import parse_score_and_reason, ScoreParser
+from bt.llm.logprobs import stored_score, uses_logprobs
+from bt.llm.structured import output_token_limit
+
+log = logging.getLogger("bt.llm.cache")
+
+CACHE_MODES = ("off", "read", "read_write")
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+# Decoding settings that change the generated answer without changing the prompt. Each enters
+# the key only when set, so keys written before it was added stay valid.
+_OPTIONAL_KEY_FIELDS = ("top_p", "top_k", "repetition_penalty", "think", "think_budget_tokens")
+
+
+def cache_key(*, model_label: str, temperature: float, max_new_tokens: int, prompt: str,
+              structured_output: bool = False, seed: Optional[int] = None, **decoding: Any) -> str:
+    """
+    Content address of a judgment: provider+model (the client's model_label),
+    decoding params and the hash of the fully built prompt. `decoding` holds further
+    decoding params; None values are left out.
+    """
+    ident = {
+        "model": model_label,
+        "temperature": float(temperature),
+        "max_new_tokens": int(max_new_tokens),
+        "prompt_sha256": prompt_hash(prompt),
+    }
+    if structured_output:
+        # constrained decoding is a different generation; unconstrained keys stay as they were
+        ident["structured_output"] = True
+    if seed is not None:
+        # each seeded sample of an item is its own judgment
+        ident["seed"] = int(seed)
+    ident.update({k: v for k, v in decoding.items() if v is not None})
+    return hashlib.sha256(json.dumps(ident, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class JudgmentCache:
+    """
+    Size-bounded judgment store in a local SQLite file, evicting least recently used
+    entries. Shared by all worker threads of a run (one connection behind a lock).
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max(1, int(max_entries))
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL;")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS judgments (
+                key         TEXT PRIMARY KEY,
+                model       TEXT NOT NULL,
+                pred_score  INTEGER,
+                pred_reason TEXT,
+                raw_json    TEXT NOT NULL,
+                ms_total    INTEGER NOT NULL,
+                created_at  REAL NOT NULL,
+                last_used   REAL NOT NULL
+            );
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS judgments_last_used_idx ON judgments(last_used);")
+        self._count = self._db.execute("SELECT COUNT(*) FROM judgments;").fetchone()[0]
+        log.info("Judgment cache opened: %s (%d entries, max=%d)", path, self._count, self.max_entries)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT pred_score, pred_reason, raw_json, ms_total, created_at FROM judgments WHERE key = ?;",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE judgments SET last_used = ? WHERE key = ?;", (time.time(), key))
+        pred, reason, raw_json, ms_total, created_at = row
+        return {"pred": pred, "reason": reason, "raw": json.loads(raw_json), "ms_total": ms_total, "created_at": created_at}
+
+    def put(self, key: str, *, model: str, pred, reason, raw: Dict[str, Any], ms_total: int) -> None:
+        now = time.time()
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT OR IGNORE INTO judgments (key, model, pred_score, pred_reason, raw_json, ms_total, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?);",
+                (key, model, pred if isinstance(pred, int) else None, reason,
+                 json.dumps(raw, default=str), int(ms_total or 0), now, now),
+            )
+            self._count += cur.rowcount
+            if self._count > self.max_entries:
+                excess = self._count - self.max_entries
+                self._db.execute(
+                    "DELETE FROM judgments WHERE key IN (SELECT key FROM judgments ORDER BY last_used LIMIT ?);",
+                    (excess,),
+                )
+                self._count -= excess
+                log.debug("Evicted %d cache entries (LRU)", excess)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+def _lookup(cache: JudgmentCache, key: str, parse: ScoreParser):
+    t0 = time.time()
+    hit = cache.get(key)
+    if hit is None:
+        return None
+    raw = dict(hit["raw"])
+    # A logprob judgment keeps its argmax; otherwise re-parse the stored response so the
+    # caller's parser (pointwise, listwise, …) decides
+    pred, reason = stored_score(raw), None
+    if pred is None:
+        pred, reason = parse(raw.get("response_text") or "")
+    if pred is None:
+        return None
+    # Keep the original response for auditing, but make it obvious it was not re-generated.
+    raw["cache"] = {"hit": True, "key": key, "cached_at": hit["created_at"], "cached_ms_total": hit["ms_total"]}
+    ms = int((time.time() - t0) * 1000)
+    return pred, reason, raw, ms
+
+
+def settings_cache_key(s: Settings, model_label: str, prompt: str, seed: Optional[int] = None) -> str:
+    """cache_key of `prompt` judged by a client built from `s` (with the call's own `seed`, if any)."""
+    decoding = {k: getattr(s, k) for k in _OPTIONAL_KEY_FIELDS}
+    if s.think_budget_tokens is not None:
+        # what happens at the budget (forced answer or invalid) only matters with a budget
+        decoding["think_force_answer"] = bool(s.think_force_answer)
+    if uses_logprobs(s):
+        # a score read from the first token's logprobs is not the generated answer
+        decoding["scoring_mode"] = s.scoring_mode
+        decoding["logprobs_top_n"] = int(s.logprobs_top_n)
+    # the cap the request is actually sent with (structured_output uses the answer caps)
+    max_tokens = output_token_limit(s) or s.max_new_tokens
+    return cache_key(model_label=model_label, temperature=s.temperature, max_new_tokens=max_tokens,
+                     prompt=prompt, structured_output=s.structured_output,
+                     seed=s.seed if seed is None else seed, **decoding)
+
+
+def replayable(s: Settings, seed: Optional[int] = None) -> bool:
+    """
+    Whether a stored judgment stands in for a new call: greedy decoding, or sampling with
+    a fixed seed. Unseeded sampling at temperature > 0 bypasses the cache, so repeated
+    stochastic runs draw fresh answers instead of replaying the first one.
+    """
+    return not s.temperature or (s.seed if seed is None else seed) is not None
+
+
+class CachedLLMClient:
+    """
+    LLMClient wrapper that answers from a JudgmentCache first.
+    cache_mode: 'read' only consults the cache, 'read_write' also stores new valid judgments.
+    Calls that are not `replayable` go straight to the inner client.
+    """
+
+    def __init__(self, inner, s: Settings, cache: JudgmentCache):
+        self.inner = inner
+        self.s = s
+        self.cache = cache
+
+    @property
+    def model_label(self) -> str:
+        return self.inner.model_label
+
+    def _key(self, prompt: str, seed: Optional[int] = None) -> str:
+        return settings_cache_key(self.s, self.inner.model_label, prompt, seed)
+
+    def judge(self, prompt: str, parse: ScoreParser = parse_score_and_reason, seed: Optional[int] = None):
+        if not replayable(self.s, seed):
+            return self.inner.judge(prompt, parse, seed=seed)
+        key = self._key(prompt, seed)
+        hit = _lookup(self.cache, key, parse)
+        if hit is not None:
+            return hit
+        pred, reason, raw, ms = self.inner.judge(prompt, parse, seed=seed)
+        if self.s.cache_mode == "read_write" and pred is not None:
+            self.cache.put(key, model=self.model_label, pred=pred, reason=reason, raw=raw, ms_total=ms)
+        raw = dict(raw or {})
+        raw["cache"] = {"hit": False, "key": key}
+        return pred, reason, raw, ms
+
+    def judge_many(self, prompts: List[str], parse: ScoreParser = parse_score_and_reason):
+        """Batched judge: only the cache misses are sent to the inner client's judge_many."""
+        if not replayable(self.s):
+            return self.inner.judge_many(prompts, parse)
+        keys = [self._key(p) for p in prompts]
+        results: List[Any] = [_lookup(self.cache, key, parse) for key in keys]
+        misses = [j for j, hit in enumerate(results) if hit is None]
+        if misses:
+            fresh = self.inner.judge_many([prompts[j] for j in misses], parse)
+            for j, (pred, reason, raw, ms) in zip(misses, fresh):
+                if self.s.cache_mode == "read_write" and pred is not None:
+                    self.cache.put(keys[j], model=self.model_label, pred=pred, reason=reason, raw=raw, ms_total=ms)
+                raw = dict(raw or {})
+                raw["cache"] = {"hit": False, "key": keys[j]}
+                results[j] = (pred, reason, raw, ms)
+        return results
+
+    def warm_up(self) -> float | None:
+        warm_up = getattr(self.inner, "warm_up", None)
+        return warm_up() if warm_up is not None else None
+
+    def close(self) -> None:
+        try:
+            self.inner.close()
+        finally:
+            self.cache.close()
+
+
+class AsyncCachedLLMClient:
+    """AsyncLLMClient counterpart of CachedLLMClient (SQLite lookups are local and fast)."""
+
+    def __init__(self, inner, s: Settings, cache: JudgmentCache):
+        self.inner = inner
+        self.s = s
+        self.cache = cache
+
+    @property
+    def model_label(self) -> str:
+        return self.inner.model_label
+
+    async def judge(self, prompt: str, parse: ScoreParser = parse_score_and_reason):
+        if not replayable(self.s):
+            return await self.inner.judge(prompt, parse)
+        key = settings_cache_key(self.s, self.inner.model_label, prompt)
+        hit = _lookup(self.cache, key, parse)
+        if hit is not None:
+            return hit
+        pred, reason, raw, ms = await self.inner.judge(prompt, parse)
+        if self.s.cache_mode == "read_write" and pred is not None:
+            self.cache.put(key, model=self.model_label, pred=pred, reason=reason, raw=raw, ms_total=ms)
+        raw = dict(raw or {})
+        raw["cache"] = {"hit": False, "key": key}
+        return pred, reason, raw, ms
+
+    async def warm_up(self) -> float | None:
+        warm_up = getattr(self.inner, "warm_up", None)
+        return await warm_up() if warm_up is not None else None
+
+    async def aclose(self) -> None:
+        try:
+            await self.inner.aclose()
+        finally:
+            self.cache.close()
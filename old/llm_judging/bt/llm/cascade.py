@@ -0,0 +1,114 @@
+from __future__ import annotations
+import dataclasses, logging
+from typing import Any, Dict, List, Optional
+from bt.config import Settings
+from bt.util.parsing import parse_score_and_reason, ScoreParser
+
+log = logging.getLogger("bt.llm.cascade")
+
+CASCADE_RULES = ("invalid", "band", "confidence", "disagree")
+# The pipeline builds one prompt and parser for all stages, so stages cannot change these
+_SHARED_FIELDS = ("scoring_mode", "reasoning_enabled", "judging_mode", "batch_size", "async_mode", "cascade_models")
+
+
+def cascade_stages(s: Settings) -> List[List[Settings]]:
+    """Settings of every judge, per stage (a stage with several judges is a panel)."""
+    stages = []
+    for entry in s.cascade_models or ():
+        specs = list(entry) if isinstance(entry, (list, tuple)) else [entry]
+        judges = []
+        for spec in specs:
+            overrides = {"model": spec} if isinstance(spec, str) else dict(spec)
+            shared = [k for k in overrides if k in _SHARED_FIELDS]
+            if shared:
+                raise ValueError(f"cascade stage cannot override {shared} (shared by all stages)")
+            judges.append(dataclasses.replace(s, cascade_models=None, **overrides))
+        stages.append(judges)
+    return stages
+
+
+def _confidence(raw: Dict[str, Any]) -> Optional[float]:
+    # top probability of the score distribution read from logprobs (scoring_mode="logprobs")
+    dist = ((raw or {}).get("logprobs") or {}).get("score_dist")
+    return max(dist.values()) if dist else None
+
+
+def escalation_reasons(results: List[tuple], s: Settings) -> List[str]:
+    """Rules of s.cascade_escalate that flag a stage's results (one per judge) as uncertain."""
+    rules = s.cascade_escalate
+    preds = [res[0] for res in results]
+    valid = [p for p in preds if p is not None]
+    reasons = []
+    if "invalid" in rules and len(valid) < len(preds):
+        reasons.append("invalid")
+    if "disagree" in rules and len(set(valid)) > 1:
+        reasons.append("disagree")
+    if "band" in rules and any(p in s.cascade_band for p in valid):
+        reasons.append("band")
+    if "confidence" in rules:
+        conf = [_confidence(res[2]) for res in results if res[0] is not None]
+        if any(c is not None and c < s.cascade_min_confidence for c in conf):
+            reasons.append("confidence")
+    return reasons
+
+
+def _decide(results: List[tuple]) -> tuple:
+    # a panel that is not escalated agrees (or has one valid answer); the first valid judge speaks for it
+    return next((res for res in results if res[0] is not None), results[0])
+
+
+class CascadeClient:
+    """
+    LLMClient judging each item with the stages of cfg.cascade_models in order and
+    stopping at the first stage no escalation rule flags (the last stage always
+    decides). Panel judges of a stage are called one after another.
+
+    raw is the deciding judge's, plus raw["cascade"]: the stage that decided, the
+    calls made for the item, the calls the full cascade would take and each stage's
+    predictions and escalation reasons. ms covers all calls. Keep the stage models
+    loaded side by side (OLLAMA_MAX_LOADED_MODELS) or put stages on different servers,
+    otherwise escalations swap models.
+    """
+
+    def __init__(self, s: Settings, stages: List[List[Any]]):
+        self.s = s
+        self.stages = stages
+        self.calls_full = sum(len(judges) for judges in stages)
+
+    @property
+    def model_label(self) -> str:
+        return "cascade:" + ">".join("+".join(c.model_label for c in judges) for judges in self.stages)
+
+    def judge(self, prompt: str, parse: ScoreParser = parse_score_and_reason):
+        trail = []
+        calls = ms_total = 0
+        for k, judges in enumerate(self.stages, start=1):
+            results = [c.judge(prompt, parse) for c in judges]
+            calls += len(results)
+            ms_total += sum(res[3] or 0 for res in results)
+            reasons = escalation_reasons(results, self.s)
+            trail.append({"stage": k, "preds": [res[0] for res in results], "escalate": reasons})
+            if not reasons:
+                break
+        pred, reason, raw, _ = _decide(results)
+        if len(trail) > 1:
+            log.debug("Escalated to stage %d: %s", k, [t["escalate"] for t in trail[:-1]])
+        raw = dict(raw or {})
+        raw["cascade"] = {
+            "stage": k, "model": "+".join(c.model_label for c in judges),
+            "calls": calls, "calls_full": self.calls_full, "trail": trail,
+        }
+        return pred, reason, raw, ms_total
+
+    def warm_up(self) -> float | None:
+        took = [c.warm_up() for judges in self.stages for c in judges if hasattr(c, "warm_up")]
+        took = [t for t in took if t is not None]
+        return sum(took) if took else None
+
+    def close(self) -> None:
+        for judges in self.stages:
+            for c in judges:
+                try:
+                    c.close()
+                except Exception:
+                    log.exception("Failed to close cascade stage client %s", c.model_label)
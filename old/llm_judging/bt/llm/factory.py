@@ -1,13 +1,116 @@
 from __future__ import annotations
+import logging
 from bt.config import Settings
-from bt.llm.base import LLMClient
-from bt.llm.ollama_client import OllamaClient
-from bt.llm.hf_client import HFEndpointClient
-from bt.llm.hf_hub_client import HFHubClient
+from bt.llm.base import LLMClient, AsyncLLMClient
+from bt.llm.ollama_client import OllamaClient, AsyncOllamaClient
+from bt.llm.ollama_pool_client import OllamaPoolClient
+from bt.llm.openai_client import OpenAICompletionsClient
+from bt.llm.hf_client import HFEndpointClient, AsyncHFEndpointClient
+from bt.llm.hf_hub_client import HFHubClient, AsyncHFHubClient
+from bt.llm.cache import CACHE_MODES, JudgmentCache, CachedLLMClient, AsyncCachedLLMClient, replayable
+from bt.llm.logprobs import uses_logprobs
+from bt.llm.cascade import CASCADE_RULES, CascadeClient, cascade_stages
+from bt.llm.sampling import AGGREGATIONS, SamplingClient
+from bt.call import BACKOFF_MODES
+
+log = logging.getLogger("bt.llm.factory")
+
+def _open_cache(s: Settings) -> JudgmentCache | None:
+    if s.cache_mode not in CACHE_MODES:
+        raise ValueError(f"Unknown cache_mode: {s.cache_mode} (expected one of {CACHE_MODES})")
+    if s.cache_mode == "off":
+        return None
+    if not replayable(s) and s.samples_per_item <= 1:
+        log.warning("cache_mode=%s at temperature=%s without a seed: calls bypass the cache", s.cache_mode, s.temperature)
+    return JudgmentCache(s.cache_path, s.cache_max_entries)
+
+# Providers whose clients implement judge_many (several prompts per request)
+BATCH_PROVIDERS = ("openai",)
+# Providers with the think / thinking-budget controls
+THINK_PROVIDERS = ("ollama", "ollama_pool")
+
+def _check_retry_settings(s: Settings) -> None:
+    if s.retry_backoff not in BACKOFF_MODES:
+        raise ValueError(f"Unknown retry_backoff: {s.retry_backoff} (expected one of {BACKOFF_MODES})")
+
+def _check_batch_settings(s: Settings) -> None:
+    if s.batch_size > 1 and s.provider not in BATCH_PROVIDERS:
+        raise ValueError(f"batch_size > 1 needs a batching provider (one of {BATCH_PROVIDERS}), got {s.provider!r}")
+
+def _check_think_settings(s: Settings) -> None:
+    if (s.think is not None or s.think_budget_tokens is not None) and s.provider not in THINK_PROVIDERS:
+        raise ValueError(f"think / think_budget_tokens need an Ollama provider (one of {THINK_PROVIDERS}), got {s.provider!r}")
+    if s.think_budget_tokens is not None and s.think_budget_tokens < 1:
+        raise ValueError("think_budget_tokens must be >= 1")
+    if s.think_budget_tokens is not None and (s.think is False or uses_logprobs(s)):
+        raise ValueError("think_budget_tokens needs a thinking phase (not think=false or scoring_mode='logprobs')")
+    if s.think and uses_logprobs(s):
+        raise ValueError("scoring_mode='logprobs' reads the first generated token as the score: needs think unset or false")
+
+def _check_cascade_settings(s: Settings) -> None:
+    unknown = [r for r in s.cascade_escalate if r not in CASCADE_RULES]
+    if unknown:
+        raise ValueError(f"Unknown cascade_escalate rule(s) {unknown} (expected some of {CASCADE_RULES})")
+    stages = cascade_stages(s)
+    if not stages or any(not judges for judges in stages):
+        raise ValueError("cascade_models needs at least one stage, each with at least one judge")
+    if "confidence" in s.cascade_escalate and not uses_logprobs(s):
+        raise ValueError("cascade_escalate 'confidence' reads the score distribution: needs scoring_mode='logprobs'")
+    if "disagree" in s.cascade_escalate and all(len(judges) < 2 for judges in stages):
+        raise ValueError("cascade_escalate 'disagree' needs a stage with a panel of judges (a list of models)")
+
+def _check_sampling_settings(s: Settings) -> None:
+    if s.samples_per_item < 1:
+        raise ValueError("samples_per_item must be >= 1")
+    if s.sample_aggregation not in AGGREGATIONS:
+        raise ValueError(f"Unknown sample_aggregation: {s.sample_aggregation} (expected one of {AGGREGATIONS})")
+    if s.samples_per_item > 1 and uses_logprobs(s):
+        raise ValueError("samples_per_item > 1 draws generated answers; scoring_mode='logprobs' already reads a distribution")
+    if s.samples_per_item > 1 and not s.temperature:
+        log.warning("samples_per_item=%d at temperature=0: samples differ only by seed", s.samples_per_item)
 
 def build_llm_client(s: Settings) -> LLMClient:
+    if s.cascade_models:
+        _check_cascade_settings(s)
+        # every judge is a full client of its own (checks, cache, hedging, pool)
+        return CascadeClient(s, [[build_llm_client(js) for js in judges] for judges in cascade_stages(s)])
+    _check_sampling_settings(s)
+    _check_retry_settings(s)
+    _check_batch_settings(s)
+    _check_think_settings(s)
+    client = _build_provider_client(s)
+    cache = _open_cache(s)
+    if cache:
+        client = CachedLLMClient(client, s, cache)
+    # the samples share one client (pool, trackers, cache); each call passes its own seed
+    return SamplingClient(s, client) if s.samples_per_item > 1 else client
+
+def build_async_llm_client(s: Settings) -> AsyncLLMClient:
+    if s.cascade_models or s.samples_per_item > 1:
+        raise ValueError("cascade_models / samples_per_item > 1 are not supported with async_mode")
+    _check_retry_settings(s)
+    _check_think_settings(s)
+    client = _build_async_provider_client(s)
+    cache = _open_cache(s)
+    return AsyncCachedLLMClient(client, s, cache) if cache else client
+
+def model_label_for(s: Settings) -> str:
+    """The model_label a client built from `s` would report, without building it."""
+    if s.cascade_models:
+        return "cascade:" + ">".join("+".join(model_label_for(js) for js in judges) for judges in cascade_stages(s))
+    if s.provider == "hf_endpoint":
+        return f"hf_endpoint:{s.hf_endpoint_url or s.model}"
+    if s.provider == "ollama_pool":
+        return f"ollama:{s.model}"
+    return f"{s.provider}:{s.model}"
+
+def _build_provider_client(s: Settings) -> LLMClient:
     if s.provider == "ollama":
         return OllamaClient(s)
+    if s.provider == "ollama_pool":
+        return OllamaPoolClient(s)
+    if s.provider == "openai":
+        return OpenAICompletionsClient(s)
     if s.provider == "hf_hub":
         return HFHubClient(s)
     if s.provider == "hf_endpoint":
@@ -15,3 +118,18 @@ def build_llm_client(s: Settings) -> LLMClient:
             raise ValueError("hf_endpoint_url must be set when provider='hf_endpoint'")
         return HFEndpointClient(s)
     raise ValueError(f"Unknown provider: {s.provider}")
+
+def _build_async_provider_client(s: Settings) -> AsyncLLMClient:
+    if s.provider == "ollama":
+        return AsyncOllamaClient(s)
+    if s.provider == "ollama_pool":
+        raise ValueError("provider='ollama_pool' is not supported with async_mode")
+    if s.provider == "openai":
+        raise ValueError("provider='openai' is not supported with async_mode (batch instead)")
+    if s.provider == "hf_hub":
+        return AsyncHFHubClient(s)
+    if s.provider == "hf_endpoint":
+        if not s.hf_endpoint_url:
+            raise ValueError("hf_endpoint_url must be set when provider='hf_endpoint'")
+        return AsyncHFEndpointClient(s)
+    raise ValueError(f"Unknown provider: {s.provider}")
@@ -1,78 +1,199 @@
 from __future__ import annotations
-import time, logging, requests
+import time, logging, requests, httpx
+from requests.adapters import HTTPAdapter
 from requests.exceptions import Timeout as ReqTimeout
 from typing import Any, Dict
-from bt.call import call_with_retry
-from bt.util.parsing import parse_score_and_reason
+from bt.call import call_with_retry, acall_with_retry, Hedger, CallTimeouts, max_in_flight
+from bt.util.parsing import parse_score_and_reason, ScoreParser
 from bt.config import Settings
+from bt.llm.structured import answer_schema, output_token_limit
+from bt.llm.logprobs import uses_logprobs, apply_logprobs
 
 log = logging.getLogger("bt.llm.hf")
 
+
+def _extract_text(obj: Any) -> str:
+    if isinstance(obj, list) and obj:
+        item = obj[0]
+        if isinstance(item, dict):
+            if "generated_text" in item: return item.get("generated_text") or ""
+            if "text" in item: return item.get("text") or ""
+    if isinstance(obj, dict):
+        if "generated_text" in obj: return obj.get("generated_text") or ""
+        if "output_text" in obj: return obj.get("output_text") or ""
+        if "outputs" in obj and isinstance(obj["outputs"], list) and obj["outputs"]:
+            c = obj["outputs"][0]
+            if isinstance(c, dict):
+                if "content" in c: return c.get("content") or ""
+                if "generated_text" in c: return c.get("generated_text") or ""
+    return ""
+
+
+def _headers(s: Settings) -> Dict[str, str]:
+    headers = {"Accept": "application/json"}
+    if s.hf_api_token:
+        headers["Authorization"] = f"Bearer {s.hf_api_token}"
+    return headers
+
+
+def _payload(s: Settings, prompt: str, seed: int | None = None) -> Dict[str, Any]:
+    payload: Dict[str, Any] = {
+        "inputs": prompt,
+        "parameters": {
+            "temperature": float(s.temperature),
+            "max_new_tokens": int(output_token_limit(s) or s.max_new_tokens),
+            "return_full_text": False,
+            "details": True,  # TGI: generated_tokens
+        }
+    }
+    p = payload["parameters"]
+    schema = answer_schema(s)
+    if schema is not None:
+        p["grammar"] = {"type": "json", "value": schema}
+    if uses_logprobs(s):
+        p["max_new_tokens"] = 1
+        p["top_n_tokens"] = int(s.logprobs_top_n)
+    if s.top_p is not None: p["top_p"] = float(s.top_p)
+    if s.top_k is not None: p["top_k"] = int(s.top_k)
+    if s.repetition_penalty is not None: p["repetition_penalty"] = float(s.repetition_penalty)
+    seed = s.seed if seed is None else seed  # a call's own seed (self-consistency samples) wins
+    if seed is not None: p["seed"] = int(seed)
+    return payload
+
+
+def _tokens_out(obj: Any) -> int | None:
+    item = obj[0] if isinstance(obj, list) and obj else obj
+    details = item.get("details") if isinstance(item, dict) else None
+    return details.get("generated_tokens") if isinstance(details, dict) else None
+
+
+def _logprob_candidates(obj: Any):
+    # TGI details: top_tokens[0] holds the candidates of the first generated token
+    item = obj[0] if isinstance(obj, list) and obj else obj
+    details = item.get("details") if isinstance(item, dict) else None
+    if not isinstance(details, dict):
+        return []
+    top = (details.get("top_tokens") or [None])[0] or (details.get("tokens") or [])[:1]
+    return [(c.get("text"), c.get("logprob")) for c in top if isinstance(c, dict)]
+
+
+def _read_timeout(s: Settings) -> float | None:
+    return (s.llm_timeout_ms / 1000.0) if (s.llm_timeout_ms and s.llm_timeout_ms > 0) else None
+
+
+def _result(data: Any, t0: float, parse: ScoreParser = parse_score_and_reason):
+    text = _extract_text(data)
+    raw: Dict[str, Any] = {"provider": "hf_endpoint", "hf": data, "response_text": text, "tokens_out": _tokens_out(data)}
+    ms = int((time.time() - t0) * 1000)
+    score, reason = apply_logprobs(parse(text), raw, _logprob_candidates(data))
+    return score, reason, raw, ms
+
+
 class HFEndpointClient:
     def __init__(self, settings: Settings):
         self.s = settings
         self._session = requests.Session()
+        # One pooled connection per concurrent worker, otherwise urllib3 discards/reopens sockets;
+        # twice that, since losing hedges cannot be aborted and hold theirs until they finish
+        pool = max(10, 2 * max_in_flight(self.s))
+        self._session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=pool))
+        self._session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool))
+        self._hedger = Hedger.from_settings(self.s, cancellable=False)
+        self._timeouts = CallTimeouts(self.s)
 
     @property
     def model_label(self) -> str:
         # show endpoint in audit logs; you may also include s.model if you want
         return f"hf_endpoint:{self.s.hf_endpoint_url or self.s.model}"
 
-    def _extract_text(self, obj: Any) -> str:
-        if isinstance(obj, list) and obj:
-            item = obj[0]
-            if isinstance(item, dict):
-                if "generated_text" in item: return item.get("generated_text") or ""
-                if "text" in item: return item.get("text") or ""
-        if isinstance(obj, dict):
-            if "generated_text" in obj: return obj.get("generated_text") or ""
-            if "output_text" in obj: return obj.get("output_text") or ""
-            if "outputs" in obj and isinstance(obj["outputs"], list) and obj["outputs"]:
-                c = obj["outputs"][0]
-                if isinstance(c, dict):
-                    if "content" in c: return c.get("content") or ""
-                    if "generated_text" in c: return c.get("generated_text") or ""
-        return ""
-
-    def _single_call(self, prompt: str):
-        t0 = time.time()
-        headers = {"Accept": "application/json"}
-        if self.s.hf_api_token:
-            headers["Authorization"] = f"Bearer {self.s.hf_api_token}"
-        payload: Dict[str, Any] = {
-            "inputs": prompt,
-            "parameters": {
-                "temperature": float(self.s.temperature),
-                "max_new_tokens": int(self.s.max_new_tokens),
-                "return_full_text": False,
-            }
-        }
-        p = payload["parameters"]
-        if self.s.top_p is not None: p["top_p"] = float(self.s.top_p)
-        if self.s.top_k is not None: p["top_k"] = int(self.s.top_k)
-        if self.s.repetition_penalty is not None: p["repetition_penalty"] = float(self.s.repetition_penalty)
+    def _observed(self, prompt: str, res):
+        if res[0] is not None:
+            self._timeouts.observe(prompt, res[3])
+        return res
 
+    def _single_call(self, prompt: str, parse: ScoreParser = parse_score_and_reason, seed: int | None = None):
+        t0 = time.time()
+        limit = self._timeouts.timeout_s(prompt)
         try:
-            read_to = (self.s.llm_timeout_ms / 1000.0) if (self.s.llm_timeout_ms and self.s.llm_timeout_ms > 0) else None
-            r = self._session.post(self.s.hf_endpoint_url, headers=headers, json=payload, timeout=(5, read_to))
+            r = self._session.post(
+                self.s.hf_endpoint_url, headers=_headers(self.s), json=_payload(self.s, prompt, seed),
+                timeout=(5, limit),
+            )
             r.raise_for_status()
-            data = r.json()
-            text = self._extract_text(data)
-            raw: Dict[str, Any] = {"provider": "hf_endpoint", "hf": data, "response_text": text}
-            ms = int((time.time() - t0) * 1000)
-            score, reason = parse_score_and_reason(text)
-            return score, reason, raw, ms
+            return self._observed(prompt, _result(r.json(), t0, parse))
         except ReqTimeout:
             ms = int((time.time() - t0) * 1000)
-            return None, None, {"provider": "hf_endpoint", "error": "timeout"}, ms
+            return None, None, {"provider": "hf_endpoint", "error": "timeout", "timeout_s": limit}, ms
 
-    def judge(self, prompt: str):
+    def judge(self, prompt: str, parse: ScoreParser = parse_score_and_reason, seed: int | None = None):
+        attempt = lambda: self._single_call(prompt, parse, seed)
+        if self._hedger is not None:
+            # a blocking requests call can't be aborted; a losing duplicate runs to completion
+            attempt = lambda: self._hedger.run(lambda _cancel: self._single_call(prompt, parse, seed))
         return call_with_retry(
-            lambda: self._single_call(prompt),
+            attempt,
             attempts=self.s.retry_attempts,
             enabled=self.s.retry_enabled,
             backoff_ms=self.s.retry_backoff_ms,
+            backoff=self.s.retry_backoff,
+            backoff_max_ms=self.s.retry_backoff_max_ms,
         )
 
     def close(self) -> None:
+        if self._hedger is not None:
+            self._hedger.close()
         self._session.close()
+
+
+class AsyncHFEndpointClient:
+    """asyncio variant of HFEndpointClient built on a shared httpx.AsyncClient."""
+
+    def __init__(self, settings: Settings):
+        self.s = settings
+        conns = max(10, max_in_flight(self.s))
+        self._http = httpx.AsyncClient(
+            headers=_headers(self.s),
+            timeout=httpx.Timeout(_read_timeout(self.s), connect=5.0),
+            limits=httpx.Limits(max_connections=conns, max_keepalive_connections=conns),
+        )
+        self._hedger = Hedger.from_settings(self.s)
+        self._timeouts = CallTimeouts(self.s)
+
+    @property
+    def model_label(self) -> str:
+        return f"hf_endpoint:{self.s.hf_endpoint_url or self.s.model}"
+
+    def _observed(self, prompt: str, res):
+        if res[0] is not None:
+            self._timeouts.observe(prompt, res[3])
+        return res
+
+    async def _single_call(self, prompt: str, parse: ScoreParser = parse_score_and_reason):
+        t0 = time.time()
+        limit = self._timeouts.timeout_s(prompt)
+        try:
+            r = await self._http.post(self.s.hf_endpoint_url, json=_payload(self.s, prompt),
+                                      timeout=httpx.Timeout(limit, connect=5.0))
+            r.raise_for_status()
+            return self._observed(prompt, _result(r.json(), t0, parse))
+        except httpx.TimeoutException:
+            ms = int((time.time() - t0) * 1000)
+            return None, None, {"provider": "hf_endpoint", "error": "timeout", "timeout_s": limit}, ms
+
+    async def judge(self, prompt: str, parse: ScoreParser = parse_score_and_reason):
+        attempt = lambda: self._single_call(prompt, parse)
+        if self._hedger is not None:
+            attempt = lambda: self._hedger.arun(lambda: self._single_call(prompt, parse))
+        return await acall_with_retry(
+            attempt,
+            attempts=self.s.retry_attempts,
+            enabled=self.s.retry_enabled,
+            backoff_ms=self.s.retry_backoff_ms,
+            backoff=self.s.retry_backoff,
+            backoff_max_ms=self.s.retry_backoff_max_ms,
+        )
+
+    async def aclose(self) -> None:
+        if self._hedger is not None:
+            self._hedger.close()
+        await self._http.aclose()
@@ -1,52 +1,137 @@
 from __future__ import annotations
 import time, logging
 from typing import Dict, Any
-from huggingface_hub import InferenceClient
-from bt.call import call_with_retry
-from bt.util.parsing import parse_score_and_reason
+from huggingface_hub import InferenceClient, AsyncInferenceClient
+from bt.call import call_with_retry, acall_with_retry, Hedger
+from bt.util.parsing import parse_score_and_reason, ScoreParser
 from bt.config import Settings
+from bt.llm.structured import answer_schema, output_token_limit
+from bt.llm.logprobs import uses_logprobs, apply_logprobs
 
 log = logging.getLogger("bt.llm.hf_hub")
 
+
+def _check_token(s: Settings) -> None:
+    if not s.hf_api_token:
+        raise ValueError("HF API token missing. Set hf_api_token or HUGGINGFACE_API_TOKEN.")
+
+
+def _result(rsp: Any, t0: float, parse: ScoreParser = parse_score_and_reason):
+    text = rsp.choices[0].message["content"]
+    ms = int((time.time() - t0) * 1000)
+    usage = getattr(rsp, "usage", None)
+    raw: Dict[str, Any] = {"provider": "hf_hub", "hf": rsp, "response_text": text,
+                           "tokens_out": getattr(usage, "completion_tokens", None)}
+    score, reason = apply_logprobs(parse(text), raw, _logprob_candidates(rsp))
+    return score, reason, raw, ms
+
+
+def _logprob_candidates(rsp: Any):
+    # chat completions: choices[0].logprobs.content[0].top_logprobs -> [{token, logprob}]
+    content = getattr(getattr(rsp.choices[0], "logprobs", None), "content", None) or [None]
+    top = getattr(content[0], "top_logprobs", None) or []
+    return [(c.token, c.logprob) for c in top]
+
+
+def _create_kwargs(s: Settings, prompt: str, seed: int | None = None) -> Dict[str, Any]:
+    kw: Dict[str, Any] = {
+        "model": s.model,
+        "messages": [{"role": "user", "content": prompt}],
+        "max_tokens": int(output_token_limit(s) or s.max_new_tokens),
+        "temperature": s.temperature,
+    }
+    schema = answer_schema(s)
+    if schema is not None:
+        kw["response_format"] = {"type": "json", "value": schema}
+    if uses_logprobs(s):
+        kw.update(max_tokens=1, logprobs=True, top_logprobs=int(s.logprobs_top_n))
+    seed = s.seed if seed is None else seed  # a call's own seed (self-consistency samples) wins
+    if seed is not None:
+        kw["seed"] = int(seed)
+    return kw
+
+
 class HFHubClient:
     def __init__(self, s: Settings):
         self.s = s
-        if not self.s.hf_api_token:
-            raise ValueError("HF API token missing. Set hf_api_token or HUGGINGFACE_API_TOKEN.")
+        _check_token(self.s)
         self.client = InferenceClient(token=self.s.hf_api_token)
+        # a blocking InferenceClient call can't be aborted; losing duplicates run to completion
+        self._hedger = Hedger.from_settings(self.s, cancellable=False)
 
     @property
     def model_label(self) -> str:
         # Uses repo name, e.g. deepseek-ai/DeepSeek-R1-Distill-Qwen-32B
         return f"hf_hub:{self.s.model}"
 
-    def _single_call(self, prompt: str):
+    def _single_call(self, prompt: str, parse: ScoreParser = parse_score_and_reason, seed: int | None = None):
         t0 = time.time()
         try:
             # chat.completions works for most chatty text-gen models
-            rsp = self.client.chat.completions.create(
-                model=self.s.model,
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=self.s.max_new_tokens,
-                temperature=self.s.temperature,
-            )
-            text = rsp.choices[0].message["content"]
-            ms = int((time.time() - t0) * 1000)
-            score, reason = parse_score_and_reason(text)
-            raw: Dict[str, Any] = {"provider": "hf_hub", "hf": rsp, "response_text": text}
-            return score, reason, raw, ms
+            rsp = self.client.chat.completions.create(**_create_kwargs(self.s, prompt, seed))
+            return _result(rsp, t0, parse)
         except Exception as e:
             ms = int((time.time() - t0) * 1000)
             log.warning("HF Hub call failed: %s", e)
             return None, None, {"provider": "hf_hub", "error": str(e)}, ms
 
-    def judge(self, prompt: str):
+    def judge(self, prompt: str, parse: ScoreParser = parse_score_and_reason, seed: int | None = None):
+        attempt = lambda: self._single_call(prompt, parse, seed)
+        if self._hedger is not None:
+            attempt = lambda: self._hedger.run(lambda _cancel: self._single_call(prompt, parse, seed))
         return call_with_retry(
-            lambda: self._single_call(prompt),
+            attempt,
+            attempts=self.s.retry_attempts,
+            enabled=self.s.retry_enabled,
+            backoff_ms=self.s.retry_backoff_ms,
+            backoff=self.s.retry_backoff,
+            backoff_max_ms=self.s.retry_backoff_max_ms,
+        )
+
+    def close(self):  # nothing persistent to close besides the hedge pool
+        if self._hedger is not None:
+            self._hedger.close()
+
+
+class AsyncHFHubClient:
+    """asyncio variant of HFHubClient using huggingface_hub.AsyncInferenceClient."""
+
+    def __init__(self, s: Settings):
+        self.s = s
+        _check_token(self.s)
+        self.client = AsyncInferenceClient(token=self.s.hf_api_token)
+        self._hedger = Hedger.from_settings(self.s)
+
+    @property
+    def model_label(self) -> str:
+        return f"hf_hub:{self.s.model}"
+
+    async def _single_call(self, prompt: str, parse: ScoreParser = parse_score_and_reason):
+        t0 = time.time()
+        try:
+            rsp = await self.client.chat.completions.create(**_create_kwargs(self.s, prompt))
+            return _result(rsp, t0, parse)
+        except Exception as e:
+            ms = int((time.time() - t0) * 1000)
+            log.warning("HF Hub call failed: %s", e)
+            return None, None, {"provider": "hf_hub", "error": str(e)}, ms
+
+    async def judge(self, prompt: str, parse: ScoreParser = parse_score_and_reason):
+        attempt = lambda: self._single_call(prompt, parse)
+        if self._hedger is not None:
+            attempt = lambda: self._hedger.arun(lambda: self._single_call(prompt, parse))
+        return await acall_with_retry(
+            attempt,
             attempts=self.s.retry_attempts,
             enabled=self.s.retry_enabled,
             backoff_ms=self.s.retry_backoff_ms,
+            backoff=self.s.retry_backoff,
+            backoff_max_ms=self.s.retry_backoff_max_ms,
         )
 
-    def close(self):  # nothing persistent to close
-        pass
+    async def aclose(self) -> None:
+        if self._hedger is not None:
+            self._hedger.close()
+        close = getattr(self.client, "close", None)
+        if close is not None:
+            await close()
@@ -0,0 +1,59 @@
+from __future__ import annotations
+import math
+from typing import Any, Dict, Iterable, Optional, Tuple
+from bt.config import Settings
+
+SCORING_MODES = ("generate", "logprobs")
+SCORE_TOKENS = ("0", "1", "2", "3")
+
+
+def uses_logprobs(s: Settings) -> bool:
+    return s.scoring_mode == "logprobs"
+
+
+def score_distribution(candidates: Iterable[Tuple[str, float]]) -> Tuple[Optional[int], Dict[str, Any]]:
+    """
+    Read a score from the top (token, logprob) candidates of the first generated token.
+
+    Probability of tokens that are a score digit (ignoring surrounding whitespace) is
+    summed per digit and renormalized over the four digits. Returns (argmax, info) with
+    info = {"score_dist": {"0": p, …, "3": p}, "expected_score": Σ k·p, "digit_mass": mass
+    of the digits before renormalizing}; (None, {}) if no candidate is a digit.
+    """
+    mass = dict.fromkeys(SCORE_TOKENS, 0.0)
+    for token, logprob in candidates:
+        t = (token or "").strip()
+        if t in mass and logprob is not None:
+            mass[t] += math.exp(float(logprob))
+    total = sum(mass.values())
+    if total <= 0.0:
+        return None, {}
+    dist = {k: v / total for k, v in mass.items()}
+    best = max(SCORE_TOKENS, key=lambda k: dist[k])
+    info = {
+        "score_dist": {k: round(p, 6) for k, p in dist.items()},
+        "expected_score": round(sum(int(k) * p for k, p in dist.items()), 6),
+        "digit_mass": round(min(1.0, total), 6),
+    }
+    return int(best), info
+
+
+def apply_logprobs(parsed: Tuple[Any, Optional[str]], raw: Dict[str, Any],
+                   candidates: Iterable[Tuple[str, float]]) -> Tuple[Any, Optional[str]]:
+    """
+    Prefer the logprob argmax over the parsed text when the response carried score
+    logprobs (records the distribution in raw["logprobs"]); else keep `parsed`.
+    """
+    pred, info = score_distribution(candidates)
+    if pred is None:
+        return parsed
+    raw["logprobs"] = info
+    return pred, None
+
+
+def stored_score(raw: Dict[str, Any]) -> Optional[int]:
+    """Score `apply_logprobs` chose for a stored response: the argmax of raw["logprobs"], if any."""
+    dist = (raw.get("logprobs") or {}).get("score_dist")
+    if not isinstance(dist, dict) or not dist:
+        return None
+    return int(max(SCORE_TOKENS, key=lambda k: dist.get(k) or 0.0))
@@ -1,68 +1,540 @@
 from __future__ import annotations
-import time, logging, requests, ollama
+import json, time, logging, threading, requests, ollama, httpx
+from requests.adapters import HTTPAdapter
 from requests.exceptions import Timeout as ReqTimeout
 from typing import Dict, Any
-from bt.call import call_with_retry
-from bt.util.parsing import parse_score_and_reason
+from bt.call import call_with_retry, acall_with_retry, Hedger, CallTimeouts, max_in_flight
+from bt.util.parsing import parse_score_and_reason, ScoreParser, IncrementalScoreParser
 from bt.config import Settings
+from bt.llm.structured import answer_schema, output_token_limit, score_schema
+from bt.prompts import FORCED_ANSWER_TMPL
+from bt.llm.logprobs import uses_logprobs, apply_logprobs
 
 log = logging.getLogger("bt.llm.ollama")
 
+def _generate_url(s: Settings) -> str:
+    return s.ollama_base_url.rstrip("/") + "/api/generate"
+
+
+def _ensure_model(model: str, base_url: str) -> None:
+    # Pull model only for ollama runs
+    api = ollama.Client(host=base_url)
+    try:
+        api.show(model=model)
+    except Exception:
+        log.info("Pulling Ollama model '%s'…", model)
+        last = None
+        for _ in range(3):
+            try:
+                for __ in api.pull(model=model, stream=True):
+                    pass
+                api.show(model=model)
+                break
+            except Exception as e:
+                last = e
+                time.sleep(0.5)
+        else:
+            raise RuntimeError(f"Ollama pull failed: {last!r}")
+
+
+def _answer_reserve(s: Settings) -> int:
+    """Context tokens a call may generate into: the output cap, else num_ctx_reserve, plus any thinking budget."""
+    if uses_logprobs(s):
+        return 1
+    return int(output_token_limit(s) or s.num_ctx_reserve) + int(s.think_budget_tokens or 0)
+
+
+class _ContextSizer:
+    """
+    Picks num_ctx for a prompt from s.num_ctx_buckets: the smallest bucket holding the
+    estimated prompt tokens plus the answer reserve. Ollama reloads the model whenever
+    num_ctx changes, so the size only ever grows during a run; shorter prompts keep the
+    current one.
+    """
+
+    def __init__(self, s: Settings):
+        self.buckets = sorted(int(b) for b in (s.num_ctx_buckets or ()))
+        self.reserve = _answer_reserve(s)
+        self._lock = threading.Lock()
+        self.current: int | None = self._bucket(self.reserve) if self.buckets else None
+
+    def _bucket(self, need: int) -> int:
+        for b in self.buckets:
+            if b >= need:
+                return b
+        return self.buckets[-1]
+
+    def num_ctx(self, prompt: str) -> int | None:
+        if not self.buckets:
+            return None
+        # ~3 chars per token errs on the long side, where truncation would be silent
+        need = len(prompt) // 3 + 1 + self.reserve
+        with self._lock:
+            if need > self.current:
+                grown = self._bucket(need)
+                if grown > self.current:
+                    log.info("num_ctx %d -> %d (prompt needs ~%d tokens); the model reloads once", self.current, grown, need)
+                    self.current = grown
+                elif need > self.buckets[-1]:
+                    log.warning("Prompt needs ~%d tokens, more than the largest num_ctx bucket (%d); Ollama will truncate it",
+                                need, self.buckets[-1])
+            return self.current
+
+
+def _payload(s: Settings, prompt: str, stream: bool = False, num_ctx: int | None = None,
+             seed: int | None = None) -> Dict[str, Any]:
+    payload: Dict[str, Any] = {
+        "model": s.model,
+        "prompt": prompt,
+        "options": {"temperature": float(s.temperature)},
+        "stream": stream,
+    }
+    if num_ctx is not None:
+        payload["options"]["num_ctx"] = int(num_ctx)
+    seed = s.seed if seed is None else seed  # a call's own seed (self-consistency samples) wins
+    if seed is not None:
+        payload["options"]["seed"] = int(seed)
+    if s.ollama_keep_alive is not None:
+        payload["keep_alive"] = s.ollama_keep_alive
+    schema = answer_schema(s)
+    if schema is not None:
+        payload["format"] = schema
+    limit = output_token_limit(s)
+    if limit is not None:
+        payload["options"]["num_predict"] = limit
+    if s.think is not None:
+        payload["think"] = bool(s.think)
+    elif s.think_budget_tokens:
+        payload["think"] = True  # budgeting needs the reasoning in its own field
+    if uses_logprobs(s):
+        # the one generated token must be the score, not the start of a thinking phase
+        payload["think"] = False
+        payload["options"]["num_predict"] = 1
+        payload["logprobs"] = True
+        payload["top_logprobs"] = int(s.logprobs_top_n)
+    return payload
+
+
+def _logprob_candidates(data: Dict[str, Any]):
+    # /api/generate with logprobs: [{"token", "logprob", "top_logprobs": [{"token", "logprob"}, …]}, …]
+    first = (data.get("logprobs") or [None])[0]
+    if not isinstance(first, dict):
+        return []
+    top = first.get("top_logprobs") or [first]
+    return [(c.get("token"), c.get("logprob")) for c in top if isinstance(c, dict)]
+
+
+def _read_timeout(s: Settings) -> float | None:
+    return (s.llm_timeout_ms / 1000.0) if (s.llm_timeout_ms and s.llm_timeout_ms > 0) else None
+
+
+_THINK_OPEN, _THINK_CLOSE = "<think>", "</think>"
+
+
+def _split_reasoning(text: str) -> tuple[str, str]:
+    """
+    (thinking, answer) of a response that inlines its reasoning: everything up to the
+    first </think> (the chat template may have opened the block in the prompt), or all
+    of it while a leading <think> is still open.
+    """
+    end = text.find(_THINK_CLOSE)
+    if end >= 0:
+        return text[:end + len(_THINK_CLOSE)], text[end + len(_THINK_CLOSE):]
+    if text.lstrip().startswith(_THINK_OPEN):
+        return text, ""
+    return "", text
+
+
+def _token_split(thinking: str, answer: str, total: int | None) -> Dict[str, Any]:
+    # eval_count covers both phases; without a stream, split it by characters
+    if total is None:
+        return {"thinking_tokens": None, "answer_tokens": None}
+    chars = len(thinking) + len(answer)
+    think = int(round(total * len(thinking) / chars)) if chars else 0
+    return {"thinking_tokens": think, "answer_tokens": total - think}
+
+
+def _result(data: Dict[str, Any], t0: float, parse: ScoreParser = parse_score_and_reason):
+    text = data.get("response", "") or ""
+    raw: Dict[str, Any] = {"provider": "ollama", "ollama": data, "response_text": text,
+                           "tokens_out": data.get("eval_count")}
+    # think=true returns the reasoning in its own field; older models inline it in <think>
+    thinking, answer = (data["thinking"], text) if data.get("thinking") else _split_reasoning(text)
+    raw.update(_token_split(thinking, answer, data.get("eval_count")))
+    ms = int((time.time() - t0) * 1000)
+    score, reason = apply_logprobs(parse(text), raw, _logprob_candidates(data))
+    return score, reason, raw, ms
+
+
+class _StreamState:
+    """
+    Accumulates /api/generate NDJSON chunks of one streamed call and decides when to
+    stop: at `done`, or (pointwise parsing only) as soon as the answer after the reasoning
+    holds a valid score object.
+    """
+
+    def __init__(self, t0: float, parse: ScoreParser, think_budget: int | None = None):
+        self.t0 = t0
+        self.parse = parse
+        self.think_budget = think_budget
+        self.thinking_parts: list[str] = []   # `thinking` field (think=true)
+        self.over_budget = False
+        self.t_budget_ms: int | None = None
+        self._opened: bool | None = None      # response starts with <think> (None: not known yet)
+        self._closed_at: int | None = None    # response chunks up to and including </think>
+        self._tail = ""
+        # Early stop only for the pointwise parser, which the scanner checks its answer against
+        self.inc = IncrementalScoreParser() if parse is parse_score_and_reason else None
+        self.parts: list[str] = []
+        self.last: Dict[str, Any] = {}
+        self.chunks = 0
+        self.ttft_ms: int | None = None
+        self.t_score_ms: int | None = None
+        self.early: tuple | None = None
+
+    def feed_line(self, line: str | bytes) -> bool:
+        """Consume one NDJSON line; True means stop reading."""
+        if not line:
+            return False
+        data = json.loads(line)
+        self.last = data
+        thought = data.get("thinking") or ""
+        if thought:
+            # Ollama streams one token per chunk
+            self.thinking_parts.append(thought)
+            if self.ttft_ms is None:
+                self.ttft_ms = int((time.time() - self.t0) * 1000)
+        piece = data.get("response", "") or ""
+        if piece:
+            self.chunks += 1
+            if self.ttft_ms is None:
+                self.ttft_ms = int((time.time() - self.t0) * 1000)
+            self.parts.append(piece)
+            self._track_inline_think(piece)
+            if self.inc is not None:
+                if self.chunks == 1 and self.thinking_parts:
+                    self.inc.reasoning_done()  # think=true: the response holds only the answer
+                found = self.inc.feed(piece)
+                if found is not None:
+                    self.t_score_ms = int((time.time() - self.t0) * 1000)
+                    self.early = found
+                    return True
+        if self.think_budget is not None and self.still_thinking() and self.thinking_tokens >= self.think_budget:
+            self.over_budget = True
+            self.t_budget_ms = int((time.time() - self.t0) * 1000)
+            return True
+        return bool(data.get("done"))
+
+    def _track_inline_think(self, piece: str) -> None:
+        if self._opened is None:
+            head = "".join(self.parts).lstrip()
+            if len(head) >= len(_THINK_OPEN) or not _THINK_OPEN.startswith(head):
+                self._opened = head.startswith(_THINK_OPEN)
+        if self._closed_at is None:
+            self._tail = (self._tail + piece)[-64:]
+            if _THINK_CLOSE in self._tail:
+                self._closed_at = self.chunks
+
+    @property
+    def thinking_tokens(self) -> int:
+        # Ollama streams one token per chunk; inline reasoning is whatever precedes </think>
+        inline = self._closed_at if self._closed_at is not None else (self.chunks if self._opened else 0)
+        return len(self.thinking_parts) + inline
+
+    @property
+    def answer_tokens(self) -> int:
+        return len(self.thinking_parts) + self.chunks - self.thinking_tokens
+
+    def still_thinking(self) -> bool:
+        """In the reasoning phase: thinking field without answer yet, or an open <think> block."""
+        if self.thinking_parts:
+            return self.chunks == 0
+        return bool(self._opened) and self._closed_at is None
+
+    def thinking_text(self) -> str:
+        if self.thinking_parts:
+            return "".join(self.thinking_parts)
+        return _split_reasoning("".join(self.parts))[0]
+
+    def result(self):
+        text = "".join(self.parts)
+        ms = int((time.time() - self.t0) * 1000)
+        if self.early is not None:
+            score, reason = self.early
+        else:
+            score, reason = self.parse(text)
+            if score is not None:
+                self.t_score_ms = ms
+        meta = {k: v for k, v in self.last.items() if k not in ("response", "thinking", "context")}
+        raw: Dict[str, Any] = {
+            "provider": "ollama", "ollama": meta, "response_text": text,
+            # an early stop never sees the final chunk; Ollama streams one token per chunk
+            "tokens_out": meta.get("eval_count", self.chunks + len(self.thinking_parts)),
+            "thinking_tokens": self.thinking_tokens, "answer_tokens": self.answer_tokens,
+            "stream": {
+                "ttft_ms": self.ttft_ms, "t_score_ms": self.t_score_ms,
+                "early_stop": self.early is not None, "chunks": self.chunks,
+            },
+        }
+        if self.thinking_parts:
+            raw["thinking_text"] = "".join(self.thinking_parts)
+        return score, reason, raw, ms
+
+
+def _forced_payload(s: Settings, prompt: str, thinking: str, num_ctx: int | None = None,
+                    seed: int | None = None) -> Dict[str, Any]:
+    """Follow-up request once the thinking budget is spent: no thinking, short constrained answer."""
+    # same num_ctx as the first request (the reserve covers the budget), so no reload in between
+    payload = _payload(s, FORCED_ANSWER_TMPL.format(prompt=prompt, thinking=thinking), num_ctx=num_ctx, seed=seed)
+    payload["think"] = False
+    payload["format"] = score_schema(s.reasoning_enabled)
+    payload["options"]["num_predict"] = int(s.answer_max_tokens_with_reason if s.reasoning_enabled else s.answer_max_tokens)
+    return payload
+
+
+def _budget_result(st: _StreamState, data: Dict[str, Any] | None, parse: ScoreParser):
+    """
+    Result of a call whose thinking was cut at the budget: the forced answer in `data`,
+    or (think_force_answer off) an invalid item. ms covers both requests.
+    """
+    thinking = st.thinking_text()
+    info = {"budget": st.think_budget, "forced_answer": data is not None, "ms_thinking": st.t_budget_ms}
+    if data is None:
+        raw = {"provider": "ollama", "error": "think_budget", "response_text": "", "thinking_text": thinking,
+               "thinking_tokens": st.thinking_tokens, "answer_tokens": 0, "tokens_out": st.thinking_tokens,
+               "think": info}
+        return None, None, raw, int((time.time() - st.t0) * 1000)
+    score, reason, raw, ms = _result(data, st.t0, parse)
+    answer_tokens = data.get("eval_count")
+    raw.update({
+        "thinking_text": thinking, "thinking_tokens": st.thinking_tokens, "answer_tokens": answer_tokens,
+        "tokens_out": st.thinking_tokens + (answer_tokens or 0), "think": info,
+    })
+    return score, reason, raw, ms
+
+
+def _warm_up_payload(s: Settings, num_ctx: int | None) -> Dict[str, Any]:
+    # an empty prompt only loads the model (Ollama answers with done_reason "load")
+    payload: Dict[str, Any] = {"model": s.model, "prompt": "", "stream": False}
+    if num_ctx is not None:
+        payload["options"] = {"num_ctx": int(num_ctx)}
+    if s.ollama_keep_alive is not None:
+        payload["keep_alive"] = s.ollama_keep_alive
+    return payload
+
+
+def _load_seconds(data: Dict[str, Any], t0: float) -> float:
+    # load_duration (ns) is the server's own load time; 0 when the model was already resident
+    wall = time.time() - t0
+    ns = data.get("load_duration") if isinstance(data, dict) else None
+    log.info("Model warm-up took %.2fs (server load_duration=%s)", wall,
+             f"{ns / 1e9:.2f}s" if isinstance(ns, (int, float)) else "n/a")
+    return wall
+
+
 class OllamaClient:
     def __init__(self, settings: Settings):
         self.s = settings
         self._session = requests.Session()
-        # Pull model only for ollama runs
-        try:
-            ollama.show(model=self.s.model)
-        except Exception:
-            log.info("Pulling Ollama model '%s'…", self.s.model)
-            last = None
-            for _ in range(3):
-                try:
-                    for __ in ollama.pull(model=self.s.model, stream=True):
-                        pass
-                    ollama.show(model=self.s.model)
-                    break
-                except Exception as e:
-                    last = e
-                    time.sleep(0.5)
-            else:
-                raise RuntimeError(f"Ollama pull failed: {last!r}")
+        # One pooled connection per concurrent worker, otherwise urllib3 discards/reopens sockets
+        pool = max(10, max_in_flight(self.s))
+        self._session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=pool))
+        self._session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool))
+        _ensure_model(self.s.model, self.s.ollama_base_url)
+        self._hedger = Hedger.from_settings(self.s)
+        self._timeouts = CallTimeouts(self.s)
+        self._ctx = _ContextSizer(self.s)
 
     @property
     def model_label(self) -> str:
         return f"ollama:{self.s.model}"
 
-    def _single_call(self, prompt: str):
+    def _observed(self, prompt: str, res):
+        if res[0] is not None:
+            self._timeouts.observe(prompt, res[3])
+        return res
+
+    def _single_call(self, prompt: str, parse: ScoreParser = parse_score_and_reason,
+                     cancel: threading.Event | None = None, seed: int | None = None):
+        # a one-token logprob answer has nothing to stream; a thinking budget needs the stream, and so
+        # does a hedged attempt (`cancel` given): hanging up is the only way to stop a losing duplicate
+        if (self.s.ollama_stream or self.s.think_budget_tokens or cancel is not None) and not uses_logprobs(self.s):
+            return self._stream_call(prompt, parse, cancel, seed)
         t0 = time.time()
-        payload = {
-            "model": self.s.model,
-            "prompt": prompt,
-            "options": {"temperature": float(self.s.temperature)},
-            "stream": False,
-        }
+        limit = self._timeouts.timeout_s(prompt)
         try:
-            read_to = (self.s.llm_timeout_ms / 1000.0) if (self.s.llm_timeout_ms and self.s.llm_timeout_ms > 0) else None
-            r = self._session.post("http://127.0.0.1:11434/api/generate", json=payload, timeout=(5, read_to))
+            r = self._session.post(_generate_url(self.s),
+                                   json=_payload(self.s, prompt, num_ctx=self._ctx.num_ctx(prompt), seed=seed),
+                                   timeout=(5, limit))
             r.raise_for_status()
-            data = r.json()
-            text = data.get("response", "") or ""
-            raw: Dict[str, Any] = {"provider": "ollama", "ollama": data, "response_text": text}
+            return self._observed(prompt, _result(r.json(), t0, parse))
+        except ReqTimeout:
             ms = int((time.time() - t0) * 1000)
-            score, reason = parse_score_and_reason(text)
-            return score, reason, raw, ms
+            return None, None, {"provider": "ollama", "error": "timeout", "timeout_s": limit}, ms
+
+    def _stream_call(self, prompt: str, parse: ScoreParser, cancel: threading.Event | None = None,
+                     seed: int | None = None):
+        """
+        Read /api/generate as a stream and hang up once the score is known (or `cancel`
+        is set by a winning hedge); closing the response drops the connection, which
+        makes Ollama abort the generation.
+        """
+        t0 = time.time()
+        st = _StreamState(t0, parse, self.s.think_budget_tokens)
+        limit = self._timeouts.timeout_s(prompt)
+        try:
+            with self._session.post(
+                _generate_url(self.s), json=_payload(self.s, prompt, stream=True, num_ctx=self._ctx.num_ctx(prompt), seed=seed),
+                timeout=(5, limit), stream=True,
+            ) as r:
+                r.raise_for_status()
+                for line in r.iter_lines():
+                    if cancel is not None and cancel.is_set():
+                        return None, None, {"provider": "ollama", "error": "cancelled"}, int((time.time() - t0) * 1000)
+                    if st.feed_line(line):
+                        break
+                    # the read timeout is per chunk; enforce the call timeout on the whole call
+                    if limit is not None and time.time() - t0 > limit:
+                        raise ReqTimeout()
+            if st.over_budget:
+                return self._observed(prompt, self._force_answer(prompt, st, parse, limit, seed))
+            return self._observed(prompt, st.result())
         except ReqTimeout:
             ms = int((time.time() - t0) * 1000)
-            return None, None, {"provider": "ollama", "error": "timeout"}, ms
+            return None, None, {"provider": "ollama", "error": "timeout", "timeout_s": limit,
+                                "response_text": "".join(st.parts)}, ms
+
+    def _force_answer(self, prompt: str, st: _StreamState, parse: ScoreParser, limit: float | None,
+                      seed: int | None = None):
+        if not self.s.think_force_answer:
+            return _budget_result(st, None, parse)
+        remaining = None if limit is None else max(1.0, limit - (time.time() - st.t0))
+        r = self._session.post(_generate_url(self.s),
+                               json=_forced_payload(self.s, prompt, st.thinking_text(), self._ctx.current, seed),
+                               timeout=(5, remaining))
+        r.raise_for_status()
+        return _budget_result(st, r.json(), parse)
 
-    def judge(self, prompt: str):
+    def judge(self, prompt: str, parse: ScoreParser = parse_score_and_reason, seed: int | None = None):
+        attempt = lambda: self._single_call(prompt, parse, seed=seed)
+        if self._hedger is not None:
+            attempt = lambda: self._hedger.run(lambda cancel: self._single_call(prompt, parse, cancel, seed))
         return call_with_retry(
-            lambda: self._single_call(prompt),
+            attempt,
             attempts=self.s.retry_attempts,
             enabled=self.s.retry_enabled,
             backoff_ms=self.s.retry_backoff_ms,
+            backoff=self.s.retry_backoff,
+            backoff_max_ms=self.s.retry_backoff_max_ms,
         )
 
+    def warm_up(self) -> float:
+        """Load the model (at the starting num_ctx, with keep_alive) before judging; returns seconds taken."""
+        t0 = time.time()
+        r = self._session.post(_generate_url(self.s), json=_warm_up_payload(self.s, self._ctx.current),
+                               timeout=(5, _read_timeout(self.s)))
+        r.raise_for_status()
+        return _load_seconds(r.json(), t0)
+
     def close(self) -> None:
+        if self._hedger is not None:
+            self._hedger.close()
         self._session.close()
+
+
+class AsyncOllamaClient:
+    """
+    asyncio variant of OllamaClient: one shared httpx.AsyncClient, so many
+    requests can be in flight from a single thread.
+    """
+
+    def __init__(self, settings: Settings):
+        self.s = settings
+        conns = max(10, max_in_flight(self.s))
+        self._http = httpx.AsyncClient(
+            timeout=httpx.Timeout(_read_timeout(self.s), connect=5.0),
+            limits=httpx.Limits(max_connections=conns, max_keepalive_connections=conns),
+        )
+        _ensure_model(self.s.model, self.s.ollama_base_url)
+        self._hedger = Hedger.from_settings(self.s)
+        self._timeouts = CallTimeouts(self.s)
+        self._ctx = _ContextSizer(self.s)
+
+    @property
+    def model_label(self) -> str:
+        return f"ollama:{self.s.model}"
+
+    def _observed(self, prompt: str, res):
+        if res[0] is not None:
+            self._timeouts.observe(prompt, res[3])
+        return res
+
+    async def _single_call(self, prompt: str, parse: ScoreParser = parse_score_and_reason):
+        if (self.s.ollama_stream or self.s.think_budget_tokens) and not uses_logprobs(self.s):
+            return await self._stream_call(prompt, parse)
+        t0 = time.time()
+        limit = self._timeouts.timeout_s(prompt)
+        try:
+            r = await self._http.post(_generate_url(self.s), json=_payload(self.s, prompt, num_ctx=self._ctx.num_ctx(prompt)),
+                                      timeout=httpx.Timeout(limit, connect=5.0))
+            r.raise_for_status()
+            return self._observed(prompt, _result(r.json(), t0, parse))
+        except httpx.TimeoutException:
+            ms = int((time.time() - t0) * 1000)
+            return None, None, {"provider": "ollama", "error": "timeout", "timeout_s": limit}, ms
+
+    async def _stream_call(self, prompt: str, parse: ScoreParser):
+        t0 = time.time()
+        st = _StreamState(t0, parse, self.s.think_budget_tokens)
+        limit = self._timeouts.timeout_s(prompt)
+        try:
+            payload = _payload(self.s, prompt, stream=True, num_ctx=self._ctx.num_ctx(prompt))
+            async with self._http.stream("POST", _generate_url(self.s), json=payload,
+                                         timeout=httpx.Timeout(limit, connect=5.0)) as r:
+                r.raise_for_status()
+                async for line in r.aiter_lines():
+                    if st.feed_line(line):
+                        break
+                    if limit is not None and time.time() - t0 > limit:
+                        raise httpx.ReadTimeout("call timeout exceeded")
+            if st.over_budget:
+                return self._observed(prompt, await self._force_answer(prompt, st, parse, limit))
+            return self._observed(prompt, st.result())
+        except httpx.TimeoutException:
+            ms = int((time.time() - t0) * 1000)
+            return None, None, {"provider": "ollama", "error": "timeout", "timeout_s": limit,
+                                "response_text": "".join(st.parts)}, ms
+
+    async def _force_answer(self, prompt: str, st: _StreamState, parse: ScoreParser, limit: float | None):
+        if not self.s.think_force_answer:
+            return _budget_result(st, None, parse)
+        remaining = None if limit is None else max(1.0, limit - (time.time() - st.t0))
+        r = await self._http.post(_generate_url(self.s), json=_forced_payload(self.s, prompt, st.thinking_text(), self._ctx.current),
+                                  timeout=httpx.Timeout(remaining, connect=5.0))
+        r.raise_for_status()
+        return _budget_result(st, r.json(), parse)
+
+    async def judge(self, prompt: str, parse: ScoreParser = parse_score_and_reason):
+        attempt = lambda: self._single_call(prompt, parse)
+        if self._hedger is not None:
+            attempt = lambda: self._hedger.arun(lambda: self._single_call(prompt, parse))
+        return await acall_with_retry(
+            attempt,
+            attempts=self.s.retry_attempts,
+            enabled=self.s.retry_enabled,
+            backoff_ms=self.s.retry_backoff_ms,
+            backoff=self.s.retry_backoff,
+            backoff_max_ms=self.s.retry_backoff_max_ms,
+        )
+
+    async def warm_up(self) -> float:
+        t0 = time.time()
+        r = await self._http.post(_generate_url(self.s), json=_warm_up_payload(self.s, self._ctx.current),
+                                  timeout=httpx.Timeout(_read_timeout(self.s), connect=5.0))
+        r.raise_for_status()
+        return _load_seconds(r.json(), t0)
+
+    async def aclose(self) -> None:
+        if self._hedger is not None:
+            self._hedger.close()
+        await self._http.aclose()
@@ -0,0 +1,192 @@
+from __future__ import annotations
+import dataclasses, logging, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from bt.call import call_with_retry, Hedger
+from bt.util.parsing import parse_score_and_reason, ScoreParser
+from bt.config import Settings
+from bt.llm.ollama_client import OllamaClient, _ensure_model
+
+log = logging.getLogger("bt.llm.ollama_pool")
+
+
+class _Endpoint:
+    def __init__(self, url: str, weight: float, max_concurrency: int):
+        self.url = url.rstrip("/")
+        self.weight = max(1e-6, float(weight))
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.client: Optional[OllamaClient] = None
+        self.outstanding = 0
+        self.failures = 0            # consecutive timeouts / transport errors
+        self.ejected_until: Optional[float] = None
+        self.served = 0
+
+    def available(self, now: float) -> bool:
+        return self.client is not None and self.ejected_until is None and self.outstanding < self.max_concurrency
+
+    def load(self) -> float:
+        return (self.outstanding + 1) / self.weight
+
+
+class OllamaPoolClient:
+    """
+    Load-balancing LLMClient over several Ollama servers (provider 'ollama_pool').
+
+    Each call goes to the healthy endpoint with the fewest outstanding requests
+    relative to its weight, never exceeding its max_concurrency. An endpoint with
+    `pool_eject_after` consecutive timeouts/errors is ejected and re-probed (model
+    show/pull) after `pool_reprobe_s`. raw["endpoint"] names the server that answered.
+    Retries and hedges are routed again, so they usually land on another endpoint.
+    """
+
+    def __init__(self, settings: Settings):
+        self.s = settings
+        if not self.s.ollama_endpoints:
+            raise ValueError("ollama_endpoints must be set when provider='ollama_pool'")
+        self._cv = threading.Condition()
+        self._endpoints: List[_Endpoint] = []
+        for spec in self.s.ollama_endpoints:
+            if isinstance(spec, str):
+                spec = {"url": spec}
+            ep = _Endpoint(spec["url"], spec.get("weight", 1.0),
+                           spec.get("max_concurrency") or max(1, int(self.s.concurrency or 1)))
+            self._endpoints.append(ep)
+            self._connect(ep)
+        if not any(ep.client for ep in self._endpoints):
+            raise RuntimeError("No Ollama endpoint in ollama_endpoints is reachable")
+        self._hedger = Hedger.from_settings(self.s)
+
+    @property
+    def model_label(self) -> str:
+        # Same model on every box; keep the label (and the judgment cache key) of a single server
+        return f"ollama:{self.s.model}"
+
+    def _endpoint_settings(self, ep: _Endpoint) -> Settings:
+        # Hedging happens here, across endpoints, not inside one endpoint's client
+        return dataclasses.replace(self.s, provider="ollama", ollama_base_url=ep.url,
+                                   concurrency=ep.max_concurrency, hedge_enabled=False)
+
+    def _connect(self, ep: _Endpoint) -> None:
+        """Create the endpoint's client (checks/pulls the model); eject it on failure."""
+        try:
+            ep.client = OllamaClient(self._endpoint_settings(ep))
+            log.info("Ollama endpoint ready: %s (weight=%s, max_concurrency=%d)", ep.url, ep.weight, ep.max_concurrency)
+        except Exception as e:
+            log.warning("Ollama endpoint %s unavailable: %s", ep.url, e)
+            ep.ejected_until = time.time() + self.s.pool_reprobe_s
+
+    def _due_probes(self) -> List[_Endpoint]:
+        """Claim ejected endpoints whose rest is over (caller holds the lock)."""
+        now = time.time()
+        due = [ep for ep in self._endpoints if ep.ejected_until is not None and ep.ejected_until <= now]
+        for ep in due:
+            ep.ejected_until = now + self.s.pool_reprobe_s  # nobody else probes it meanwhile
+        return due
+
+    def _probe(self, ep: _Endpoint) -> None:
+        # network I/O (show/pull), so never under the lock
+        try:
+            if ep.client is None:
+                self._connect(ep)
+            else:
+                _ensure_model(self.s.model, ep.url)
+            ok = ep.client is not None
+        except Exception as e:
+            log.warning("Re-probe of Ollama endpoint %s failed: %s", ep.url, e)
+            ok = False
+        if ok:
+            with self._cv:
+                ep.ejected_until = None
+                ep.failures = 0
+                self._cv.notify_all()
+            log.info("Ollama endpoint %s is back in the pool", ep.url)
+
+    def _acquire(self) -> _Endpoint:
+        while True:
+            with self._cv:
+                due = self._due_probes()
+            for ep in due:
+                self._probe(ep)
+            with self._cv:
+                now = time.time()
+                free = [ep for ep in self._endpoints if ep.available(now)]
+                if free:
+                    ep = min(free, key=_Endpoint.load)
+                    ep.outstanding += 1
+                    return ep
+                # everything busy or ejected: wait for a release or the next re-probe
+                waits = [ep.ejected_until - now for ep in self._endpoints if ep.ejected_until is not None]
+                self._cv.wait(timeout=max(0.05, min(waits)) if waits else None)
+
+    def _release(self, ep: _Endpoint, failed: bool) -> None:
+        with self._cv:
+            ep.outstanding -= 1
+            ep.served += 1
+            if failed:
+                ep.failures += 1
+                if ep.failures >= self.s.pool_eject_after and ep.ejected_until is None:
+                    ep.ejected_until = time.time() + self.s.pool_reprobe_s
+                    log.warning("Ejecting Ollama endpoint %s after %d consecutive failures (re-probe in %.0fs)",
+                                ep.url, ep.failures, self.s.pool_reprobe_s)
+            else:
+                ep.failures = 0
+            self._cv.notify_all()
+
+    def _single_call(self, prompt: str, parse: ScoreParser = parse_score_and_reason,
+                     cancel: threading.Event | None = None, seed: int | None = None):
+        ep = self._acquire()
+        t0 = time.time()
+        failed = False
+        try:
+            pred, reason, raw, ms = ep.client._single_call(prompt, parse, cancel, seed)
+            failed = (raw or {}).get("error") == "timeout"
+        except Exception as e:
+            # connection refused / HTTP 5xx: count against the endpoint, let the retry go elsewhere
+            failed = True
+            log.warning("Ollama endpoint %s failed: %s", ep.url, e)
+            pred, reason, raw, ms = None, None, {"provider": "ollama", "error": str(e)}, int((time.time() - t0) * 1000)
+        finally:
+            self._release(ep, failed)
+        raw = dict(raw or {})
+        raw["endpoint"] = ep.url
+        log.debug("Served by %s in %d ms", ep.url, ms)
+        return pred, reason, raw, ms
+
+    def judge(self, prompt: str, parse: ScoreParser = parse_score_and_reason, seed: int | None = None):
+        attempt = lambda: self._single_call(prompt, parse, seed=seed)
+        if self._hedger is not None:
+            attempt = lambda: self._hedger.run(lambda cancel: self._single_call(prompt, parse, cancel, seed))
+        return call_with_retry(
+            attempt,
+            attempts=self.s.retry_attempts,
+            enabled=self.s.retry_enabled,
+            backoff_ms=self.s.retry_backoff_ms,
+            backoff=self.s.retry_backoff,
+            backoff_max_ms=self.s.retry_backoff_max_ms,
+        )
+
+    def warm_up(self) -> float:
+        """Load the model on every reachable endpoint at once; returns the slowest load in seconds."""
+        ready = [ep for ep in self._endpoints if ep.client is not None]
+        with ThreadPoolExecutor(max_workers=len(ready)) as ex:
+            futures = {ep.url: ex.submit(ep.client.warm_up) for ep in ready}
+        took = []
+        for url, fut in futures.items():
+            try:
+                took.append(fut.result())
+            except Exception as e:
+                # a box that cannot load the model still gets ejected by the failures of its calls
+                log.warning("Warm-up of Ollama endpoint %s failed: %s", url, e)
+        return max(took, default=0.0)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._cv:
+            return {ep.url: {"served": ep.served, "ejected": ep.ejected_until is not None} for ep in self._endpoints}
+
+    def close(self) -> None:
+        log.info("Ollama pool usage: %s", self.stats())
+        if self._hedger is not None:
+            self._hedger.close()
+        for ep in self._endpoints:
+            if ep.client is not None:
+                ep.client.close()
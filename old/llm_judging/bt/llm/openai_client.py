@@ -0,0 +1,133 @@
+from __future__ import annotations
+import time, logging, requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import Timeout as ReqTimeout
+from typing import Any, Dict, List
+from bt.call import call_many_with_retry, CallTimeouts, max_in_flight
+from bt.util.parsing import parse_score_and_reason, ScoreParser
+from bt.config import Settings
+from bt.llm.structured import output_token_limit
+from bt.llm.logprobs import uses_logprobs, apply_logprobs
+
+log = logging.getLogger("bt.llm.openai")
+
+
+def _headers(s: Settings) -> Dict[str, str]:
+    headers = {"Accept": "application/json"}
+    if s.openai_api_key:
+        headers["Authorization"] = f"Bearer {s.openai_api_key}"
+    return headers
+
+
+def _payload(s: Settings, prompts: List[str], seed: int | None = None) -> Dict[str, Any]:
+    payload: Dict[str, Any] = {
+        "model": s.model,
+        "prompt": prompts,
+        "max_tokens": int(output_token_limit(s) or s.max_new_tokens),
+        "temperature": float(s.temperature),
+    }
+    if s.top_p is not None: payload["top_p"] = float(s.top_p)
+    if s.top_k is not None: payload["top_k"] = int(s.top_k)                     # vLLM / llama.cpp extension
+    if s.repetition_penalty is not None: payload["repetition_penalty"] = float(s.repetition_penalty)
+    seed = s.seed if seed is None else seed  # a call's own seed (self-consistency samples) wins
+    if seed is not None: payload["seed"] = int(seed)
+    if uses_logprobs(s):
+        payload["max_tokens"] = 1
+        payload["logprobs"] = int(s.logprobs_top_n)
+    return payload
+
+
+def _logprob_candidates(choice: Dict[str, Any]):
+    # legacy completions: logprobs.top_logprobs is one {token: logprob} dict per generated token
+    top = ((choice.get("logprobs") or {}).get("top_logprobs") or [None])[0]
+    return list(top.items()) if isinstance(top, dict) else []
+
+
+def _choice_texts(data: Any, k: int) -> List[Dict[str, Any]]:
+    """Choices mapped back to prompt positions via their `index` (servers may reorder them)."""
+    out: List[Dict[str, Any]] = [{} for _ in range(k)]
+    choices = data.get("choices") if isinstance(data, dict) else None
+    for pos, c in enumerate(choices or []):
+        if not isinstance(c, dict):
+            continue
+        idx = c.get("index", pos)
+        if isinstance(idx, int) and 0 <= idx < k:
+            out[idx] = c
+    return out
+
+
+class OpenAICompletionsClient:
+    """
+    Client for OpenAI-compatible /v1/completions servers (provider 'openai').
+
+    `judge_many` sends a list of prompts in one request, letting the server batch
+    them; each choice is mapped back to its prompt by `index`. Only prompts left
+    without a prediction are re-sent on retry. Every item of a batch reports the
+    request's latency as its ms.
+    """
+
+    def __init__(self, settings: Settings):
+        self.s = settings
+        if not self.s.openai_base_url:
+            raise ValueError("openai_base_url must be set when provider='openai'")
+        self._url = self.s.openai_base_url.rstrip("/") + "/v1/completions"
+        self._session = requests.Session()
+        pool = max(10, max_in_flight(self.s))
+        self._session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=pool))
+        self._session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool))
+        self._timeouts = CallTimeouts(self.s)
+
+    @property
+    def model_label(self) -> str:
+        return f"openai:{self.s.model}"
+
+    def _post(self, prompts: List[str], parse: ScoreParser, seed: int | None = None):
+        t0 = time.time()
+        # Batched prompts are decoded side by side, so the longest one bounds the request
+        limit = self._timeouts.timeout_s(max(prompts, key=len))
+        try:
+            r = self._session.post(self._url, headers=_headers(self.s), json=_payload(self.s, prompts, seed),
+                                   timeout=(5, limit))
+            r.raise_for_status()
+            data = r.json()
+        except ReqTimeout:
+            ms = int((time.time() - t0) * 1000)
+            return [(None, None, {"provider": "openai", "error": "timeout", "timeout_s": limit}, ms) for _ in prompts]
+        ms = int((time.time() - t0) * 1000)
+
+        k = len(prompts)
+        results = []
+        for pos, choice in enumerate(_choice_texts(data, k)):
+            text = choice.get("text") or ""
+            raw: Dict[str, Any] = {
+                "provider": "openai", "response_text": text, "finish_reason": choice.get("finish_reason"),
+                "batch": {"size": k, "position": pos + 1},
+            }
+            if pos == 0:
+                raw["usage"] = data.get("usage")  # usage covers the whole request
+            if k == 1:
+                raw["tokens_out"] = (data.get("usage") or {}).get("completion_tokens")
+            score, reason = apply_logprobs(parse(text), raw, _logprob_candidates(choice))
+            results.append((score, reason, raw, ms))
+        if any(res[0] is not None for res in results):
+            self._timeouts.observe(max(prompts, key=len), ms)
+        return results
+
+    def judge_many(self, prompts: List[str], parse: ScoreParser = parse_score_and_reason, seed: int | None = None):
+        if not prompts:
+            return []
+        return call_many_with_retry(
+            lambda positions: self._post([prompts[j] for j in positions], parse, seed),
+            len(prompts),
+            attempts=self.s.retry_attempts,
+            enabled=self.s.retry_enabled,
+            backoff_ms=self.s.retry_backoff_ms,
+            backoff=self.s.retry_backoff,
+            backoff_max_ms=self.s.retry_backoff_max_ms,
+        )
+
+    def judge(self, prompt: str, parse: ScoreParser = parse_score_and_reason, seed: int | None = None):
+        return self.judge_many([prompt], parse, seed)[0]
+
+    def close(self) -> None:
+        self._session.close()
@@ -0,0 +1,134 @@
+from __future__ import annotations
+import logging, math, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from bt.config import Settings
+from bt.util.parsing import parse_score_and_reason, ScoreParser
+
+log = logging.getLogger("bt.llm.sampling")
+
+AGGREGATIONS = ("majority", "mean")
+SCORES = (0, 1, 2, 3)
+
+
+def _round(x: float) -> int:
+    return int(math.floor(x + 0.5))  # half up, not to even
+
+
+def vote_distribution(preds: List[Optional[int]]) -> Dict[str, int]:
+    dist = {str(k): 0 for k in SCORES}
+    dist["invalid"] = 0
+    for p in preds:
+        dist[str(p) if p in SCORES else "invalid"] += 1
+    return dist
+
+
+def _tally(preds: List[Optional[int]]) -> Tuple[int, int]:
+    """Votes of the leading score and of the runner-up."""
+    counts = sorted((preds.count(k) for k in SCORES), reverse=True)
+    return counts[0], counts[1]
+
+
+def _mean_bounds(preds: List[Optional[int]], remaining: int) -> Optional[Tuple[float, float]]:
+    # range of the final mean over every outcome of the remaining samples (any of them may be invalid)
+    valid = [p for p in preds if p is not None]
+    if not valid:
+        return None
+    total, n = sum(valid), len(valid)
+    return min(total / n, total / (n + remaining)), max(total / n, (total + 3 * remaining) / (n + remaining))
+
+
+def decided(preds: List[Optional[int]], remaining: int, aggregation: str) -> bool:
+    """True once no outcome of the `remaining` samples can change the aggregate."""
+    if remaining <= 0:
+        return True
+    if aggregation == "mean":
+        bounds = _mean_bounds(preds, remaining)
+        return bounds is not None and _round(bounds[0]) == _round(bounds[1])
+    leader, runner_up = _tally(preds)
+    return leader > runner_up + remaining
+
+
+def wave_size(preds: List[Optional[int]], remaining: int, aggregation: str) -> int:
+    """Samples to draw next, side by side: the fewest that could settle a majority."""
+    if aggregation == "mean" and preds:
+        return max(1, remaining // 2)
+    leader, runner_up = _tally(preds)
+    return max(1, min(remaining, (runner_up + remaining - leader) // 2 + 1))
+
+
+def aggregate(preds: List[Optional[int]], aggregation: str) -> Tuple[Optional[int], Optional[float]]:
+    """(score, mean of the valid votes); a majority tie goes to the score voted for first."""
+    valid = [p for p in preds if p is not None]
+    if not valid:
+        return None, None
+    mean = sum(valid) / len(valid)
+    if aggregation == "mean":
+        return _round(mean), mean
+    top = max(valid.count(k) for k in SCORES)
+    return next(p for p in valid if valid.count(p) == top), mean
+
+
+class SamplingClient:
+    """
+    LLMClient drawing up to s.samples_per_item samples of each item from one inner
+    client, sample j decoding with seed sample_seed + j (passed per call), and
+    aggregating them by majority vote or rounded mean.
+
+    Samples are drawn in waves of concurrent calls, each just large enough to settle
+    the result, and drawing stops once the remaining samples cannot change it. raw is
+    that of the first sample agreeing with the result, plus raw["sampling"]: the vote
+    distribution, the mean, how many samples were drawn and every sample (persisted
+    to llm_prediction_samples). ms is the wall time of the item.
+    """
+
+    def __init__(self, s: Settings, inner: Any):
+        self.s = s
+        self.inner = inner
+        self.k = max(1, int(s.samples_per_item))
+        self.seeds = [int(s.sample_seed) + j for j in range(self.k)]
+        # every concurrent item may have a whole wave in flight
+        self._pool = ThreadPoolExecutor(max_workers=self.k * max(1, int(s.concurrency or 1)),
+                                        thread_name_prefix="bt-sample")
+
+    @property
+    def model_label(self) -> str:
+        return self.inner.model_label
+
+    def judge(self, prompt: str, parse: ScoreParser = parse_score_and_reason):
+        t0 = time.time()
+        agg = self.s.sample_aggregation
+        results: List[tuple] = []
+        preds: List[Optional[int]] = []
+        while not decided(preds, self.k - len(results), agg):
+            wave = range(len(results), len(results) + wave_size(preds, self.k - len(results), agg))
+            futures = [self._pool.submit(self.inner.judge, prompt, parse, seed=self.seeds[j]) for j in wave]
+            for f in futures:
+                res = f.result()
+                results.append(res)
+                preds.append(res[0])
+        pred, mean = aggregate(preds, agg)
+        ms = int((time.time() - t0) * 1000)
+
+        # the reason (and raw) come from a sample that voted for the result
+        chosen = next((res for res in results if res[0] == pred), results[0])
+        raw = dict(chosen[2] or {})
+        raw["sampling"] = {
+            "aggregation": agg, "k": self.k, "drawn": len(results),
+            "vote_dist": vote_distribution(preds), "mean": mean,
+            "samples": [
+                {"sample_no": j + 1, "seed": self.seeds[j], "pred": res[0], "reason": res[1], "ms": res[3], "raw": res[2]}
+                for j, res in enumerate(results)
+            ],
+        }
+        if len(results) < self.k:
+            log.debug("Sampling stopped after %d/%d samples: %s", len(results), self.k, preds)
+        return pred, chosen[1], raw, ms
+
+    def warm_up(self) -> float | None:
+        warm_up = getattr(self.inner, "warm_up", None)
+        return warm_up() if warm_up is not None else None
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True)
+        self.inner.close()
@@ -0,0 +1,31 @@
+from __future__ import annotations
+from typing import Any, Dict, Optional
+from bt.config import Settings
+
+SCORE_VALUES = (0, 1, 2, 3)
+REASON_MAX_CHARS = 600   # keeps a constrained reason well inside answer_max_tokens_with_reason
+
+
+def score_schema(with_reason: bool) -> Dict[str, Any]:
+    """JSON schema of a pointwise answer: {"score": 0-3} plus a short "reason" if asked for."""
+    props: Dict[str, Any] = {"score": {"type": "integer", "enum": list(SCORE_VALUES)}}
+    required = ["score"]
+    if with_reason:
+        props["reason"] = {"type": "string", "maxLength": REASON_MAX_CHARS}
+        required.append("reason")
+    return {"type": "object", "properties": props, "required": required, "additionalProperties": False}
+
+
+def answer_schema(s: Settings) -> Optional[Dict[str, Any]]:
+    """Schema to constrain decoding with, or None when structured_output is off."""
+    return score_schema(s.reasoning_enabled) if s.structured_output else None
+
+
+def output_token_limit(s: Settings) -> Optional[int]:
+    """
+    Generation cap for a pointwise answer under structured_output (the constrained
+    JSON is short; a reason needs more room). None = provider default / max_new_tokens.
+    """
+    if not s.structured_output:
+        return None
+    return int(s.answer_max_tokens_with_reason if s.reasoning_enabled else s.answer_max_tokens)
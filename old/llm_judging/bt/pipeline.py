@@ -3,16 +3,30 @@ from __future__ import annotations
 import logging
 import time
 
-from bt.config import Settings
+from bt.config import Settings, settings_to_dict
 from bt.util.logging_utils import setup_run_logger
 from bt.db import (
     connect, ensure_audit_schema,
-    insert_prediction, count_available_qrels, finalize_run,
+    PredictionWriter, BackgroundPredictionWriter, count_available_qrels, finalize_run,
+    fetch_done_idxs, resume_run, record_load_seconds, fetch_disagreements, iter_qrel_pairs,
 )
-from bt.prompts import PROMPT_TMPL, PROMPT_TMPL_WITH_REASON, build_prompt
-from bt.llm.factory import build_llm_client  
+from bt.prompts import (
+    PROMPT_TMPL, PROMPT_TMPL_WITH_REASON, PROMPT_TMPL_DIGIT, build_prompt,
+    LISTWISE_PROMPT_TMPL, LISTWISE_PROMPT_TMPL_WITH_REASON, build_listwise_prompt,
+)
+from bt.util.parsing import parse_listwise_scores, parse_score_and_reason, parse_digit_score
+from bt.llm.logprobs import SCORING_MODES, uses_logprobs
+from bt.llm.factory import build_llm_client, build_async_llm_client, model_label_for
 from bt.util.git import get_git_info
+from bt.util.concurrency import ordered_map, aordered_map
+from bt.workqueue import (
+    ensure_work_schema, enqueue_chunks, claim_chunk, complete_chunk,
+    count_open_chunks, default_worker_id, Heartbeat,
+)
+import asyncio
 import json
+from dataclasses import dataclass
+from types import SimpleNamespace
 
 from bt.util.helpers import (
     validate_range_and_limit,
@@ -20,7 +34,7 @@ from bt.util.helpers import (
     log_qrel_banner,
     choose_prompt_template,
     start_run_from_cfg,
-    fetch_items_with_window,
+    iter_items_with_window,
 )
 
 def _hms(seconds: float) -> str:
@@ -37,130 +51,758 @@ def _truncate(text: str, limit: int | None) -> str:
     return text[:limit]
 
 
-def run_once(cfg: Settings, *, run_key: str, non_interactive: bool = True) -> None:
+JUDGING_MODES = ("pointwise", "listwise")
+
+
+def _check_judging_mode(cfg: Settings) -> None:
+    if cfg.judging_mode not in JUDGING_MODES:
+        raise ValueError(f"Unknown judging_mode {cfg.judging_mode!r}; expected one of {JUDGING_MODES}")
+    if cfg.judging_mode == "listwise" and cfg.async_mode:
+        raise ValueError("judging_mode='listwise' is not supported with async_mode")
+    if cfg.scoring_mode not in SCORING_MODES:
+        raise ValueError(f"Unknown scoring_mode {cfg.scoring_mode!r}; expected one of {SCORING_MODES}")
+    if uses_logprobs(cfg) and (cfg.judging_mode != "pointwise" or cfg.reasoning_enabled or cfg.structured_output):
+        raise ValueError("scoring_mode='logprobs' reads one score token: needs judging_mode='pointwise' "
+                         "without reasoning_enabled or structured_output")
+    if cfg.structured_output and cfg.judging_mode != "pointwise":
+        raise ValueError("structured_output constrains pointwise answers; use judging_mode='pointwise'")
+    if cfg.batch_size > 1 and (cfg.judging_mode != "pointwise" or cfg.async_mode):
+        raise ValueError("batch_size > 1 needs judging_mode='pointwise' without async_mode")
+    if cfg.cascade_models and (cfg.judging_mode != "pointwise" or cfg.async_mode or cfg.batch_size > 1):
+        raise ValueError("cascade_models judges items one by one: needs judging_mode='pointwise' "
+                         "without async_mode or batch_size > 1")
+    if cfg.samples_per_item > 1 and (cfg.judging_mode != "pointwise" or cfg.async_mode or cfg.batch_size > 1):
+        raise ValueError("samples_per_item > 1 votes on pointwise scores: needs judging_mode='pointwise' "
+                         "without async_mode or batch_size > 1")
+
+
+def _pointwise_template(cfg: Settings) -> str:
+    if uses_logprobs(cfg):
+        return PROMPT_TMPL_DIGIT
+    return choose_prompt_template(cfg.reasoning_enabled, PROMPT_TMPL_WITH_REASON, PROMPT_TMPL)
+
+
+def _item_parser(cfg: Settings):
+    """Parser for pointwise answers: a bare digit under scoring_mode='logprobs', else JSON."""
+    return parse_digit_score if uses_logprobs(cfg) else parse_score_and_reason
+
+
+def _run_prompt_template(cfg: Settings) -> str:
+    """Template recorded in llm_runs: the listwise one if the run judges in groups."""
+    if cfg.judging_mode == "listwise":
+        return choose_prompt_template(cfg.reasoning_enabled, LISTWISE_PROMPT_TMPL_WITH_REASON, LISTWISE_PROMPT_TMPL)
+    return _pointwise_template(cfg)
+
+
+def _item_prompt(row, prompt_template: str, cfg: Settings) -> str:
+    query_text = (row["query_text"] or "").strip()
+    doc_text_full = (row["doc_text"] or "").strip()
+    doc_text = _truncate(doc_text_full, cfg.max_text_chars)
+    return build_prompt(query_text, doc_text, template=prompt_template)
+
+
+def _judge_row(client, row, prompt_template: str, cfg: Settings, log, i: int, n: int):
     """
-    Orchestrates a single run using a provider-agnostic LLM client.
+    Build the prompt for one qrel row and judge it. Safe to call from worker threads;
+    never raises (failures become pred=None with an error in raw).
     """
-    # ---- Per-run logging FIRST so all subsequent logs (incl. bt.db) show up
-    log, log_path = setup_run_logger(run_key)
-    root = logging.getLogger("bt")
+    prompt = _item_prompt(row, prompt_template, cfg)
 
-    root.info("Run settings:\n%s", json.dumps(cfg.__dict__, indent=2, default=str))
-    conn = connect()
+    log.info("Processing item %d/%d | qid=%s doc=%s", i, n, row["query_id"], row["doc_id"])
 
-    # Build the LLM client (Ollama or HF endpoint) from cfg
-    client = build_llm_client(cfg)
+    try:
+        log.debug("=== Prompt: ===\n%s", prompt)
+        pred, reason, raw, ms_total = client.judge(prompt, _item_parser(cfg))
+        log.debug("=== Response: ===\n%s", raw.get("response_text"))
+    except Exception:
+        log.exception("LLM call failed for qid=%s doc=%s", row["query_id"], row["doc_id"])
+        pred, reason, raw, ms_total = None, None, {"error": "exception during LLM call"}, 0
+
+    return pred, reason, raw, ms_total
+
+
+async def _ajudge_row(client, row, prompt_template: str, cfg: Settings, log, i: int, n: int):
+    """Async twin of `_judge_row` for AsyncLLMClient providers."""
+    prompt = _item_prompt(row, prompt_template, cfg)
+
+    log.info("Processing item %d/%d | qid=%s doc=%s", i, n, row["query_id"], row["doc_id"])
 
     try:
-        ensure_audit_schema(conn, cfg.audit_schema)
+        log.debug("=== Prompt: ===\n%s", prompt)
+        pred, reason, raw, ms_total = await client.judge(prompt, _item_parser(cfg))
+        log.debug("=== Response: ===\n%s", raw.get("response_text"))
+    except Exception:
+        log.exception("LLM call failed for qid=%s doc=%s", row["query_id"], row["doc_id"])
+        pred, reason, raw, ms_total = None, None, {"error": "exception during LLM call"}, 0
 
-        total_available = count_available_qrels(conn, cfg.data_schema)
+    return pred, reason, raw, ms_total
 
-        # Range & limit validation + window computation
-        validate_range_and_limit(cfg.start_qrel, cfg.end_qrel, cfg.limit_qrels)
-        window = compute_qrel_window(
-            total_available=total_available,
-            start_qrel=cfg.start_qrel,
-            end_qrel=cfg.end_qrel,
-            limit_qrels=cfg.limit_qrels,
-        )
 
-        prompt_template = choose_prompt_template(
-            cfg.reasoning_enabled, PROMPT_TMPL_WITH_REASON, PROMPT_TMPL
-        )
+def _group_by_query(work, size: int):
+    """
+    Group consecutive (idx, row) pairs sharing a query_id into lists of at most `size`
+    items (qrels are streamed ordered by query_id, doc_id).
+    """
+    size = max(1, int(size))
+    group: list = []
+    for item in work:
+        if group and (item[1]["query_id"] != group[0][1]["query_id"] or len(group) >= size):
+            yield group
+            group = []
+        group.append(item)
+    if group:
+        yield group
+
+
+def _judge_group(client, group, cfg: Settings, log, n: int):
+    """
+    Judge all passages of one query group with a single listwise prompt and split the
+    parsed array back into per-item (pred, reason, raw, ms_total) results, in group order.
+    Items the model left unscored (or the whole group, if the answer did not parse)
+    fall back to pointwise judging. Never raises.
+    """
+    pointwise = _pointwise_template(cfg)
+    if len(group) == 1:
+        i, row = group[0]
+        return [_judge_row(client, row, pointwise, cfg, log, i, n)]
 
-        git = get_git_info()
-        if git:
-            log.info("Code version: %s (%s)%s",
-                     git.commit, git.branch, " +dirty" if git.dirty else "")
+    idxs = [i for i, _ in group]
+    row0 = group[0][1]
+    template = _run_prompt_template(cfg)
+    texts = [_truncate((row["doc_text"] or "").strip(), cfg.max_text_chars) for _, row in group]
+    prompt = build_listwise_prompt((row0["query_text"] or "").strip(), texts, template=template)
 
+    log.info("Processing items %d-%d/%d | qid=%s | %d passages (listwise)",
+             idxs[0], idxs[-1], n, row0["query_id"], len(group))
+
+    k = len(group)
+    try:
+        log.debug("=== Prompt: ===\n%s", prompt)
+        scores, _, raw, ms_total = client.judge(prompt, parse=lambda text: (parse_listwise_scores(text, k), None))
+        log.debug("=== Response: ===\n%s", raw.get("response_text"))
+    except Exception:
+        log.exception("Listwise LLM call failed for qid=%s (items %d-%d)", row0["query_id"], idxs[0], idxs[-1])
+        scores, raw, ms_total = None, {"error": "exception during LLM call"}, 0
+
+    if scores is None:
+        log.warning("Listwise answer for qid=%s unusable; judging %d items pointwise", row0["query_id"], k)
+
+    # The group's latency is spread evenly; the full provider payload is kept on the first item only
+    per_item_ms = int(round((ms_total or 0) / k))
+    results = []
+    for pos, (i, row) in enumerate(group):
+        listwise = {"group_idxs": idxs, "position": pos + 1, "group_ms": ms_total}
+        pred, reason = scores[pos] if scores is not None else (None, None)
+        if pred is None:
+            pred, reason, item_raw, item_ms = _judge_row(client, row, pointwise, cfg, log, i, n)
+            item_raw = dict(item_raw or {})
+            item_raw["listwise"] = {**listwise, "fallback": "pointwise"}
+            results.append((pred, reason, item_raw, item_ms))
+            continue
+        if pos == 0:
+            item_raw = dict(raw)
+        else:
+            item_raw = {"provider": raw.get("provider"), "response_text": raw.get("response_text")}
+        item_raw["listwise"] = listwise
+        results.append((pred, reason, item_raw, per_item_ms))
+    return results
+
+
+def _batch_items(work, prompt_template: str, cfg: Settings):
+    """
+    Group consecutive (idx, row) pairs into batches of at most cfg.batch_size items
+    and, if set, cfg.batch_max_tokens estimated tokens (prompt chars / 4 plus
+    max_new_tokens per item). Yields lists of (idx, row).
+    """
+    size = max(1, int(cfg.batch_size))
+    batch: list = []
+    tokens = 0
+    for i, row in work:
+        cost = len(_item_prompt(row, prompt_template, cfg)) // 4 + int(cfg.max_new_tokens)
+        if batch and (len(batch) >= size or (cfg.batch_max_tokens and tokens + cost > cfg.batch_max_tokens)):
+            yield batch
+            batch, tokens = [], 0
+        batch.append((i, row))
+        tokens += cost
+    if batch:
+        yield batch
+
+
+def _judge_batch(client, batch, prompt_template: str, cfg: Settings, log, n: int):
+    """
+    Judge a batch of (idx, row) pairs with one client.judge_many call; results in
+    batch order. Never raises (a failed request makes every item pred=None).
+    """
+    idxs = [i for i, _ in batch]
+    log.info("Processing items %d-%d/%d | batch of %d", idxs[0], idxs[-1], n, len(batch))
+    try:
+        results = client.judge_many([_item_prompt(row, prompt_template, cfg) for _, row in batch], _item_parser(cfg))
+    except Exception:
+        log.exception("Batched LLM call failed for items %d-%d", idxs[0], idxs[-1])
+        return [(None, None, {"error": "exception during LLM call"}, 0) for _ in batch]
+    for (i, row), (_, _, raw, _) in zip(batch, results):
+        log.debug("=== Response (item %d, qid=%s doc=%s): ===\n%s", i, row["query_id"], row["doc_id"],
+                  (raw or {}).get("response_text"))
+    return results
+
+
+def _compute_window(conn, cfg: Settings):
+    total_available = count_available_qrels(conn, cfg.data_schema)
+
+    # Range & limit validation + window computation
+    validate_range_and_limit(cfg.start_qrel, cfg.end_qrel, cfg.limit_qrels)
+    window = compute_qrel_window(
+        total_available=total_available,
+        start_qrel=cfg.start_qrel,
+        end_qrel=cfg.end_qrel,
+        limit_qrels=cfg.limit_qrels,
+    )
+    return window, total_available
+
+
+def _prepare_run(conn, read_conn, cfg: Settings, *, run_key: str, client, log, runner: str, resume: bool = False):
+    """
+    Shared run setup: audit schema, window validation and run metadata.
+    Returns (prompt_template, work, n) where `prompt_template` is the pointwise template,
+    `work` lazily streams (idx, row) pairs of
+    the window's qrels from `read_conn` and `n` is the window's target size.
+
+    With `resume`, the existing run is reopened instead of started and every idx already
+    in llm_predictions is skipped. With cfg.rejudge_runs the items are those the given
+    runs disagree on (recomputed on resume, so idx stays stable as long as they are unchanged).
+    """
+    ensure_audit_schema(conn, cfg.audit_schema)
+
+    if cfg.rejudge_runs:
+        pairs, total_available = fetch_disagreements(
+            conn, cfg.audit_schema, cfg.rejudge_runs, against_gold=cfg.rejudge_against_gold,
+        )
+        target = len(pairs)
+    else:
+        window, total_available = _compute_window(conn, cfg)
+        target = window.processed_target
+
+    prompt_template = _pointwise_template(cfg)
+
+    git = get_git_info()
+    if git:
+        log.info("Code version: %s (%s)%s",
+                 git.commit, git.branch, " +dirty" if git.dirty else "")
+
+    if cfg.rejudge_runs:
+        log.info("Re-judging: %d of %d items are not unanimous across runs %s%s", target, total_available,
+                 ", ".join(cfg.rejudge_runs), " (or miss gold)" if cfg.rejudge_against_gold else "")
+    else:
         log_qrel_banner(log, cfg, window, total_available)
 
+    done: set[int] = set()
+    if resume:
+        done = fetch_done_idxs(conn, cfg.audit_schema, run_key)
+        resume_run(conn, cfg.audit_schema, run_key)
+        log.info("Resuming run %s: %d/%d items already judged", run_key, len(done), target)
+    else:
         # Persist run metadata (incl. range)
         start_run_from_cfg(
             conn=conn,
-            audit_schema=cfg.audit_schema if False else cfg.audit_schema,  
+            audit_schema=cfg.audit_schema,
             run_key=run_key,
             client=client,
-            prompt_template=prompt_template,
+            prompt_template=_run_prompt_template(cfg),
             cfg=cfg,
             git=git,
+            runner=runner,
         )
 
-        # Fetch items with start/end/limit applied
-        items = fetch_items_with_window(
-            conn, cfg.data_schema, cfg.start_qrel, cfg.end_qrel, cfg.limit_qrels
+    # Stream items with start/end/limit applied (server-side cursor on its own connection,
+    # so the periodic commits on `conn` don't invalidate it)
+    if cfg.rejudge_runs:
+        items = iter_qrel_pairs(read_conn, cfg.data_schema, pairs, itersize=cfg.qrel_itersize)
+    else:
+        items = iter_items_with_window(
+            read_conn, cfg.data_schema, cfg.start_qrel, cfg.end_qrel, cfg.limit_qrels,
+            itersize=cfg.qrel_itersize,
         )
+    # idx is the 1-based position in the window, so it is stable across resumes
+    work = ((i, row) for i, row in enumerate(items, start=1) if i not in done)
+    return prompt_template, work, target
+
+
+@dataclass(frozen=True)
+class RunStats:
+    """Summary of a finished run, as logged in the final "Done" line."""
+    run_key: str
+    items: int
+    valid_predictions: int
+    agreement_pct: float
+    invalid_pct: float
+    seconds: float
+    db_rows: int
+    db_seconds: float
+    stop_reason: str = "completed"
+    load_seconds: float | None = None  # model warm-up before the timer started (not in `seconds`)
+
+
+def _warm_up(client, cfg: Settings, conn, run_key: str, log) -> float | None:
+    """
+    Load the model before the run's timer and deadline start (cfg.warm_up), so the
+    judging time of the first items does not include it. Returns the load seconds, or
+    None when the client has nothing to warm up.
+    """
+    warm_up = getattr(client, "warm_up", None)
+    if not cfg.warm_up or warm_up is None:
+        return None
+    try:
+        seconds = warm_up()
+    except Exception as e:
+        log.warning("Model warm-up failed (%s); the first calls will pay the load time", e)
+        return None
+    return _log_load(seconds, conn, cfg, run_key, log)
 
-        n = len(items)
-        if n == 0:
-            log.warning("No qrels found for the requested window. Finalizing empty run.")
-            finalize_run(conn, cfg.audit_schema, run_key)
-            log.info("Run %s finished (empty). Detailed log at: %s", run_key, log_path)
-            return
 
-        correct = 0
-        counted = 0
-        t_start = time.time()
+async def _awarm_up(client, cfg: Settings, conn, run_key: str, log) -> float | None:
+    warm_up = getattr(client, "warm_up", None)
+    if not cfg.warm_up or warm_up is None:
+        return None
+    try:
+        seconds = await warm_up()
+    except Exception as e:
+        log.warning("Model warm-up failed (%s); the first calls will pay the load time", e)
+        return None
+    return await asyncio.to_thread(_log_load, seconds, conn, cfg, run_key, log)
+
 
-        for i, row in enumerate(items, start=1):
-            query_text = (row["query_text"] or "").strip()
-            doc_text_full = (row["doc_text"] or "").strip()
-            doc_text = _truncate(doc_text_full, cfg.max_text_chars)
+def _log_load(seconds: float | None, conn, cfg: Settings, run_key: str, log) -> float | None:
+    if seconds is None:
+        return None
+    log.info("Model load | %.2fs (not part of the judging time)", seconds)
+    record_load_seconds(conn, cfg.audit_schema, run_key, seconds)
+    return seconds
 
-            prompt = build_prompt(query_text, doc_text, template=prompt_template)
 
-            log.info("Processing item %d/%d | qid=%s doc=%s", i, n, row["query_id"], row["doc_id"])
+class _Deadline:
+    """Run-level wall-clock budget (cfg.max_run_seconds); None means unlimited."""
 
-            try:
-                log.debug("=== Prompt: ===\n%s", prompt)
-                pred, reason, raw, ms_total = client.judge(prompt)
-                log.debug("=== Response: ===\n%s", raw.get("response_text"))
+    def __init__(self, seconds: float | None):
+        self.at = (time.monotonic() + float(seconds)) if seconds else None
+        self.hit = False
 
-            except Exception:
-                log.exception("LLM call failed for qid=%s doc=%s", row["query_id"], row["doc_id"])
-                pred, reason, raw, ms_total = None, None, {"error": "exception during LLM call"}, 0
-
-            is_correct = None
-            if pred is not None:
-                is_correct = (pred == int(row["gold_score"]))
-                counted += 1
-                if is_correct:
-                    correct += 1
-
-            status = "HIT" if is_correct else ("MISS" if pred is not None else "N/A")
-            agree_pct = (100.0 * correct / counted) if counted else 0.0
-            log.info(
-                "Item %d/%d | qid=%s doc=%s | gold=%s → pred=%s | %s | ms=%s | agree-so-far=%d/%d (%.2f%%)",
-                i, n, row["query_id"], row["doc_id"], row["gold_score"], pred, status, ms_total,
-                correct, counted, agree_pct,
+    def expired(self) -> bool:
+        if self.at is not None and time.monotonic() >= self.at:
+            self.hit = True
+        return self.hit
+
+    def gate(self, work, log):
+        """Pass items through until the deadline; in-flight calls still finish."""
+        for item in work:
+            if self.expired():
+                log.warning("max_run_seconds reached; not starting further items (next idx=%s)", item[0])
+                return
+            yield item
+
+    @property
+    def stop_reason(self) -> str:
+        return "deadline" if self.hit else "completed"
+
+
+class _ItemRecorder:
+    """
+    Consumes judged items in idx order: agreement counters, per-item log line and
+    batched persistence through a PredictionWriter (or its write-behind variant).
+    Always driven from a single thread.
+    """
+
+    def __init__(self, conn, cfg: Settings, run_key: str, log, n: int, load_seconds: float | None = None):
+        self.conn = conn
+        if cfg.write_behind:
+            # DB round-trips and commits happen on a background thread
+            self.writer = BackgroundPredictionWriter(
+                conn, cfg.audit_schema, flush_size=cfg.commit_every,
+                flush_interval_s=cfg.flush_interval_s, queue_size=cfg.write_queue_size,
             )
+        else:
+            self.writer = PredictionWriter(
+                conn, cfg.audit_schema, flush_size=cfg.commit_every, flush_interval_s=cfg.flush_interval_s,
+            )
+        self.cfg = cfg
+        self.run_key = run_key
+        self.log = log
+        self.n = n
+        self.correct = 0
+        self.counted = 0
+        self.recorded = 0
+        self.load_seconds = load_seconds
+        self.stages: dict[int, int] = {}      # cascade: items decided per stage
+        self.calls = self.calls_full = 0
+        self.drawn = self.drawn_full = 0      # self-consistency: samples drawn / samples_per_item
+        self.t_start = time.time()
+
+    def record(self, i: int, row, pred, reason, raw, ms_total) -> None:
+        self.recorded += 1
+        is_correct = None
+        if pred is not None:
+            is_correct = (pred == int(row["gold_score"]))
+            self.counted += 1
+            if is_correct:
+                self.correct += 1
+
+        status = "HIT" if is_correct else ("MISS" if pred is not None else "N/A")
+        agree_pct = (100.0 * self.correct / self.counted) if self.counted else 0.0
+        endpoint = (raw or {}).get("endpoint")
+        cascade = (raw or {}).get("cascade")
+        if cascade:
+            self.stages[cascade["stage"]] = self.stages.get(cascade["stage"], 0) + 1
+            self.calls += cascade["calls"]
+            self.calls_full += cascade["calls_full"]
+        sampling = (raw or {}).get("sampling")
+        if sampling:
+            self.drawn += sampling["drawn"]
+            self.drawn_full += sampling["k"]
+            votes = ",".join(f"{k}:{v}" for k, v in sampling["vote_dist"].items() if v)
+        self.log.info(
+            "Item %d/%d | qid=%s doc=%s | gold=%s → pred=%s | %s | ms=%s | agree-so-far=%d/%d (%.2f%%)%s%s%s",
+            i, self.n, row["query_id"], row["doc_id"], row["gold_score"], pred, status, ms_total,
+            self.correct, self.counted, agree_pct, f" | via={endpoint}" if endpoint else "",
+            f" | stage={cascade['stage']}" if cascade else "",
+            f" | votes={votes}" if sampling else "",
+        )
 
-            insert_prediction(conn, cfg.audit_schema, run_key, i, row, pred, reason, is_correct, ms_total, raw)
+        self.writer.add(self.run_key, i, row, pred, reason, is_correct, ms_total, raw)
 
-            if cfg.commit_every and (i % cfg.commit_every == 0):
-                conn.commit()
-                log.debug("Committed batch at item %d", i)
+    def flush(self) -> None:
+        """Block until every recorded item is committed."""
+        self.writer.flush()
 
-        conn.commit()
+    def close(self) -> None:
+        """Persist whatever is still buffered (also on the error path)."""
+        self.writer.close()
 
-        total_agree = (100.0 * correct / counted) if counted > 0 else 0.0
-        total_time = time.time() - t_start
-        invalid_pct = finalize_run(conn, cfg.audit_schema, run_key)
+    def finish(self, log_path: str, stop_reason: str = "completed") -> RunStats:
+        self.close()
+        self.log.info(
+            "Persistence | rows=%d | db_time=%.2fs (%.1f ms/item)",
+            self.writer.rows_written, self.writer.flush_seconds,
+            (1000.0 * self.writer.flush_seconds / self.writer.rows_written) if self.writer.rows_written else 0.0,
+        )
+
+        if self.calls_full:
+            self.log.info(
+                "Cascade | items decided per stage: %s | calls=%d of %d | calls saved=%.1f%%",
+                ", ".join(f"{k}: {v}" for k, v in sorted(self.stages.items())), self.calls, self.calls_full,
+                100.0 * (1 - self.calls / self.calls_full),
+            )
+        if self.drawn_full:
+            self.log.info(
+                "Sampling | samples drawn=%d of %d | samples saved=%.1f%%",
+                self.drawn, self.drawn_full, 100.0 * (1 - self.drawn / self.drawn_full),
+            )
+
+        total_agree = (100.0 * self.correct / self.counted) if self.counted > 0 else 0.0
+        total_time = time.time() - self.t_start
+        invalid_pct = finalize_run(self.conn, self.cfg.audit_schema, self.run_key, stop_reason)
+
+        self.log.info(
+            "Done | items=%d | valid_preds=%d | agreement=%.2f%% | invalid_preds=%.2f%% | time=%s | stop=%s%s",
+            self.recorded, self.counted, total_agree, invalid_pct, _hms(total_time), stop_reason,
+            f" | load={self.load_seconds:.2f}s" if self.load_seconds is not None else "",
+        )
+        self.log.info("Run %s finished. Detailed log at: %s", self.run_key, log_path)
+        return RunStats(
+            run_key=self.run_key, items=self.recorded, valid_predictions=self.counted,
+            agreement_pct=total_agree, invalid_pct=invalid_pct, seconds=total_time,
+            db_rows=self.writer.rows_written, db_seconds=self.writer.flush_seconds, stop_reason=stop_reason,
+            load_seconds=self.load_seconds,
+        )
+
+
+def _finish_empty(conn, cfg: Settings, run_key: str, log, log_path: str) -> None:
+    log.warning("No qrels found for the requested window. Finalizing empty run.")
+    finalize_run(conn, cfg.audit_schema, run_key)
+    log.info("Run %s finished (empty). Detailed log at: %s", run_key, log_path)
+
+
+def _judge_loop(client, work, prompt_template: str, cfg: Settings, log, n: int, recorder: _ItemRecorder) -> None:
+    workers = max(1, int(cfg.concurrency or 1))
+    if workers > 1:
+        log.info("Judging with %d concurrent workers", workers)
+
+    # A unit of work is a list of (idx, row): one item, or one query group in listwise mode
+    if cfg.judging_mode == "listwise":
+        log.info("Listwise judging: up to %d passages per call", cfg.listwise_size)
+        units = _group_by_query(work, cfg.listwise_size)
+
+        def judge_unit(group):
+            return _judge_group(client, group, cfg, log, n)
+    elif cfg.batch_size > 1:
+        log.info("Batched judging: up to %d prompts per request%s", cfg.batch_size,
+                 f" / ~{cfg.batch_max_tokens} tokens" if cfg.batch_max_tokens else "")
+        units = _batch_items(work, prompt_template, cfg)
+
+        def judge_unit(group):
+            return _judge_batch(client, group, prompt_template, cfg, log, n)
+    else:
+        units = ([item] for item in work)
+
+        def judge_unit(group):
+            i, row = group[0]
+            return [_judge_row(client, row, prompt_template, cfg, log, i, n)]
+
+    # Results come back in input order, so idx, counters and inserts stay deterministic.
+    for group, results in ordered_map(judge_unit, units, workers):
+        for (i, row), result in zip(group, results):
+            recorder.record(i, row, *result)
 
-        log.info(
-            "Done | items=%d | valid_preds=%d | agreement=%.2f%% | invalid_preds=%.2f%% | time=%s",
-            n, counted, total_agree, invalid_pct, _hms(total_time)
+
+def run_once(cfg: Settings, *, run_key: str, non_interactive: bool = True, resume: bool = False,
+             client=None, conn=None, read_conn=None) -> RunStats | None:
+    """
+    Orchestrates a single run using a provider-agnostic LLM client.
+    With cfg.async_mode the run is delegated to `run_once_async`; with `resume`,
+    an unfinished run_key is continued instead of started.
+
+    `client`, `conn` and `read_conn` may be passed in to share them across runs (see
+    bt.sweep); the caller keeps ownership and closes them. An injected client must
+    have been built from settings the run's client would be built from.
+    Returns the run's RunStats (None for an empty window).
+    """
+    _check_judging_mode(cfg)
+    if cfg.async_mode:
+        if client is not None:
+            raise ValueError("async_mode runs build their own client (it is bound to the run's event loop)")
+        return asyncio.run(run_once_async(cfg, run_key=run_key, resume=resume, conn=conn, read_conn=read_conn))
+
+    # ---- Per-run logging FIRST so all subsequent logs (incl. bt.db) show up
+    log, log_path = setup_run_logger(run_key)
+    root = logging.getLogger("bt")
+
+    root.info("Run settings:\n%s", json.dumps(settings_to_dict(cfg), indent=2, default=str))
+    own_conns = conn is None
+    if own_conns:
+        conn = connect()
+        read_conn = connect(readonly=True)
+
+    # Build the LLM client (Ollama or HF endpoint) from cfg
+    own_client = client is None
+    if own_client:
+        client = build_llm_client(cfg)
+
+    recorder = None
+    try:
+        prompt_template, work, n = _prepare_run(
+            conn, read_conn, cfg, run_key=run_key, client=client, log=log, runner="pipeline.run_once", resume=resume,
         )
-        log.info("Run %s finished. Detailed log at: %s", run_key, log_path)
+
+        if n == 0:
+            _finish_empty(conn, cfg, run_key, log, log_path)
+            return None
+
+        # the deadline (like the recorder's timer) starts once the model is loaded
+        load_seconds = _warm_up(client, cfg, conn, run_key, log)
+        deadline = _Deadline(cfg.max_run_seconds)
+        recorder = _ItemRecorder(conn, cfg, run_key, log, n, load_seconds)
+        _judge_loop(client, deadline.gate(work, log), prompt_template, cfg, log, n, recorder)
+        return recorder.finish(log_path, deadline.stop_reason)
 
     finally:
+        # Keep every finished judgment, even when the loop is aborted
+        if recorder is not None:
+            try:
+                recorder.close()
+            except Exception:
+                logging.getLogger("bt").exception("Failed to flush buffered predictions")
         # Close client first (releases HTTP sessions), then DB
+        if own_client:
+            try:
+                client.close()
+            except Exception:
+                logging.getLogger("bt").exception("Failed to close LLM client")
+        if own_conns:
+            try:
+                read_conn.close()
+                conn.close()
+            except Exception:
+                logging.getLogger("bt").exception("Failed to close DB connection")
+
+
+async def run_once_async(cfg: Settings, *, run_key: str, resume: bool = False,
+                         conn=None, read_conn=None) -> RunStats | None:
+    """
+    asyncio variant of `run_once`: up to cfg.concurrency requests in flight on one
+    event loop via an AsyncLLMClient. DB writes stay on psycopg2 and are pushed to a
+    worker thread so they never stall in-flight HTTP reads. Injected connections are
+    left open, as in `run_once`.
+    """
+    log, log_path = setup_run_logger(run_key)
+    root = logging.getLogger("bt")
+
+    root.info("Run settings:\n%s", json.dumps(settings_to_dict(cfg), indent=2, default=str))
+    own_conns = conn is None
+    if own_conns:
+        conn = connect()
+        read_conn = connect(readonly=True)
+
+    client = build_async_llm_client(cfg)
+
+    recorder = None
+    try:
+        prompt_template, work, n = _prepare_run(
+            conn, read_conn, cfg, run_key=run_key, client=client, log=log, runner="pipeline.run_once_async", resume=resume,
+        )
+
+        if n == 0:
+            _finish_empty(conn, cfg, run_key, log, log_path)
+            return None
+
+        load_seconds = await _awarm_up(client, cfg, conn, run_key, log)
+        deadline = _Deadline(cfg.max_run_seconds)
+        recorder = _ItemRecorder(conn, cfg, run_key, log, n, load_seconds)
+        log.info("Judging asynchronously with up to %d requests in flight", max(1, int(cfg.concurrency or 1)))
+
+        async def judge_item(item):
+            i, row = item
+            return await _ajudge_row(client, row, prompt_template, cfg, log, i, n)
+
+        async for (i, row), result in aordered_map(judge_item, deadline.gate(work, log), cfg.concurrency):
+            await asyncio.to_thread(recorder.record, i, row, *result)
+
+        return await asyncio.to_thread(recorder.finish, log_path, deadline.stop_reason)
+
+    finally:
+        if recorder is not None:
+            try:
+                await asyncio.to_thread(recorder.close)
+            except Exception:
+                logging.getLogger("bt").exception("Failed to flush buffered predictions")
+        try:
+            await client.aclose()
+        except Exception:
+            logging.getLogger("bt").exception("Failed to close LLM client")
+        if own_conns:
+            try:
+                read_conn.close()
+                conn.close()
+            except Exception:
+                logging.getLogger("bt").exception("Failed to close DB connection")
+
+
+def coordinate_run(cfg: Settings, *, run_key: str) -> int:
+    """
+    Start a sharded run: persist run metadata and enqueue the window's idx range as
+    chunks of cfg.chunk_size. Judging is done by `run_worker` processes.
+    Returns the number of chunks enqueued.
+    """
+    _check_judging_mode(cfg)
+    if cfg.rejudge_runs:
+        raise ValueError("rejudge_runs selects items by disagreement, not by window: run it with run_once")
+    log, log_path = setup_run_logger(run_key)
+    logging.getLogger("bt").info("Run settings:\n%s", json.dumps(settings_to_dict(cfg), indent=2, default=str))
+    conn = connect()
+    try:
+        ensure_audit_schema(conn, cfg.audit_schema)
+        ensure_work_schema(conn, cfg.audit_schema)
+        window, total_available = _compute_window(conn, cfg)
+        log_qrel_banner(log, cfg, window, total_available)
+
+        git = get_git_info()
+        start_run_from_cfg(
+            conn=conn,
+            audit_schema=cfg.audit_schema,
+            run_key=run_key,
+            client=SimpleNamespace(model_label=model_label_for(cfg)),  # coordinator never judges
+            prompt_template=_run_prompt_template(cfg),
+            cfg=cfg,
+            git=git,
+            runner="pipeline.run_worker",
+        )
+        n_chunks = enqueue_chunks(conn, cfg.audit_schema, run_key, window.processed_target, cfg.chunk_size)
+        if n_chunks == 0:
+            _finish_empty(conn, cfg, run_key, log, log_path)
+        log.info("Run %s ready for workers: start them with `run.py --worker %s`", run_key, run_key)
+        return n_chunks
+    finally:
+        conn.close()
+
+
+def run_worker(cfg: Settings, *, run_key: str, worker_id: str | None = None) -> None:
+    """
+    Judge chunks of a coordinated run until none are left. Chunks are claimed with
+    FOR UPDATE SKIP LOCKED and kept alive by a heartbeat; a chunk whose worker stops
+    heartbeating is re-claimed by another worker. Everything lands in the run's
+    llm_predictions; whichever worker sees the queue drained finalizes the run.
+    """
+    _check_judging_mode(cfg)
+    worker_id = worker_id or default_worker_id()
+    log, log_path = setup_run_logger(f"{run_key}_{worker_id.replace(':', '-')}")
+    logging.getLogger("bt").info("Worker %s joining run %s", worker_id, run_key)
+
+    conn = connect()
+    queue_conn = connect()
+    read_conn = connect(readonly=True)
+    client = build_llm_client(cfg)
+    recorder = None
+    try:
+        window, _ = _compute_window(conn, cfg)
+        n = window.processed_target
+        prompt_template = _pointwise_template(cfg)
+        load_seconds = _warm_up(client, cfg, conn, run_key, log)
+        deadline = _Deadline(cfg.max_run_seconds)
+        recorder = _ItemRecorder(conn, cfg, run_key, log, n, load_seconds)
+
+        while True:
+            if deadline.expired():
+                # chunks are the unit of work here; an unclaimed remainder is left for other workers
+                log.warning("max_run_seconds reached; worker %s stops claiming chunks", worker_id)
+                break
+            claim = claim_chunk(queue_conn, cfg.audit_schema, run_key, worker_id, stale_after_s=cfg.chunk_stale_after_s)
+            if claim is None:
+                open_chunks = count_open_chunks(queue_conn, cfg.audit_schema, run_key)
+                if open_chunks == 0:
+                    break
+                # other workers still hold chunks; wait in case one of them dies
+                log.debug("No claimable chunk (%d still open); waiting…", open_chunks)
+                time.sleep(cfg.chunk_heartbeat_s)
+                continue
+
+            chunk_no, idx_from, idx_to = claim
+            log.info("Claimed chunk %d [%d..%d]", chunk_no, idx_from, idx_to)
+            done = fetch_done_idxs(conn, cfg.audit_schema, run_key)
+            # chunk idx are window positions; map them back to absolute qrel positions
+            items = iter_items_with_window(
+                read_conn, cfg.data_schema,
+                window.start_1b + idx_from - 1, window.start_1b + idx_to - 1, None,
+                itersize=cfg.qrel_itersize,
+            )
+            work = ((i, row) for i, row in enumerate(items, start=idx_from) if i not in done)
+
+            with Heartbeat(cfg.audit_schema, run_key, chunk_no, worker_id, cfg.chunk_heartbeat_s) as hb:
+                _judge_loop(client, work, prompt_template, cfg, log, n, recorder)
+                recorder.flush()
+            if hb.lost:
+                log.warning("Chunk %d was re-claimed elsewhere; not marking it done", chunk_no)
+                continue
+            complete_chunk(queue_conn, cfg.audit_schema, run_key, chunk_no, worker_id)
+            log.info("Completed chunk %d [%d..%d]", chunk_no, idx_from, idx_to)
+
+        recorder.close()
+        if deadline.hit and count_open_chunks(queue_conn, cfg.audit_schema, run_key) > 0:
+            log.info("Worker %s stopped at deadline | items=%d | valid_preds=%d | log: %s",
+                     worker_id, recorder.recorded, recorder.counted, log_path)
+            return
+        invalid_pct = finalize_run(conn, cfg.audit_schema, run_key)
+        log.info("Worker %s done | items=%d | valid_preds=%d | run invalid_preds=%.2f%% | log: %s",
+                 worker_id, recorder.recorded, recorder.counted, invalid_pct, log_path)
+    finally:
+        if recorder is not None:
+            try:
+                recorder.close()
+            except Exception:
+                logging.getLogger("bt").exception("Failed to flush buffered predictions")
         try:
             client.close()
         except Exception:
             logging.getLogger("bt").exception("Failed to close LLM client")
         try:
+            read_conn.close()
+            queue_conn.close()
             conn.close()
         except Exception:
             logging.getLogger("bt").exception("Failed to close DB connection")
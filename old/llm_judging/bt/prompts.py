@@ -34,5 +34,76 @@ DOCUMENT (passage text):
 {text}
 """
 
+# scoring_mode="logprobs": the first generated token is the score, read from its logprobs
+PROMPT_TMPL_DIGIT = """You are a relevance judge for document retrieval.
+Rate how relevant the DOCUMENT is to the user QUERY on a 0–3 scale:
+
+0 = Irrelevant: The passage has nothing to do with the query.
+1 = Related: The passage seems related to the query but does not answer it.
+2 = Highly relevant: The passage has some answer for the query, but the answer may be a bit unclear, or hidden amongst extraneous information.
+3 = Perfectly relevant: The passage is dedicated to the query and contains the exact answer.
+
+Answer with the single digit of the score (0, 1, 2 or 3) and nothing else.
+
+QUERY:
+{query}
+
+DOCUMENT (passage text):
+{text}
+
+Score:"""
+
+# Follow-up prompt once a reasoning model used up think_budget_tokens
+FORCED_ANSWER_TMPL = """{prompt}
+
+Your reasoning so far (cut off at the thinking budget):
+{thinking}
+
+Stop reasoning now and give your final answer in the requested JSON format."""
+
 def build_prompt(query: str, text: str, template: str = PROMPT_TMPL) -> str:
     return template.format(query=query, text=text)
+
+
+LISTWISE_PROMPT_TMPL = """You are a relevance judge for document retrieval.
+Rate how relevant each numbered PASSAGE is to the user QUERY on a 0–3 scale:
+
+0 = Irrelevant: The passage has nothing to do with the query.
+1 = Related: The passage seems related to the query but does not answer it.
+2 = Highly relevant: The passage has some answer for the query, but the answer may be a bit unclear, or hidden amongst extraneous information.
+3 = Perfectly relevant: The passage is dedicated to the query and contains the exact answer.
+
+Judge every passage independently.
+Return strict JSON ONLY: an array with one object per passage, in passage order, with keys: id (passage number), score (0,1,2,3).
+
+QUERY:
+{query}
+
+PASSAGES:
+{passages}
+"""
+
+LISTWISE_PROMPT_TMPL_WITH_REASON = """You are a relevance judge for document retrieval.
+Rate how relevant each numbered PASSAGE is to the user QUERY on a 0–3 scale:
+
+0 = Irrelevant: The passage has nothing to do with the query.
+1 = Related: The passage seems related to the query but does not answer it.
+2 = Highly relevant: The passage has some answer for the query, but the answer may be a bit unclear, or hidden amongst extraneous information.
+3 = Perfectly relevant: The passage is dedicated to the query and contains the exact answer.
+
+Judge every passage independently.
+Return strict JSON ONLY: an array with one object per passage, in passage order, with keys:
+- id (passage number)
+- score (0,1,2,3)
+- reason (short string explaining the score)
+
+QUERY:
+{query}
+
+PASSAGES:
+{passages}
+"""
+
+def build_listwise_prompt(query: str, texts: list[str], template: str = LISTWISE_PROMPT_TMPL) -> str:
+    passages = "\n\n".join(f"PASSAGE {k}:\n{t}" for k, t in enumerate(texts, start=1))
+    return template.format(query=query, passages=passages)
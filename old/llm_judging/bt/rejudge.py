@@ -0,0 +1,101 @@
+# bt/rejudge.py
+from __future__ import annotations
+import dataclasses
+import logging
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from bt.config import Settings
+from bt.db import (
+    connect, gen_run_key, ensure_audit_schema, fetch_runs, fetch_disagreements,
+    merge_rejudged_run, finalize_run, load_run_settings,
+)
+from bt.pipeline import run_once
+
+log = logging.getLogger("bt.rejudge")
+
+
+@dataclass(frozen=True)
+class RejudgePlan:
+    run_keys: Tuple[str, ...]
+    total: int                          # distinct items across the runs
+    pairs: List[Tuple[str, str]]        # (query_id, doc_id) to re-judge
+
+    @property
+    def unanimous(self) -> int:
+        return self.total - len(self.pairs)
+
+
+def check_source_runs(conn, cfg: Settings, run_keys: List[str]) -> None:
+    """The runs to re-judge must exist, be finished and judge cfg.data_schema."""
+    if not run_keys:
+        raise ValueError("re-judging needs at least one source run")
+    rows = fetch_runs(conn, cfg.audit_schema, run_keys)
+    missing = [k for k in run_keys if k not in {r["run_key"] for r in rows}]
+    if missing:
+        raise ValueError(f"Run(s) {missing} not found in {cfg.audit_schema}.llm_runs")
+    unfinished = [r["run_key"] for r in rows if not r["finished"]]
+    if unfinished:
+        raise ValueError(f"Run(s) {unfinished} are not finished (resume them first)")
+    other = [r["run_key"] for r in rows if r["data_schema"] != cfg.data_schema]
+    if other:
+        raise ValueError(f"Run(s) {other} judged another data_schema than {cfg.data_schema!r}")
+    cut = [r["run_key"] for r in rows if r["stop_reason"] not in (None, "completed")]
+    if cut:
+        log.warning("Run(s) %s stopped early: their missing items count as disagreements", cut)
+
+
+def plan_rejudge(conn, cfg: Settings) -> RejudgePlan:
+    ensure_audit_schema(conn, cfg.audit_schema)
+    check_source_runs(conn, cfg, cfg.rejudge_runs or [])
+    pairs, total = fetch_disagreements(conn, cfg.audit_schema, cfg.rejudge_runs,
+                                       against_gold=cfg.rejudge_against_gold)
+    return RejudgePlan(tuple(cfg.rejudge_runs), total, pairs)
+
+
+def merge_rejudged(conn, audit_schema: str, rejudge_key: str, *, merged_key: Optional[str] = None) -> str:
+    """
+    Build the synthetic full run of a re-judging run: its predictions plus the labels
+    its source runs (settings rejudge_runs) are unanimous on. Returns the merged run_key.
+    """
+    ensure_audit_schema(conn, audit_schema)
+    cfg = load_run_settings(conn, audit_schema, rejudge_key)
+    if not cfg.rejudge_runs:
+        raise ValueError(f"Run {rejudge_key} is not a re-judging run (no rejudge_runs in its settings)")
+    rejudge_run = fetch_runs(conn, audit_schema, [rejudge_key])[0]
+    if not rejudge_run["finished"]:
+        raise ValueError(f"Re-judging run {rejudge_key} is not finished (resume it first)")
+
+    merged_key = merged_key or gen_run_key()
+    pairs, total = fetch_disagreements(conn, audit_schema, cfg.rejudge_runs, against_gold=cfg.rejudge_against_gold)
+    rejudged, reused = merge_rejudged_run(
+        conn, audit_schema, merged_key=merged_key, rejudge_key=rejudge_key,
+        source_keys=cfg.rejudge_runs, against_gold=cfg.rejudge_against_gold,
+    )
+    if rejudged + reused < total:
+        log.warning("Merged run %s misses %d of %d items: only %d of %d disagreements were re-judged",
+                    merged_key, total - rejudged - reused, total, rejudged, len(pairs))
+    finalize_run(conn, audit_schema, merged_key, rejudge_run["stop_reason"] or "completed")
+    return merged_key
+
+
+def run_rejudge(cfg: Settings, run_keys: List[str], *, against_gold: bool = True,
+                conn=None) -> Tuple[str, str]:
+    """
+    Judge the items `run_keys` disagree on with the model of `cfg`, then merge the result
+    with the unanimous labels into a synthetic full run. Returns (rejudge_key, merged_key).
+    """
+    cfg = dataclasses.replace(cfg, rejudge_runs=list(run_keys), rejudge_against_gold=against_gold)
+    own_conn = conn is None
+    if own_conn:
+        conn = connect()
+    try:
+        plan = plan_rejudge(conn, cfg)
+        log.info("Re-judging %d of %d items (%d unanimous reused)", len(plan.pairs), plan.total, plan.unanimous)
+        rejudge_key = gen_run_key()
+        run_once(cfg, run_key=rejudge_key, non_interactive=True)
+        merged_key = merge_rejudged(conn, cfg.audit_schema, rejudge_key)
+        return rejudge_key, merged_key
+    finally:
+        if own_conn:
+            conn.close()
@@ -0,0 +1,268 @@
+# bt/sweep.py
+from __future__ import annotations
+import hashlib
+import json
+import logging
+import statistics
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from bt.config import Settings, settings_to_dict
+from bt.db import connect, gen_run_key, ensure_audit_schema, count_available_qrels, fetch_run_timings
+from bt.llm.factory import build_llm_client, model_label_for
+from bt.llm.cascade import cascade_stages
+from bt.pipeline import run_once
+from bt.util.helpers import compute_qrel_window, validate_range_and_limit
+
+log = logging.getLogger("bt.sweep")
+
+# Settings only the pipeline reads; runs differing in nothing else can share one LLM client.
+# Anything not listed counts as client settings, so a new field never makes sharing unsafe.
+_RUN_ONLY_FIELDS = frozenset({
+    "data_schema", "audit_schema", "max_text_chars", "commit_every", "flush_interval_s",
+    "write_behind", "write_queue_size", "chunk_size", "chunk_heartbeat_s", "chunk_stale_after_s",
+    "limit_qrels", "start_qrel", "end_qrel", "qrel_itersize", "judging_mode", "listwise_size",
+    "batch_max_tokens", "official", "user_notes", "max_run_seconds", "warm_up",
+    "rejudge_runs", "rejudge_against_gold",
+})
+
+
+def endpoints_of(cfg: Settings) -> frozenset[str]:
+    """Servers a run's requests go to; runs sharing one are never run side by side."""
+    if cfg.cascade_models:
+        return frozenset().union(*(endpoints_of(js) for judges in cascade_stages(cfg) for js in judges))
+    if cfg.provider == "ollama":
+        return frozenset({cfg.ollama_base_url.rstrip("/")})
+    if cfg.provider == "ollama_pool":
+        return frozenset((spec if isinstance(spec, str) else spec["url"]).rstrip("/")
+                         for spec in cfg.ollama_endpoints or ())
+    if cfg.provider == "openai":
+        return frozenset({(cfg.openai_base_url or "").rstrip("/")})
+    if cfg.provider == "hf_endpoint":
+        return frozenset({(cfg.hf_endpoint_url or "").rstrip("/")})
+    return frozenset({cfg.provider})  # hf_hub: one serverless backend
+
+
+def client_key(cfg: Settings) -> str:
+    d = {k: v for k, v in settings_to_dict(cfg).items() if k not in _RUN_ONLY_FIELDS}
+    # settings_to_dict drops the API tokens; runs with different ones still need their own client
+    d["tokens"] = hashlib.sha256(f"{cfg.hf_api_token}|{cfg.openai_api_key}".encode()).hexdigest()
+    return json.dumps(d, sort_keys=True, default=str)
+
+
+@dataclass
+class PlannedRun:
+    position: int                  # 1-based position in the config file
+    cfg: Settings
+    items: Optional[int] = None    # qrel window size
+    load_s: float = 0.0            # estimated model load before the run (0: already resident)
+    judge_s: float = 0.0           # estimated judging time
+    shares_client: bool = False    # reuses the previous run's client
+
+    @property
+    def model(self) -> str:
+        return model_label_for(self.cfg)
+
+
+@dataclass
+class Lane:
+    """Runs against one set of servers, executed one after another in their own process."""
+    endpoints: frozenset[str]
+    runs: List[PlannedRun] = field(default_factory=list)
+
+    def eta_s(self, pause_s: float = 0.0) -> float:
+        return sum(r.load_s + r.judge_s for r in self.runs) + pause_s * max(0, len(self.runs) - 1)
+
+    def model_loads(self, runs: Optional[List[PlannedRun]] = None) -> int:
+        """Model switches along the lane's runs (or along `runs`, another order of them)."""
+        runs = self.runs if runs is None else runs
+        return sum(1 for k, r in enumerate(runs) if k == 0 or r.model != runs[k - 1].model)
+
+
+def _split_lanes(runs: List[PlannedRun]) -> List[Lane]:
+    lanes: List[Lane] = []
+    for run in runs:
+        eps = endpoints_of(run.cfg)
+        hit = [lane for lane in lanes if lane.endpoints & eps]
+        if not hit:
+            lanes.append(Lane(eps, [run]))
+            continue
+        # a run touching several lanes (a pool over their servers) merges them
+        keep = hit[0]
+        for other in hit[1:]:
+            keep.endpoints |= other.endpoints
+            keep.runs += other.runs
+            lanes.remove(other)
+        keep.endpoints |= eps
+        keep.runs.append(run)
+    return lanes
+
+
+def _order(runs: List[PlannedRun]) -> List[PlannedRun]:
+    """Group by model (first appearance), then by shareable client, otherwise keep file order."""
+    first_model: Dict[str, int] = {}
+    first_client: Dict[str, int] = {}
+    for k, r in enumerate(sorted(runs, key=lambda r: r.position)):
+        first_model.setdefault(r.model, k)
+        first_client.setdefault(client_key(r.cfg), k)
+    return sorted(runs, key=lambda r: (first_model[r.model], first_client[client_key(r.cfg)], r.position))
+
+
+def _per_item_s(timings: List[dict], concurrency: int) -> Optional[float]:
+    """Median judging seconds per item of earlier runs, scaled to `concurrency` when none ran at it."""
+    rates = []
+    for t in timings:
+        judging = t["seconds"] - (t["load_seconds"] or 0.0)
+        if judging > 0:
+            rates.append((t["concurrency"] or 1, judging / t["total_items"]))
+    same = [rate for c, rate in rates if c == concurrency]
+    if same:
+        return statistics.median(same)
+    if rates:
+        return statistics.median(rate * c / concurrency for c, rate in rates)
+    return None
+
+
+def plan_sweep(cfgs: List[Settings], conn, *, item_s: float = 2.0, load_s: float = 60.0) -> List[Lane]:
+    """
+    Split a sweep into lanes by target servers and order each lane so every model loads
+    once and runs that can share a client are adjacent. Wall time is estimated from
+    earlier runs of the same model in the audit schema (`item_s` per item at
+    concurrency 1 and `load_s` per cold model load when there are none).
+    """
+    runs = [PlannedRun(k, cfg) for k, cfg in enumerate(cfgs, start=1)]
+    available: Dict[str, int] = {}
+    timings: Dict[tuple, List[dict]] = {}
+    for r in runs:
+        cfg = r.cfg
+        if cfg.data_schema not in available:
+            available[cfg.data_schema] = count_available_qrels(conn, cfg.data_schema)
+        validate_range_and_limit(cfg.start_qrel, cfg.end_qrel, cfg.limit_qrels)
+        r.items = compute_qrel_window(available[cfg.data_schema], cfg.start_qrel, cfg.end_qrel,
+                                      cfg.limit_qrels).processed_target
+        key = (cfg.audit_schema, r.model)
+        if key not in timings:
+            ensure_audit_schema(conn, cfg.audit_schema)
+            timings[key] = fetch_run_timings(conn, cfg.audit_schema, r.model)
+        concurrency = max(1, int(cfg.concurrency or 1))
+        per_item = _per_item_s(timings[key], concurrency)
+        r.judge_s = r.items * (per_item if per_item is not None else item_s / concurrency)
+
+    lanes = _split_lanes(runs)
+    for lane in lanes:
+        lane.runs = _order(lane.runs)
+        for k, r in enumerate(lane.runs):
+            prev = lane.runs[k - 1] if k else None
+            r.shares_client = prev is not None and not r.cfg.async_mode and client_key(prev.cfg) == client_key(r.cfg)
+            if prev is None or prev.model != r.model:
+                loads = [t["load_seconds"] for t in timings[(r.cfg.audit_schema, r.model)] if t["load_seconds"]]
+                r.load_s = max(loads) if loads else load_s
+    return lanes
+
+
+def _hms(seconds: float) -> str:
+    seconds = int(round(seconds))
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def file_order_loads(lanes: List[Lane]) -> int:
+    """Model loads the same runs would cost in config file order."""
+    return sum(lane.model_loads(sorted(lane.runs, key=lambda r: r.position)) for lane in lanes)
+
+
+def format_plan(lanes: List[Lane], *, pause_s: float = 0.0, file_loads: Optional[int] = None) -> str:
+    lines = []
+    for n, lane in enumerate(lanes, start=1):
+        lines.append(f"Lane {n}: {', '.join(sorted(lane.endpoints))} | {len(lane.runs)} runs | "
+                     f"{lane.model_loads()} model loads | ETA {_hms(lane.eta_s(pause_s))}")
+        for r in lane.runs:
+            notes = []
+            if r.load_s:
+                notes.append(f"load ~{_hms(r.load_s)}")
+            if r.shares_client:
+                notes.append("shared client")
+            lines.append(f"  #{r.position:<3} {r.model:<40} items={r.items:<7} conc={r.cfg.concurrency or 1:<3} "
+                         f"~{_hms(r.judge_s)}{' (' + ', '.join(notes) + ')' if notes else ''}")
+    total = max((lane.eta_s(pause_s) for lane in lanes), default=0.0)
+    loads = sum(lane.model_loads() for lane in lanes)
+    lines.append(f"Estimated wall time: {_hms(total)} with {len(lanes)} lane(s) in parallel | "
+                 f"model loads: {loads}" + (f" (file order: {file_loads})" if file_loads is not None else ""))
+    return "\n".join(lines)
+
+
+def _reset(conn):
+    """Connection for the next run: end any open transaction, reconnect if it is broken."""
+    try:
+        conn.rollback()
+        return conn
+    except Exception:
+        try:
+            conn.close()
+        except Exception:
+            pass
+        return connect(readonly=conn.readonly)
+
+
+def run_lane(lane: Lane, pause_s: float = 0.0) -> List[tuple]:
+    """
+    Execute a lane's runs in order on one DB connection pair, building a new LLM client
+    only when a run cannot share the previous one. Returns (position, run_key, error).
+    """
+    results = []
+    conn = connect()
+    read_conn = connect(readonly=True)
+    client, client_for = None, None
+    try:
+        for k, r in enumerate(lane.runs):
+            if k and pause_s > 0:
+                time.sleep(pause_s)
+            run_key = gen_run_key()
+            print("=" * 80)
+            try:
+                if r.cfg.async_mode:
+                    shared = None
+                else:
+                    key = client_key(r.cfg)
+                    if client is None or key != client_for:
+                        if client is not None:
+                            client.close()
+                            client = None
+                        client, client_for = build_llm_client(r.cfg), key
+                    shared = client
+                run_once(r.cfg, run_key=run_key, non_interactive=True, client=shared, conn=conn, read_conn=read_conn)
+                print(f"Finished run #{r.position} (key={run_key})")
+                results.append((r.position, run_key, None))
+            except Exception as e:
+                # Errors are logged in the per-run log file by pipeline
+                print(f"Run #{r.position} (key={run_key}) failed: {e!r}")
+                traceback.print_exc()
+                results.append((r.position, run_key, repr(e)))
+            conn = _reset(conn)
+            read_conn = _reset(read_conn)
+    finally:
+        if client is not None:
+            client.close()
+        read_conn.close()
+        conn.close()
+    return results
+
+
+def run_sweep(lanes: List[Lane], pause_s: float = 0.0) -> List[tuple]:
+    """Run the lanes side by side, one process each (run logging is per process)."""
+    if len(lanes) == 1:
+        return run_lane(lanes[0], pause_s)
+    results: List[tuple] = []
+    with ProcessPoolExecutor(max_workers=len(lanes)) as ex:
+        futures = [(lane, ex.submit(run_lane, lane, pause_s)) for lane in lanes]
+        for lane, fut in futures:
+            try:
+                results += fut.result()
+            except Exception as e:
+                # the lane itself broke (DB unreachable, process died); its other runs went on
+                log.error("Lane %s failed: %r", ", ".join(sorted(lane.endpoints)), e)
+                done = {pos for pos, _, _ in results}
+                results += [(r.position, None, repr(e)) for r in lane.runs if r.position not in done]
+    return sorted(results, key=lambda res: res[0])
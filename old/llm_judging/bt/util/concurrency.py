@@ -0,0 +1,71 @@
+# bt/util/concurrency.py
+from __future__ import annotations
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import AsyncIterator, Awaitable, Callable, Deque, Iterable, Iterator, Tuple, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def ordered_map(
+    fn: Callable[[T], R],
+    items: Iterable[T],
+    workers: int,
+    *,
+    lookahead: int | None = None,
+) -> Iterator[Tuple[T, R]]:
+    """
+    Apply `fn` to `items` on a bounded thread pool and yield (item, result)
+    strictly in input order.
+
+    At most `lookahead` items (default: 2 * workers) are in flight at once, so
+    `items` may be a lazy iterator. With workers <= 1 no threads are used.
+    """
+    workers = max(1, int(workers or 1))
+    if workers == 1:
+        for item in items:
+            yield item, fn(item)
+        return
+
+    lookahead = max(workers, int(lookahead or 2 * workers))
+    pending: Deque[Tuple[T, Future]] = deque()
+    ex = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bt-judge")
+    try:
+        for item in items:
+            pending.append((item, ex.submit(fn, item)))
+            if len(pending) >= lookahead:
+                head, fut = pending.popleft()
+                yield head, fut.result()
+        while pending:
+            head, fut = pending.popleft()
+            yield head, fut.result()
+    finally:
+        # Consumer stopped early or raised: drop queued work, wait for in-flight calls.
+        ex.shutdown(wait=True, cancel_futures=True)
+
+
+async def aordered_map(
+    fn: Callable[[T], Awaitable[R]],
+    items: Iterable[T],
+    concurrency: int,
+) -> AsyncIterator[Tuple[T, R]]:
+    """
+    asyncio counterpart of `ordered_map`: keeps up to `concurrency` coroutines
+    in flight as tasks and yields (item, result) strictly in input order.
+    """
+    concurrency = max(1, int(concurrency or 1))
+    pending: Deque[Tuple[T, asyncio.Task]] = deque()
+    try:
+        for item in items:
+            pending.append((item, asyncio.ensure_future(fn(item))))
+            if len(pending) >= concurrency:
+                head, task = pending.popleft()
+                yield head, await task
+        while pending:
+            head, task = pending.popleft()
+            yield head, await task
+    finally:
+        for _, task in pending:
+            task.cancel()
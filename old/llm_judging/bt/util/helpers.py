@@ -71,8 +71,10 @@ def start_run_from_cfg(
     prompt_template: str,
     cfg,
     git,
+    runner: str = "pipeline.run_once",
 ):
     from ..db import start_run as _start_run  # local import to avoid cycles
+    from ..config import settings_to_dict as _settings_to_dict
 
     _start_run(
         conn,
@@ -89,7 +91,7 @@ def start_run_from_cfg(
         retry_enabled=cfg.retry_enabled,
         retry_attempts=cfg.retry_attempts,
         retry_backoff_ms=cfg.retry_backoff_ms,
-        runner="pipeline.run_once",
+        runner=runner,
         official=cfg.official,
         user_notes=cfg.user_notes,
         git_commit=(git.commit if git else None),
@@ -97,6 +99,8 @@ def start_run_from_cfg(
         git_dirty=(git.dirty if git else False),
         start_qrel=getattr(cfg, "start_qrel", None),
         end_qrel=getattr(cfg, "end_qrel", None),
+        concurrency=getattr(cfg, "concurrency", None),
+        settings_json=_settings_to_dict(cfg),
     )
 
 def fetch_items_with_window(conn, data_schema: str, start_qrel: Optional[int], end_qrel: Optional[int], limit_qrels: Optional[int]):
@@ -108,3 +112,14 @@ def fetch_items_with_window(conn, data_schema: str, start_qrel: Optional[int], e
         end=end_qrel,
         limit=limit_qrels,
     )
+
+def iter_items_with_window(conn, data_schema: str, start_qrel: Optional[int], end_qrel: Optional[int], limit_qrels: Optional[int], itersize: int):
+    from ..db import iter_qrels as _iter_qrels  # local import to avoid cycles
+    return _iter_qrels(
+        conn,
+        data_schema,
+        start=start_qrel,
+        end=end_qrel,
+        limit=limit_qrels,
+        itersize=itersize,
+    )
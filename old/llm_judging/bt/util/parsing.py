@@ -1,7 +1,10 @@
 from __future__ import annotations
 import json
 import re
-from typing import Optional, Tuple
+from typing import Any, Callable, List, Optional, Tuple
+
+# (text) -> (prediction, reason); prediction None means "no usable answer" (retry/fallback)
+ScoreParser = Callable[[str], Tuple[Any, Optional[str]]]
 
 def extract_json_block(text: str) -> Optional[str]:
     """
@@ -14,7 +17,32 @@ def extract_json_block(text: str) -> Optional[str]:
 
 def parse_score_and_reason(text: str) -> Tuple[Optional[int], Optional[str]]:
     """
-    Parse (score, reason) from model output with two simple rules:
+    Parse (score, reason) from model output.
+
+    Fast path: drop the reasoning (everything up to the last `</think>`) and take the
+    last flat JSON object with a valid score in the remaining answer. If that finds
+    nothing, fall back to the full scan of `_parse_full_scan`.
+    """
+    fast = _parse_answer_tail(text)
+    if fast is not None:
+        return fast
+    return _parse_full_scan(text)
+
+
+def parse_digit_score(text: str) -> Tuple[Optional[int], Optional[str]]:
+    """
+    Parse a single-digit answer ("2", " 3\n…") as asked for by scoring_mode="logprobs";
+    falls back to `parse_score_and_reason` for models that answered with JSON anyway.
+    """
+    m = _RE_LEADING_DIGIT.match(text)
+    if m:
+        return int(m.group(1)), None
+    return parse_score_and_reason(text)
+
+
+def _parse_full_scan(text: str) -> Tuple[Optional[int], Optional[str]]:
+    """
+    Original parser, two simple rules:
       1) Valid JSON: keys are case-insensitive; "score" required; "reason" optional.
       2) Fallback: textual pattern `score: [0..3]` (case-insensitive). Reason = None.
     """
@@ -42,10 +70,174 @@ def parse_score_and_reason(text: str) -> Tuple[Optional[int], Optional[str]]:
     return None, None
 
 
+class IncrementalScoreParser:
+    """
+    Streaming counterpart of `parse_score_and_reason`: `feed()` text chunks as they
+    arrive; it returns (score, reason) as soon as a JSON object of the answer is
+    complete and `parse_score_and_reason` of the text so far agrees with it, else None.
+
+    Only the answer is scanned: nothing is reported before a `</think>` has been seen
+    (whether or not the response opened the block), or `reasoning_done()` was called
+    because the reasoning arrives elsewhere (Ollama's `thinking` field). Output without
+    a reasoning block never stops early, since a draft answer may precede the final
+    one. When nothing was reported, the caller parses the full text at the end.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._answer = False
+        self._pos = 0
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+        self._start: Optional[int] = None
+
+    def reasoning_done(self) -> None:
+        """The reasoning is over and was not part of the fed text."""
+        self._answer = True
+
+    def feed(self, chunk: str) -> Optional[Tuple[int, Optional[str]]]:
+        self.text += chunk
+        s = self.text
+        if not self._answer:
+            end = s.find(_THINK_CLOSE, self._pos)
+            if end < 0:
+                # the tag may be split across chunks
+                self._pos = max(0, len(s) - len(_THINK_CLOSE) + 1)
+                return None
+            self._answer = True
+            self._pos = end + len(_THINK_CLOSE)
+        for i in range(self._pos, len(s)):
+            ch = s[i]
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif ch == "\\":
+                    self._esc = True
+                elif ch == '"':
+                    self._in_str = False
+                continue
+
+            if ch == '"':
+                self._in_str = True
+            elif ch == "{":
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif ch == "}" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0 and self._start is not None:
+                    candidate = s[self._start:i + 1]
+                    self._start = None
+                    try:
+                        found = _score_from_obj(json.loads(candidate))
+                    except Exception:
+                        continue  # keep scanning, as _find_first_json_object does
+                    # Stop only where the full parser would give the same answer
+                    if found is not None and parse_score_and_reason(s[:i + 1]) == found:
+                        self._pos = i + 1
+                        return found
+        self._pos = len(s)
+        return None
+
+
+def _score_from_obj(obj) -> Optional[Tuple[int, Optional[str]]]:
+    if not isinstance(obj, dict):
+        return None
+    score = _normalize_score(_get_ci_key(obj, "score"))
+    if score is None:
+        return None
+    reason_val = _get_ci_key(obj, "reason")
+    reason = str(reason_val) if isinstance(reason_val, (str, int, float, bool)) else None
+    return score, reason
+
+
+def parse_listwise_scores(text: str, n: int) -> Optional[List[Tuple[Optional[int], Optional[str]]]]:
+    """
+    Parse a listwise answer for `n` passages: a JSON array in `text`, holding
+    either plain scores ([2, 0, 3]) or objects with case-insensitive keys
+    "id" (passage number, optional), "score" and optional "reason". Ids are read as
+    1-based, or as 0-based when one of them is 0; ids that do not fit either way
+    (out of range, repeated) are ignored and entries are mapped by position.
+
+    Returns one (score, reason) per passage in order, with (None, None) for passages
+    the model skipped or scored invalidly; None if no usable array was found.
+    """
+    # Prefer the last array that looks like an answer (objects, or exactly n entries):
+    # reasoning text may contain stray bracketed lists before the final JSON.
+    candidates = [json.loads(c) for c in _iter_json_arrays(_strip_code_fences(text))]
+    answers = [a for a in candidates if len(a) == n or any(isinstance(e, dict) for e in a)]
+    if not answers:
+        return None
+    arr = answers[-1]
+
+    ids = [_listwise_id(e) for e in arr]
+    given = [i for i in ids if i is not None]
+    base = 0 if 0 in given else 1
+    if len(set(given)) != len(given) or any(not 0 <= i - base < n for i in given):
+        ids = [None] * len(arr)
+
+    out: List[Tuple[Optional[int], Optional[str]]] = [(None, None)] * n
+    for pos, entry in enumerate(arr):
+        if isinstance(entry, dict):
+            slot = pos if ids[pos] is None else ids[pos] - base
+            score = _normalize_score(_get_ci_key(entry, "score"))
+            reason_val = _get_ci_key(entry, "reason")
+            reason = str(reason_val) if isinstance(reason_val, (str, int, float, bool)) else None
+        else:
+            slot, score, reason = pos, _normalize_score(entry), None
+        if 0 <= slot < n and score is not None:
+            out[slot] = (score, reason)
+
+    if all(score is None for score, _ in out):
+        return None
+    return out
+
+
 # --- Internals ---------------------------------------------------------------
 
+def _listwise_id(entry) -> Optional[int]:
+    # "id" of a listwise answer entry as a number, if it has one
+    pid = _get_ci_key(entry, "id") if isinstance(entry, dict) else None
+    return int(pid) if isinstance(pid, (int, str)) and str(pid).strip().isdigit() else None
+
+
+_RE_FLAT_OBJ = re.compile(r"\{[^{}]*\}")
+_THINK_OPEN = "<think>"
+_THINK_CLOSE = "</think>"
 _RE_FENCE = re.compile(r"^\s*```(?:json)?\s*([\s\S]*?)\s*```\s*$", re.IGNORECASE)
 _RE_SCORE_KV = re.compile(r"\bscore\s*[:=]\s*([0-3])\b", re.IGNORECASE)
+_RE_LEADING_DIGIT = re.compile(r"\s*([0-3])(?!\d)")
+
+
+def _answer_region(text: str) -> Optional[str]:
+    """
+    Text after the reasoning: everything past the last `</think>` (chat templates may
+    open the block in the prompt, so a missing `<think>` is fine). None while a
+    `<think>` block is still open.
+    """
+    end = text.rfind(_THINK_CLOSE)
+    if end >= 0:
+        return text[end + len(_THINK_CLOSE):]
+    if _THINK_OPEN in text:
+        return None
+    return text
+
+
+def _parse_answer_tail(text: str) -> Optional[Tuple[int, Optional[str]]]:
+    answer = _answer_region(text)
+    # Cheap pre-check; the answer object needs a "score" key (any case)
+    if not answer or "score" not in answer.lower():
+        return None
+    objs = _RE_FLAT_OBJ.findall(answer)
+    for candidate in reversed(objs):
+        try:
+            found = _score_from_obj(json.loads(candidate))
+        except Exception:
+            continue
+        if found is not None:
+            return found
+    return None
 
 
 def _strip_code_fences(text: str) -> str:
@@ -110,3 +302,44 @@ def _find_first_json_object(s: str) -> Optional[str]:
                         start = None
                         continue
     return None
+
+
+def _iter_json_arrays(s: str):
+    """
+    Like `_find_first_json_object`, but yields every balanced top-level [...] block
+    that json.loads accepts as a list.
+    """
+    depth = 0
+    in_str = False
+    esc = False
+    start = None
+
+    for i, ch in enumerate(s):
+        if in_str:
+            if esc:
+                esc = False
+            elif ch == "\\":
+                esc = True
+            elif ch == '"':
+                in_str = False
+            continue
+
+        if ch == '"':
+            in_str = True
+            continue
+        if ch == "[":
+            if depth == 0:
+                start = i
+            depth += 1
+            continue
+        if ch == "]":
+            if depth > 0:
+                depth -= 1
+                if depth == 0 and start is not None:
+                    candidate = s[start:i + 1]
+                    try:
+                        if isinstance(json.loads(candidate), list):
+                            yield candidate
+                    except Exception:
+                        pass
+                    start = None
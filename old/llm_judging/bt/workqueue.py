@@ -0,0 +1,179 @@
+# bt/workqueue.py
+from __future__ import annotations
+import logging
+import os
+import socket
+import threading
+
+from bt.db import connect
+
+log = logging.getLogger("bt.workqueue")
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def ensure_work_schema(conn, audit_schema: str):
+    """
+    Creates the chunk table used by sharded runs. Safe to call repeatedly.
+    Chunks cover inclusive 1-based idx ranges of a run's qrel window.
+    """
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {audit_schema}.llm_work_chunks (
+                run_key       TEXT NOT NULL REFERENCES {audit_schema}.llm_runs(run_key) ON DELETE CASCADE,
+                chunk_no      INTEGER NOT NULL,
+                idx_from      INTEGER NOT NULL,
+                idx_to        INTEGER NOT NULL,
+                status        TEXT NOT NULL DEFAULT 'pending',   -- pending | claimed | done
+                worker_id     TEXT,
+                attempts      INTEGER NOT NULL DEFAULT 0,
+                claimed_at    TIMESTAMPTZ,
+                heartbeat_at  TIMESTAMPTZ,
+                finished_at   TIMESTAMPTZ,
+                PRIMARY KEY (run_key, chunk_no)
+            );
+        """)
+        cur.execute(f"CREATE INDEX IF NOT EXISTS llm_work_chunks_status_idx ON {audit_schema}.llm_work_chunks(run_key, status);")
+    conn.commit()
+    log.debug("Work queue schema ensured: %s", audit_schema)
+
+
+def enqueue_chunks(conn, audit_schema: str, run_key: str, n_items: int, chunk_size: int) -> int:
+    """Split idx 1..n_items into chunks of `chunk_size`. Idempotent per run_key."""
+    chunk_size = max(1, int(chunk_size))
+    chunks = [
+        (run_key, no, lo, min(lo + chunk_size - 1, n_items))
+        for no, lo in enumerate(range(1, n_items + 1, chunk_size), start=1)
+    ]
+    with conn.cursor() as cur:
+        cur.executemany(
+            f"""
+            INSERT INTO {audit_schema}.llm_work_chunks (run_key, chunk_no, idx_from, idx_to)
+            VALUES (%s,%s,%s,%s)
+            ON CONFLICT (run_key, chunk_no) DO NOTHING;
+            """,
+            chunks,
+        )
+    conn.commit()
+    log.info("Enqueued %d chunks (chunk_size=%d, items=%d) for run %s", len(chunks), chunk_size, n_items, run_key)
+    return len(chunks)
+
+
+def claim_chunk(conn, audit_schema: str, run_key: str, worker_id: str, *, stale_after_s: float):
+    """
+    Atomically claim the next pending chunk, or a claimed chunk whose worker stopped
+    heartbeating for `stale_after_s`. Returns (chunk_no, idx_from, idx_to) or None.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            UPDATE {audit_schema}.llm_work_chunks c
+            SET status = 'claimed',
+                worker_id = %s,
+                attempts = c.attempts + 1,
+                claimed_at = NOW(),
+                heartbeat_at = NOW()
+            WHERE (c.run_key, c.chunk_no) IN (
+                SELECT run_key, chunk_no
+                FROM {audit_schema}.llm_work_chunks
+                WHERE run_key = %s
+                  AND (status = 'pending'
+                       OR (status = 'claimed' AND heartbeat_at < NOW() - make_interval(secs => %s)))
+                ORDER BY chunk_no
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING c.chunk_no, c.idx_from, c.idx_to, c.attempts;
+            """,
+            (worker_id, run_key, float(stale_after_s)),
+        )
+        row = cur.fetchone()
+    conn.commit()
+    if row is None:
+        return None
+    chunk_no, idx_from, idx_to, attempts = row
+    if attempts > 1:
+        log.warning("Re-claimed stale chunk %d [%d..%d] (attempt %d)", chunk_no, idx_from, idx_to, attempts)
+    return chunk_no, idx_from, idx_to
+
+
+def heartbeat_chunk(conn, audit_schema: str, run_key: str, chunk_no: int, worker_id: str) -> bool:
+    """Refresh the heartbeat; False if the chunk was taken over by another worker."""
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            UPDATE {audit_schema}.llm_work_chunks
+            SET heartbeat_at = NOW()
+            WHERE run_key = %s AND chunk_no = %s AND worker_id = %s AND status = 'claimed';
+            """,
+            (run_key, chunk_no, worker_id),
+        )
+        ok = cur.rowcount == 1
+    conn.commit()
+    return ok
+
+
+def complete_chunk(conn, audit_schema: str, run_key: str, chunk_no: int, worker_id: str) -> None:
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            UPDATE {audit_schema}.llm_work_chunks
+            SET status = 'done', finished_at = NOW()
+            WHERE run_key = %s AND chunk_no = %s AND worker_id = %s;
+            """,
+            (run_key, chunk_no, worker_id),
+        )
+    conn.commit()
+
+
+def count_open_chunks(conn, audit_schema: str, run_key: str) -> int:
+    with conn.cursor() as cur:
+        cur.execute(
+            f"SELECT COUNT(*) FROM {audit_schema}.llm_work_chunks WHERE run_key = %s AND status <> 'done';",
+            (run_key,),
+        )
+        c = int(cur.fetchone()[0])
+    conn.commit()
+    return c
+
+
+class Heartbeat:
+    """
+    Background thread that keeps a claimed chunk alive on its own connection.
+    Use as a context manager around the judging of one chunk.
+    """
+
+    def __init__(self, audit_schema: str, run_key: str, chunk_no: int, worker_id: str, interval_s: float):
+        self.audit_schema = audit_schema
+        self.run_key = run_key
+        self.chunk_no = chunk_no
+        self.worker_id = worker_id
+        self.interval_s = max(1.0, float(interval_s))
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="bt-heartbeat", daemon=True)
+
+    def _run(self) -> None:
+        conn = connect()
+        try:
+            while not self._stop.wait(self.interval_s):
+                try:
+                    if not heartbeat_chunk(conn, self.audit_schema, self.run_key, self.chunk_no, self.worker_id):
+                        self.lost = True
+                        log.warning("Lost claim on chunk %d of run %s", self.chunk_no, self.run_key)
+                        return
+                except Exception:
+                    log.exception("Heartbeat failed for chunk %d", self.chunk_no)
+                    conn.rollback()
+        finally:
+            conn.close()
+
+    def __enter__(self) -> "Heartbeat":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
@@ -0,0 +1,58 @@
+import argparse
+import dataclasses
+import sys
+
+from bt.config import load_settings_file, Settings
+from bt.db import connect
+from bt.rejudge import plan_rejudge, run_rejudge, merge_rejudged
+
+def main():
+    ap = argparse.ArgumentParser(
+        description="Re-judge only the items earlier runs disagree on and merge the result with their "
+                    "unanimous labels into a synthetic full run.")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--config", help="Settings of the model that re-judges (a single config object)")
+    src.add_argument("--merge", metavar="RUN_KEY",
+                     help="Only merge an existing re-judging run (e.g. after `run.py --resume`)")
+    ap.add_argument("--runs", nargs="+", metavar="RUN_KEY", help="Finished runs to compare (with --config)")
+    ap.add_argument("--ignore-gold", action="store_true",
+                    help="Reuse labels all runs agree on even when they miss gold_score")
+    ap.add_argument("--dry-run", action="store_true", help="Print how many items would be re-judged and exit")
+    ap.add_argument("--audit-schema", default=Settings.audit_schema,
+                    help="Audit schema of the run to merge (with --merge; default: %(default)s)")
+    args = ap.parse_args()
+
+    if args.merge:
+        conn = connect()
+        try:
+            merged_key = merge_rejudged(conn, args.audit_schema, args.merge)
+        finally:
+            conn.close()
+        print(f"Merged run {merged_key} (re-judged items from {args.merge})")
+        return 0
+
+    if not args.runs:
+        ap.error("--config needs --runs")
+    runs = load_settings_file(args.config)
+    if len(runs) != 1:
+        raise ValueError("rejudge expects a single config object")
+    cfg = runs[0]
+
+    if args.dry_run:
+        conn = connect()
+        try:
+            plan = plan_rejudge(conn, dataclasses.replace(
+                cfg, rejudge_runs=args.runs, rejudge_against_gold=not args.ignore_gold))
+        finally:
+            conn.close()
+        print(f"{len(plan.pairs)} of {plan.total} items to re-judge with {cfg.model} "
+              f"({plan.unanimous} unanimous labels reused)")
+        return 0
+
+    rejudge_key, merged_key = run_rejudge(cfg, args.runs, against_gold=not args.ignore_gold)
+    print(f"Re-judging run {rejudge_key} merged into {merged_key}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,52 @@
 # run.py
 import argparse
-from bt.config import load_settings_file
-from bt.pipeline import run_once
-from bt.db import gen_run_key
+import dataclasses
+from bt.config import load_settings_file, Settings
+from bt.pipeline import run_once, coordinate_run, run_worker
+from bt.db import gen_run_key, connect, load_run_settings
+
+def _stored_settings(run_key: str, audit_schema: str) -> Settings:
+    conn = connect()
+    try:
+        return load_run_settings(conn, audit_schema, run_key)
+    finally:
+        conn.close()
 
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("--config", required=True)
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--config")
+    src.add_argument("--resume", metavar="RUN_KEY", help="Continue an unfinished run with its stored settings")
+    src.add_argument("--worker", metavar="RUN_KEY", help="Judge chunks of a coordinated (sharded) run")
+    ap.add_argument("--coordinate", action="store_true",
+                    help="With --config: create the run and enqueue its qrels for --worker processes instead of judging")
+    ap.add_argument("--audit-schema", default=Settings.audit_schema,
+                    help="Audit schema holding the run to resume / work on (default: %(default)s)")
+    ap.add_argument("--worker-id", default=None, help="Worker name in the work queue (default: host:pid)")
+    ap.add_argument("--concurrency", type=int, default=None, help="Override concurrency for this worker")
     args = ap.parse_args()
 
+    if args.resume:
+        cfg = _stored_settings(args.resume, args.audit_schema)
+        run_once(cfg, run_key=args.resume, non_interactive=True, resume=True)
+        return
+
+    if args.worker:
+        cfg = _stored_settings(args.worker, args.audit_schema)
+        if args.concurrency is not None:
+            cfg = dataclasses.replace(cfg, concurrency=args.concurrency)
+        run_worker(cfg, run_key=args.worker, worker_id=args.worker_id)
+        return
+
     runs = load_settings_file(args.config)
     if len(runs) != 1:
         raise ValueError("run_once expects a single config object")
 
     run_key = gen_run_key()
+    if args.coordinate:
+        coordinate_run(runs[0], run_key=run_key)
+        print(f"Coordinated run {run_key}: start workers with `python run.py --worker {run_key}`")
+        return
     run_once(runs[0], run_key=run_key, non_interactive=True)
 
 if __name__ == "__main__":
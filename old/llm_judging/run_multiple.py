@@ -1,37 +1,40 @@
 import argparse
-import time
-import traceback
+import sys
 
 from bt.config import load_settings_file
-from bt.pipeline import run_once
-from bt.db import gen_run_key
+from bt.db import connect
+from bt.sweep import plan_sweep, format_plan, file_order_loads, run_sweep
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--config", required=True, help="JSON array of run specs")
-    ap.add_argument("--pause", type=int, default=5, help="Seconds to pause between runs")
+    ap.add_argument("--pause", type=int, default=5, help="Seconds to pause between runs of a lane")
+    ap.add_argument("--dry-run", action="store_true", help="Print the plan and exit")
+    ap.add_argument("--item-seconds", type=float, default=2.0,
+                    help="ETA: seconds per item at concurrency 1 for models without finished runs")
+    ap.add_argument("--load-seconds", type=float, default=60.0,
+                    help="ETA: model load time for models without a recorded load")
     args = ap.parse_args()
 
     runs = load_settings_file(args.config)
     total = len(runs)
-    print(f"Starting sweep with {total} runs...\n")
+    conn = connect()
+    try:
+        lanes = plan_sweep(runs, conn, item_s=args.item_seconds, load_s=args.load_seconds)
+    finally:
+        conn.close()  # lanes open their own connections (in their own processes)
 
-    for i, spec in enumerate(runs, 1):
-        print("=" * 80)
-        run_key = gen_run_key()
-        try:
-            run_once(spec, run_key=run_key, non_interactive=True)
-            print(f"Finished run {i}/{total} (key={run_key})")
-        except Exception as e:
-            # Errors are logged in the per-run log file by pipeline
-            print(f"Run {i}/{total} (key={run_key}) failed: {e!r}")
-            traceback.print_exc()
+    print(f"Sweep plan for {total} runs:\n{format_plan(lanes, pause_s=args.pause, file_loads=file_order_loads(lanes))}\n")
+    if args.dry_run:
+        return 0
 
-        if i < total and args.pause > 0:
-            time.sleep(args.pause)
-
-    print("Sweep complete.")
+    results = run_sweep(lanes, pause_s=args.pause)
+    failed = [(pos, key, err) for pos, key, err in results if err]
+    for pos, key, err in failed:
+        print(f"Run #{pos} (key={key}) failed: {err}")
+    print(f"Sweep complete: {total - len(failed)}/{total} runs finished.")
+    return 1 if failed else 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())